@@ -0,0 +1,156 @@
+"""
+Compare SV filtering throughput when stratification/confident region
+intersections are recomputed inline for every dataset against reusing
+a single cached intersection per region and stratification.
+
+Requires bedtools on the PATH, and reports that it is skipped otherwise.
+Run from the repository root, e.g. in the workflow's svdb conda environment, with:
+
+    python -m lib.benchmark_bed_intersection
+"""
+
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+
+import pandas as pd
+
+
+def write_random_bed(filename: str, contigs: list, n_intervals: int, seed: int) -> None:
+    """
+    Write a sorted bedfile of random intervals across the requested contigs
+    """
+    rng = random.Random(seed)
+    intervals = []
+    for _ in range(n_intervals):
+        contig = rng.choice(contigs)
+        start = rng.randrange(0, 50_000_000)
+        intervals.append((contig, start, start + rng.randrange(50, 50_000)))
+    intervals.sort()
+    with open(filename, "w") as f:
+        f.writelines("{}\t{}\t{}\n".format(*x) for x in intervals)
+
+
+def write_random_vcf(filename: str, contigs: list, n_variants: int, seed: int) -> None:
+    """
+    Write a minimal sorted SV vcf with random deletions across the requested contigs
+    """
+    rng = random.Random(seed)
+    records = []
+    for _ in range(n_variants):
+        contig = rng.choice(contigs)
+        pos = rng.randrange(1, 50_000_000)
+        records.append((contig, pos, pos + rng.randrange(50, 5_000)))
+    records.sort()
+    with open(filename, "w") as f:
+        f.write("##fileformat=VCFv4.2\n")
+        f.writelines("##contig=<ID={}>\n".format(x) for x in contigs)
+        f.write('##INFO=<ID=END,Number=1,Type=Integer,Description="End position">\n')
+        f.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+        f.writelines(
+            "{}\t{}\t.\tN\t<DEL>\t.\tPASS\tEND={}\n".format(contig, pos, end)
+            for contig, pos, end in records
+        )
+
+
+def run_shell(command: str) -> None:
+    """
+    Run a shell pipeline, failing loudly
+    """
+    subprocess.run(["bash", "-o", "pipefail", "-c", command], check=True)
+
+
+def filter_inline(vcfs: list, stratifications: list, region: str, outdir: str) -> None:
+    """
+    Current behavior: intersect stratification and region for every dataset
+    """
+    for i, vcf in enumerate(vcfs):
+        for j, stratification in enumerate(stratifications):
+            run_shell(
+                "bedtools intersect -a {} -b {} | "
+                "bedtools intersect -a {} -b stdin -wa -f 1 -header > {}/inline.{}.{}.vcf".format(
+                    stratification, region, vcf, outdir, i, j
+                )
+            )
+
+
+def filter_cached(vcfs: list, stratifications: list, region: str, outdir: str) -> None:
+    """
+    Cached behavior: intersect, sort and merge once per stratification,
+    then filter every dataset against the shared result
+    """
+    for j, stratification in enumerate(stratifications):
+        run_shell(
+            "bedtools intersect -a {} -b {} | sort -k1,1 -k2,2n | "
+            "bedtools merge -i stdin > {}/cached.{}.bed".format(stratification, region, outdir, j)
+        )
+    for i, vcf in enumerate(vcfs):
+        for j in range(len(stratifications)):
+            run_shell(
+                "bedtools intersect -a {} -b {}/cached.{}.bed -wa -f 1 -header "
+                "> {}/cached.{}.{}.vcf".format(vcf, outdir, j, outdir, i, j)
+            )
+
+
+def run_benchmark(
+    n_datasets: int, n_stratifications: int, n_intervals: int, n_variants: int
+) -> pd.DataFrame:
+    """
+    Time inline and cached filtering on identical synthetic inputs
+    """
+    if shutil.which("bedtools") is None:
+        raise RuntimeError("bedtools is required on the PATH to run this benchmark")
+    contigs = ["chr{}".format(i) for i in range(1, 23)]
+    res = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        region = os.path.join(tmpdir, "region.bed")
+        write_random_bed(region, contigs, n_intervals, 0)
+        stratifications = []
+        for j in range(n_stratifications):
+            stratifications.append(os.path.join(tmpdir, "stratification{}.bed".format(j)))
+            write_random_bed(stratifications[-1], contigs, n_intervals, j + 1)
+        vcfs = []
+        for i in range(n_datasets):
+            vcfs.append(os.path.join(tmpdir, "dataset{}.vcf".format(i)))
+            write_random_vcf(vcfs[-1], contigs, n_variants, 1000 + i)
+        for label, fxn in [("inline", filter_inline), ("cached", filter_cached)]:
+            start = time.perf_counter()
+            fxn(vcfs, stratifications, region, tmpdir)
+            elapsed = time.perf_counter() - start
+            res.append(
+                {
+                    "mode": label,
+                    "datasets": n_datasets,
+                    "stratifications": n_stratifications,
+                    "seconds": round(elapsed, 3),
+                    "filters_per_second": round(n_datasets * n_stratifications / elapsed, 2),
+                }
+            )
+    return pd.DataFrame(res)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--datasets", type=int, default=20, help="number of vcfs to filter")
+    parser.add_argument("--stratifications", type=int, default=10, help="number of bedfiles")
+    parser.add_argument(
+        "--intervals", type=int, default=200_000, help="intervals per synthetic bedfile"
+    )
+    parser.add_argument("--variants", type=int, default=20_000, help="variants per vcf")
+    args = parser.parse_args()
+    if shutil.which("bedtools") is None:
+        print("bedtools is not on the PATH; skipping the bed intersection benchmark")
+        return
+    print(
+        run_benchmark(args.datasets, args.stratifications, args.intervals, args.variants).to_string(
+            index=False
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+"""
+Measure how DAG construction time and peak memory for manifest- and
+checkpoint-driven input functions scale with manifest and stratification
+linker size, and compare against a stored baseline.
+
+Run from the repository root with:
+
+    python -m lib.benchmark_dag_construction
+
+which exits with an error if any function regresses against the baseline
+beyond the tolerance. Stored times are specific to the machine that
+recorded them; refresh the stored baseline with --save-baseline.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from math import ceil
+from types import SimpleNamespace
+
+import pandas as pd
+from snakemake.io import Namedlist
+
+from lib import target_construction as tc
+
+
+def make_manifests(n_replicates: int, n_reports: int, vcfs_per_dataset: int = 1) -> tuple:
+    """
+    Generate synthetic experiment and comparisons manifests with
+    n_replicates experimental datasets, each compared against one
+    of two reference datasets and assigned round-robin to reports.
+    """
+    datasets = ["exp{}".format(i) for i in range(n_replicates)]
+    manifest_experiment = pd.DataFrame(
+        {
+            "experimental_dataset": [x for x in datasets for _ in range(vcfs_per_dataset)],
+            "replicate": [
+                "NA12878_{}".format(i % 100)
+                for i in range(n_replicates)
+                for _ in range(vcfs_per_dataset)
+            ],
+            "vcf": [
+                "dummy/{}.{}.vcf.gz".format(x, j) for x in datasets for j in range(vcfs_per_dataset)
+            ],
+        }
+    )
+    manifest_comparisons = pd.DataFrame(
+        {
+            "experimental_dataset": datasets,
+            "reference_dataset": ["ref{}".format(i % 2) for i in range(n_replicates)],
+            "comparison_type": ["SNV" if i % 2 == 0 else "SV" for i in range(n_replicates)],
+            "report": ["report{},all".format(i % n_reports) for i in range(n_replicates)],
+        }
+    )
+    return manifest_experiment, manifest_comparisons
+
+
+def make_config(n_regions: int = 3) -> dict:
+    """
+    Generate a minimal configuration with a mix of unconditional
+    and inclusion-filtered confident regions
+    """
+    regions = {"region0": {"bed": "region0.bed"}}
+    for i in range(1, n_regions):
+        regions["region{}".format(i)] = {
+            "bed": "region{}.bed".format(i),
+            "inclusion": "NA12878_{}$".format(i),
+        }
+    return {
+        "genome-build": "grch38",
+        "sv-toolname": "truvari",
+        "genomes": {"grch38": {"confident-regions": regions}},
+    }
+
+
+def simulate_dag_build(config: dict, manifest_experiment, manifest_comparisons) -> int:
+    """
+    Emulate the input function calls snakemake makes while building the DAG:
+    target construction once, then every report-level input function once
+    per report, and the experimental vcf mapping once per dataset.
+
+    Returns the number of input function calls made.
+    """
+    targets = tc.construct_targets(config, manifest_experiment, manifest_comparisons)
+    calls = 1
+    for target in targets:
+        comparison, region = (
+            target.removeprefix("results/reports/report_")
+            .removesuffix(".html")
+            .split("_vs_region-")
+        )
+        wildcards = Namedlist(fromdict={"comparison": comparison, "region": region})
+        tc.get_benchmarking_output_files(wildcards, config, manifest_comparisons)
+        tc.get_happy_comparison_subjects(wildcards, manifest_experiment, manifest_comparisons)
+        tc.get_variant_types(manifest_comparisons, comparison)
+        calls += 3
+    for experimental in manifest_comparisons["experimental_dataset"]:
+        wildcards = Namedlist(fromdict={"experimental": experimental})
+        tc.map_experimental_file(wildcards, manifest_experiment)
+        calls += 1
+    return calls
+
+
+def make_linker(directory: str, n_beds: int, seed: int = 0) -> str:
+    """
+    Write a synthetic stratification linker listing n_beds bedfiles, along with
+    the bedfiles themselves, each holding a random number of small intervals.
+    Returns the linker filename.
+    """
+    rng = random.Random(seed)
+    linker = os.path.join(directory, "grch38.stratification_regions.tsv")
+    entries = [("*", "GRCh38-all.bed")] + [
+        ("strat{}".format(i), "Group{}/strat{}.bed".format(i % 10, i)) for i in range(n_beds)
+    ]
+    with open(linker, "w") as f:
+        f.writelines("{}\t{}\n".format(x, y) for x, y in entries)
+    for name, path in entries:
+        bed = os.path.join(directory, "results", "stratification-sets", "grch38", path)
+        os.makedirs(os.path.dirname(bed), exist_ok=True)
+        with open(bed, "w") as f:
+            f.writelines(
+                "chr1\t{}\t{}\n".format(100 * j, 100 * j + 50) for j in range(rng.randrange(1, 200))
+            )
+    return linker
+
+
+def make_stratification_config(n_beds: int, beds_per_set: int, packing: str) -> dict:
+    """
+    Generate a configuration selecting every bedfile in a synthetic linker
+    """
+    config = make_config()
+    config["happy-bedfiles-per-stratification"] = beds_per_set
+    config["happy-stratification-packing"] = packing
+    config["genomes"]["grch38"]["stratification-regions"] = {
+        "region-inclusions": {x: ".*" for x in ["*"] + ["strat{}".format(i) for i in range(n_beds)]}
+    }
+    return config
+
+
+def make_checkpoints(linker: str, subset_directory: str) -> SimpleNamespace:
+    """
+    Minimal emulation of snakemake checkpoints whose jobs have all completed,
+    with hap.py stratification subsets written under subset_directory
+    """
+
+    class CompletedCheckpoint:
+        def __init__(self, output_function):
+            self.output_function = output_function
+
+        def get(self, **kwargs):
+            return SimpleNamespace(output=[self.output_function(**kwargs)])
+
+    return SimpleNamespace(
+        get_stratification_linker=CompletedCheckpoint(lambda **kwargs: linker),
+        happy_create_stratification_subset=CompletedCheckpoint(
+            lambda **kwargs: os.path.join(
+                subset_directory, str(kwargs["stratification_set"]), "stratification_subset.tsv"
+            )
+        ),
+    )
+
+
+def measure(fxn, *args) -> dict:
+    """
+    Run a function once under tracemalloc, reporting wall time, peak
+    traced memory, and the number of input function calls it reports.
+    Times include tracemalloc overhead, so only compare them against
+    other measurements made by this module.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        calls = fxn(*args)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"calls": calls, "seconds": round(elapsed, 4), "peak_mb": round(peak / 1024**2, 3)}
+
+
+def benchmark_manifests(n_replicates: int, n_reports: int) -> list:
+    """
+    Measure target construction and the report-level input functions
+    against synthetic manifests
+    """
+    config = make_config()
+    manifest_experiment, manifest_comparisons = make_manifests(n_replicates, n_reports)
+    targets = []
+
+    def construct_targets():
+        targets.extend(tc.construct_targets(config, manifest_experiment, manifest_comparisons))
+        return 1
+
+    def report_input_functions():
+        for target in targets:
+            comparison, region = (
+                target.removeprefix("results/reports/report_")
+                .removesuffix(".html")
+                .split("_vs_region-")
+            )
+            wildcards = Namedlist(fromdict={"comparison": comparison, "region": region})
+            tc.get_benchmarking_output_files(wildcards, config, manifest_comparisons)
+            tc.get_happy_comparison_subjects(wildcards, manifest_experiment, manifest_comparisons)
+            tc.get_variant_types(manifest_comparisons, comparison)
+        return 3 * len(targets)
+
+    def map_experimental_file():
+        for experimental in manifest_comparisons["experimental_dataset"]:
+            wildcards = Namedlist(fromdict={"experimental": experimental})
+            tc.map_experimental_file(wildcards, manifest_experiment)
+        return len(manifest_comparisons)
+
+    res = []
+    for fxn in [construct_targets, report_input_functions, map_experimental_file]:
+        res.append({"function": fxn.__name__, "size": n_replicates, **measure(fxn)})
+    return res
+
+
+def benchmark_linker(n_beds: int, n_comparisons: int, beds_per_set: int = 10) -> list:
+    """
+    Measure hap.py stratification subset packing, as run once per checkpoint job,
+    and the SV input functions that read the resulting subsets, against a synthetic
+    linker of n_beds bedfiles and n_comparisons experimental/reference pairs
+    """
+    res = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        linker = make_linker(tmpdir, n_beds)
+        ## bedfile paths in the linker and subsets are relative to the workflow root
+        cwd = os.getcwd()
+        os.chdir(tmpdir)
+        try:
+            n_sets = ceil(n_beds / beds_per_set)
+            for packing in ["position", "intervals"]:
+                config = make_stratification_config(n_beds, beds_per_set, packing)
+
+                def get_happy_stratification_subset():
+                    for i in range(n_sets):
+                        tc.get_happy_stratification_subset(linker, config, i)
+                    return n_sets
+
+                res.append(
+                    {
+                        "function": "get_happy_stratification_subset[{}]".format(packing),
+                        "size": n_beds,
+                        **measure(get_happy_stratification_subset),
+                    }
+                )
+
+            subset_directory = os.path.join(tmpdir, "subsets_for_happy")
+            for i in range(n_sets):
+                os.makedirs(os.path.join(subset_directory, str(i)))
+                tc.write_happy_stratification_subset(
+                    linker,
+                    os.path.join(subset_directory, str(i), "stratification_subset.tsv"),
+                    config,
+                    i,
+                )
+            checkpoints = make_checkpoints(linker, subset_directory)
+            comparisons = [("exp{}".format(i), "ref{}".format(i % 2)) for i in range(n_comparisons)]
+
+            def find_datasets_in_subset():
+                for experimental, reference in comparisons:
+                    for i in range(n_sets):
+                        wildcards = Namedlist(
+                            fromdict={
+                                "toolname": "svdb",
+                                "experimental": experimental,
+                                "reference": reference,
+                                "region": "region0",
+                                "stratification_set": str(i),
+                            }
+                        )
+                        tc.find_datasets_in_subset(wildcards, checkpoints, "grch38")
+                return n_comparisons * n_sets
+
+            def get_bedfile_from_name():
+                calls = 0
+                for i in range(n_sets):
+                    subset = tc.get_stratification_subset(checkpoints, "grch38", str(i))
+                    for name in subset.names:
+                        wildcards = Namedlist(
+                            fromdict={
+                                "region": "region0",
+                                "subset_group": str(i),
+                                "subset_name": name,
+                            }
+                        )
+                        for _ in comparisons:
+                            tc.get_bedfile_from_name(wildcards, checkpoints, "grch38")
+                            calls += 1
+                return calls
+
+            for fxn in [find_datasets_in_subset, get_bedfile_from_name]:
+                res.append({"function": fxn.__name__, "size": n_beds, **measure(fxn)})
+        finally:
+            os.chdir(cwd)
+    return res
+
+
+def run_benchmark(
+    sizes: list, n_reports: int, linker_sizes: list, n_comparisons: int
+) -> pd.DataFrame:
+    """
+    Measure every benchmarked function across a range of manifest and linker sizes
+    """
+    res = []
+    for size in sizes:
+        res.extend(benchmark_manifests(size, n_reports))
+    for size in linker_sizes:
+        res.extend(benchmark_linker(size, n_comparisons))
+    return pd.DataFrame(res, columns=["function", "size", "calls", "seconds", "peak_mb"])
+
+
+## stored results from a reference run of this module, for regression comparison
+BASELINE_FILENAME = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "benchmark_dag_construction.baseline.json"
+)
+
+
+def save_baseline(results: pd.DataFrame, filename: str) -> None:
+    """
+    Store benchmark results as the baseline for later comparison
+    """
+    with open(filename, "w") as f:
+        json.dump(results.to_dict(orient="records"), f, indent=2)
+        f.write("\n")
+
+
+def compare_to_baseline(
+    results: pd.DataFrame,
+    baseline: pd.DataFrame,
+    tolerance: float = 2.0,
+    min_seconds: float = 0.1,
+    min_peak_mb: float = 1.0,
+) -> pd.DataFrame:
+    """
+    Compare benchmark results to a baseline, by function and size.
+
+    A measurement is flagged as a regression when time or peak memory exceed
+    the baseline by more than the tolerance factor. Measurements below
+    min_seconds or min_peak_mb are too noisy to flag. Results without
+    a matching baseline measurement are reported but never flagged.
+    """
+    res = results.merge(
+        baseline[["function", "size", "seconds", "peak_mb"]],
+        on=["function", "size"],
+        how="left",
+        suffixes=("", "_baseline"),
+    )
+    res["seconds_ratio"] = (res["seconds"] / res["seconds_baseline"]).round(2)
+    res["peak_mb_ratio"] = (res["peak_mb"] / res["peak_mb_baseline"]).round(2)
+    res["regression"] = ((res["seconds_ratio"] > tolerance) & (res["seconds"] >= min_seconds)) | (
+        (res["peak_mb_ratio"] > tolerance) & (res["peak_mb"] >= min_peak_mb)
+    )
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000, 10000, 100000],
+        help="numbers of experimental replicates to simulate",
+    )
+    parser.add_argument("--reports", type=int, default=50, help="number of report groups")
+    parser.add_argument(
+        "--linker-sizes",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000],
+        help="numbers of stratification bedfiles to simulate",
+    )
+    parser.add_argument(
+        "--comparisons",
+        type=int,
+        default=100,
+        help="number of SV comparisons reading stratification subsets",
+    )
+    parser.add_argument("--baseline", default=BASELINE_FILENAME, help="stored baseline json")
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="replace the baseline with these results"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=2.0, help="allowed slowdown or growth factor"
+    )
+    args = parser.parse_args()
+    results = run_benchmark(args.sizes, args.reports, args.linker_sizes, args.comparisons)
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(results.to_string(index=False))
+        return
+    if not os.path.exists(args.baseline):
+        print(results.to_string(index=False))
+        return
+    comparison = compare_to_baseline(results, pd.read_json(args.baseline), args.tolerance)
+    print(comparison.to_string(index=False))
+    if comparison["regression"].any():
+        sys.exit("DAG construction regressed against baseline {}".format(args.baseline))
+
+
+if __name__ == "__main__":
+    main()
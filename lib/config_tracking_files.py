@@ -1,5 +1,8 @@
+import hashlib
+import json
 import os
 import pathlib
+import tempfile
 
 
 def construct_tracker_filename(results_prefix: str, analysis_name: str, output_tag) -> str:
@@ -13,45 +16,106 @@ def construct_tracker_filename(results_prefix: str, analysis_name: str, output_t
     return "{}/{}/{}.tracking".format(results_prefix, analysis_name, "/".join(tag))
 
 
-def update_analysis_tracking_file(
-    results_prefix: str, analysis_name: str, current_setting, output_tag: str
-) -> None:
+def hash_setting(setting) -> str:
+    """
+    Compute a short, stable digest of a configuration setting.
+    Dict keys are sorted, so equivalent settings in different orders hash the same.
     """
-    Conditionally update tracking files for configuration
-    settings, only if they have changed from the most recent
-    setting.
+    serialized = json.dumps(setting, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode()).hexdigest()[:16]
 
-    The hope is that by updating these files intelligently,
-    the pipeline can avoid some reruns that are particularly
-    computationally costly.
+
+def get_tracked_settings(config: dict) -> dict:
     """
-    tracker_filename = construct_tracker_filename(results_prefix, analysis_name, output_tag)
-    current_setting_for_comparison = current_setting
-    if current_setting is not None:
-        if type(current_setting) == int:
-            current_setting_for_comparison = [str(current_setting)]
-        elif type(current_setting) == str:
-            current_setting_for_comparison = [current_setting]
-        elif type(current_setting) == float:
-            current_setting_for_comparison = [str(current_setting)]
-        elif type(current_setting) == bool:
-            current_setting_for_comparison = [str(current_setting)]
-        current_setting_for_comparison = [
-            str(setting) for setting in current_setting_for_comparison
-        ]
-        current_setting_for_comparison.sort()
-    if pathlib.Path(tracker_filename).is_file():
-        if current_setting is None and os.stat(tracker_filename).st_size == 0:
-            return
-        with open(tracker_filename, "r") as f:
-            lines = [line.rstrip() for line in f.readlines()]
-            if lines == current_setting_for_comparison:
-                return
-    pathlib.Path(os.path.dirname(tracker_filename)).mkdir(parents=True, exist_ok=True)
+    Get the effective configuration settings that determine each tracked analysis,
+    keyed by tracker name.
+
+    Stratification sets are tracked individually by whether they are in use,
+    so that adding a set does not invalidate analyses of the others.
+    """
+    res = {}
+    for stratification_set in config["genomes"][config["genome-build"]]["stratification-regions"][
+        "region-inclusions"
+    ].keys():
+        if stratification_set != "*":
+            res[
+                "stratification-sets/{}/{}".format(config["genome-build"], stratification_set)
+            ] = "in-use"
+    res["happy"] = {
+        "happy-bedfiles-per-stratification": config["happy-bedfiles-per-stratification"],
+        "happy-stratification-packing": config.get("happy-stratification-packing", "position"),
+        "happy-stratification-mode": config.get("happy-stratification-mode", "per-set"),
+    }
+    for toolname in ["svanalyzer", "svdb", "truvari"]:
+        res[toolname] = config.get("sv-settings", {}).get(toolname)
+    return res
 
-    with open(tracker_filename, "w") as f:
-        if current_setting is not None:
-            f.writelines(setting + "\n" for setting in current_setting_for_comparison)
+
+def get_tracking_file(config: dict, results_prefix: str, name: str) -> str:
+    """
+    Get the tracker filename for the current setting of a tracked analysis.
+    The filename embeds a digest of the setting, so it only changes
+    when the setting's content changes.
+    """
+    return construct_tracker_filename(
+        results_prefix, "tracking/{}".format(name), hash_setting(get_tracked_settings(config)[name])
+    )
+
+
+class TrackingStore:
+    """
+    Record of tracked configuration settings, kept in a single json file.
+
+    Each tracked setting is identified by name and the digest of its content, and
+    has an empty tracker file whose path embeds that digest, for use as a rule input.
+    Tracker files are created once, the first time a digest is seen, and are never
+    rewritten, so their mtimes only move when a setting actually changes. A tracker
+    file that has been deleted is recreated, even if the stored record is unchanged.
+    """
+
+    def __init__(self, results_prefix: str):
+        self.results_prefix = results_prefix
+        self.filename = "{}/tracking/store.json".format(results_prefix)
+        self.digests = {}
+        if os.path.isfile(self.filename):
+            with open(self.filename, "r") as f:
+                self.digests = json.load(f)
+        self.pending = {}
+
+    def track(self, name: str, setting) -> str:
+        """
+        Register the current setting of a tracked analysis, returning its tracker filename
+        """
+        digest = hash_setting(setting)
+        tracker = construct_tracker_filename(
+            self.results_prefix, "tracking/{}".format(name), digest
+        )
+        if self.digests.get(name) != digest or not pathlib.Path(tracker).is_file():
+            self.pending[name] = digest
+        return tracker
+
+    def commit(self) -> None:
+        """
+        Create tracker files for new or changed settings, and replace
+        the json record in a single atomic write
+        """
+        if len(self.pending) == 0:
+            return
+        for name, digest in self.pending.items():
+            tracker = pathlib.Path(
+                construct_tracker_filename(self.results_prefix, "tracking/{}".format(name), digest)
+            )
+            tracker.parent.mkdir(parents=True, exist_ok=True)
+            if not tracker.is_file():
+                tracker.touch()
+        self.digests.update(self.pending)
+        self.pending = {}
+        pathlib.Path(os.path.dirname(self.filename)).mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", dir=os.path.dirname(self.filename), delete=False, suffix=".tmp"
+        ) as f:
+            json.dump(self.digests, f, indent=2, sort_keys=True)
+        os.replace(f.name, self.filename)
 
 
 def update_analysis_tracking_files(
@@ -66,23 +130,10 @@ def update_analysis_tracking_files(
     not when superfluous timestamp changes cause snakemake to think
     that something interesting has happened but in fact it hasn't.
     """
-    ## configuration data for ftp pulls of stratification sets
-    stratification_sets = [
-        x
-        for x in filter(
-            lambda z: z != "*",
-            config["genomes"][config["genome-build"]]["stratification-regions"][
-                "region-inclusions"
-            ].keys(),
-        )
-    ]
-    for stratification_set in stratification_sets:
-        update_analysis_tracking_file(
-            results_prefix,
-            "stratification-sets/{}".format(config["genome-build"]),
-            "in-use",
-            stratification_set,
-        )
+    store = TrackingStore(results_prefix)
+    for name, setting in get_tracked_settings(config).items():
+        store.track(name, setting)
+    store.commit()
 
 
 def get_ftp_tracking_files(config, results_prefix) -> list:
@@ -90,18 +141,9 @@ def get_ftp_tracking_files(config, results_prefix) -> list:
     Get the currently configured set of tracking files for
     stratification sets.
     """
-    stratification_sets = [
-        x
-        for x in filter(
-            lambda z: z != "*",
-            config["genomes"][config["genome-build"]]["stratification-regions"][
-                "region-inclusions"
-            ].keys(),
-        )
-    ]
+    prefix = "stratification-sets/{}/".format(config["genome-build"])
     return [
-        construct_tracker_filename(
-            results_prefix, "stratification-sets/{}".format(config["genome-build"]), x
-        )
-        for x in stratification_sets
+        get_tracking_file(config, results_prefix, x)
+        for x in get_tracked_settings(config)
+        if x.startswith(prefix)
     ]
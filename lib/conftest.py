@@ -1,3 +1,5 @@
+from types import SimpleNamespace
+
 import pandas as pd
 import pytest
 from snakemake.io import Namedlist
@@ -10,6 +12,7 @@ def config():
     """
     res = {
         "genome-build": "grch100",
+        "happy-bedfiles-per-stratification": 1,
         "genomes": {
             "grch99": {"confident-regions": {"reg1": "file1", "reg2": "file2"}},
             "grch100": {
@@ -52,6 +55,7 @@ def manifest_comparisons():
         {
             "experimental_dataset": ["exp1", "exp1", "exp2", "exp2"],
             "reference_dataset": ["ref1", "ref2", "ref1", "ref2"],
+            "comparison_type": ["SNV", "SNV", "SV", "SNV"],
             "report": ["comp2", "comp2,comp1", "comp3", "comp3,comp1"],
         }
     )
@@ -106,3 +110,61 @@ def wildcards_comparison():
     a rule that needs to map from unique identifier to vcf
     """
     return Namedlist(fromdict={"reference": "ref2", "experimental": "exp3"})
+
+
+@pytest.fixture
+def stratification_linker(tmp_path):
+    """
+    Stratification linker checkpoint output, mapping GA4GH-style
+    stratification set names to relative bedfile paths
+    """
+    res = tmp_path / "grch100.stratification_regions.tsv"
+    with open(res, "w") as f:
+        f.writelines(
+            "{}\t{}\n".format(x, y)
+            for x, y in [
+                ("*", "GRCh100-all.bed.gz"),
+                ("name2", "GenomeSpecific/name2.bed.gz"),
+                ("name3", "Other/name3.bed.gz"),
+                ("name1", "LowComplexity/name1.bed.gz"),
+            ]
+        )
+    return res
+
+
+@pytest.fixture
+def stratification_subset(tmp_path):
+    """
+    hap.py stratification subset checkpoint output, listing
+    the stratification sets assigned to subset index 0
+    """
+    res = tmp_path / "subsets_for_happy" / "0" / "stratification_subset.tsv"
+    res.parent.mkdir(parents=True)
+    with open(res, "w") as f:
+        f.write("name1\tresults/stratification-sets/grch100/LowComplexity/name1.bed.gz\n")
+        f.write("name2\tresults/stratification-sets/grch100/GenomeSpecific/name2.bed.gz\n")
+    return res
+
+
+@pytest.fixture
+def checkpoints(stratification_linker, stratification_subset):
+    """
+    Minimal emulation of snakemake checkpoints, exposing
+    the outputs of completed checkpoint jobs
+    """
+
+    class CompletedCheckpoint:
+        def __init__(self, output_function):
+            self.output_function = output_function
+
+        def get(self, **kwargs):
+            return SimpleNamespace(output=[self.output_function(**kwargs)])
+
+    return SimpleNamespace(
+        get_stratification_linker=CompletedCheckpoint(lambda **kwargs: stratification_linker),
+        happy_create_stratification_subset=CompletedCheckpoint(
+            lambda **kwargs: stratification_subset.parent.parent
+            / kwargs["stratification_set"]
+            / "stratification_subset.tsv"
+        ),
+    )
@@ -0,0 +1,175 @@
+import atexit
+import glob
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+## set this environment variable to a non-empty value to disable the persistent DAG cache
+DISABLE_ENVIRONMENT_VARIABLE = "WGS_VALIDATION_NO_DAG_CACHE"
+## location of the cache, relative to the workflow root
+DEFAULT_CACHE_DIR = ".snakemake/dag-cache"
+
+
+def hash_files(filenames: list) -> str:
+    """
+    Compute a digest of the names and contents of a set of files.
+    Missing files contribute only their names.
+    """
+    res = hashlib.sha256()
+    for filename in filenames:
+        res.update(str(filename).encode() + b"\0")
+        try:
+            with open(filename, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    res.update(block)
+        except FileNotFoundError:
+            res.update(b"missing")
+        res.update(b"\0")
+    return res.hexdigest()
+
+
+def hash_settings(*settings) -> str:
+    """
+    Compute a digest of configuration settings, independent of dict key order
+    """
+    serialized = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+def _atomic_write(filename: str, mode: str, write) -> None:
+    """
+    Write a file through a temporary file renamed into place, so that
+    concurrent snakemake processes never read a partial cache
+    """
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        mode, dir=os.path.dirname(filename), delete=False, suffix=".tmp"
+    ) as f:
+        write(f)
+    os.replace(f.name, filename)
+
+
+class DagCache:
+    """
+    Persistent cache of workflow startup and DAG construction results, shared
+    between snakemake invocations.
+
+    Startup results (whether the manifests validated, and the computed targets) are
+    stored under a key built from hashes of the configuration, the manifests, the
+    schemas and the workflow code; any change to these recomputes them. Parsed
+    checkpoint outputs are stored by path, parser, and file modification time and
+    size, as for the in-memory cache in target_construction.read_with_cache, and
+    are replaced when a checkpoint rewrites its output. They are also stored under
+    the same key as startup results, and all of them are dropped when it changes,
+    so that objects pickled by older workflow code are never loaded.
+
+    A disabled cache never reads or writes anything.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, enabled: bool = None):
+        if enabled is None:
+            enabled = len(os.environ.get(DISABLE_ENVIRONMENT_VARIABLE, "")) == 0
+        self.enabled = enabled
+        self.startup_file = os.path.join(cache_dir, "startup.json")
+        self.parsed_file = os.path.join(cache_dir, "parsed.pkl")
+        self.key = None
+        self.startup = {}
+        self._parsed = None
+        self._parsed_changed = False
+
+    def set_key(self, *components) -> None:
+        """
+        Set the key for startup results, and load them if stored under the same key
+        """
+        self.key = hash_settings(*components)
+        self.startup = {}
+        self._parsed = None
+        self._parsed_changed = False
+        if not self.enabled or not os.path.isfile(self.startup_file):
+            return
+        try:
+            with open(self.startup_file, "r") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        if stored.get("key") == self.key:
+            self.startup = stored.get("values", {})
+
+    def get(self, name: str, compute):
+        """
+        Get a startup result from the cache, or compute and store it.
+        Results must be json-serializable.
+        """
+        if name in self.startup:
+            return self.startup[name]
+        res = compute()
+        if self.enabled:
+            self.startup[name] = res
+            values = self.startup
+            _atomic_write(
+                self.startup_file, "w", lambda f: json.dump({"key": self.key, "values": values}, f)
+            )
+        return res
+
+    def parsed(self) -> dict:
+        """
+        Load, once, the parsed checkpoint outputs stored under the current key.
+        The key is pickled ahead of the entries, so entries stored by other
+        workflow code are never unpickled.
+        """
+        if self._parsed is None:
+            self._parsed = {}
+            if self.enabled and os.path.isfile(self.parsed_file):
+                try:
+                    with open(self.parsed_file, "rb") as f:
+                        if pickle.load(f) == self.key:
+                            self._parsed = pickle.load(f)
+                except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+                    self._parsed = {}
+        return self._parsed
+
+    def get_parsed(self, key: tuple, fingerprint: tuple, parse):
+        """
+        Get a parsed file from the cache if its fingerprint is unchanged,
+        or parse it and replace the stored copy
+        """
+        stored = self.parsed().get(key)
+        if stored is not None and stored[0] == fingerprint:
+            return stored[1]
+        res = parse()
+        if self.enabled:
+            self._parsed[key] = (fingerprint, res)
+            self._parsed_changed = True
+        return res
+
+    def flush(self) -> None:
+        """
+        Store parsed checkpoint outputs, if any were added
+        """
+        if not self.enabled or not self._parsed_changed:
+            return
+        key, parsed = self.key, self._parsed
+        _atomic_write(
+            self.parsed_file, "wb", lambda f: pickle.dump(key, f) or pickle.dump(parsed, f)
+        )
+        self._parsed_changed = False
+
+    def register_flush(self) -> None:
+        """
+        Store parsed checkpoint outputs when the interpreter exits.
+        Register this only in the main snakemake invocation, not in the
+        processes that run individual jobs, so they do not all rewrite the file.
+        """
+        atexit.register(self.flush)
+
+
+def get_code_files(workflow_root: str = ".") -> list:
+    """
+    Get the workflow code that determines startup results, for cache keys
+    """
+    patterns = ["lib/*.py", "workflow/Snakefile", "workflow/rules/*.smk", "schema/*.yaml"]
+    return sorted(
+        x for pattern in patterns for x in glob.glob(os.path.join(workflow_root, pattern))
+    )
@@ -0,0 +1,211 @@
+"""
+Download remote files over pooled http(s) connections, resuming
+interrupted transfers and verifying what was received.
+
+Single files can be fetched from the command line with:
+
+    python -m lib.download_manager URL DESTINATION [--sha256 CHECKSUM]
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+
+class DownloadError(Exception):
+    """
+    A remote file could not be fetched or failed verification
+    """
+
+
+def sha256sum(filename: str) -> str:
+    """
+    Compute the sha256 hex digest of a file
+    """
+    res = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1024**2), b""):
+            res.update(chunk)
+    return res.hexdigest()
+
+
+class DownloadManager:
+    """
+    Fetch files over a single pooled requests session.
+
+    Partial transfers are written next to the destination with a ".part" suffix and
+    resumed with a conditional Range request on retry, restarting if the file changed. Completed transfers are checked against the
+    size reported by the server and, if provided, an expected sha256 digest, and only
+    then moved into place, so the destination never holds a truncated file.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        retries: int = 3,
+        timeout: float = 60,
+        chunk_size: int = 64 * 1024,
+        backoff: float = 1,
+    ):
+        self.max_workers = max_workers
+        self.retries = retries
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @staticmethod
+    def _validator_file(partial: str) -> str:
+        """
+        Get the file recording the ETag or Last-Modified of the response a partial download began with
+        """
+        return "{}.validator".format(partial)
+
+    def _discard_partial(self, partial: str) -> None:
+        """
+        Remove a partial download and its validator
+        """
+        for filename in [partial, self._validator_file(partial)]:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def _transfer(self, url: str, partial: str) -> int:
+        """
+        Append the remainder of a remote file to a partial download,
+        returning the expected total size, or None if the server does not report it.
+
+        A partial download is only resumed with If-Range set to the strong ETag or
+        Last-Modified of the response it began with, so the server sends the whole
+        file again if it has changed since; a partial download without one is
+        restarted. Bodies are written as sent, without decoding any Content-Encoding,
+        so compressed files served with "Content-Encoding: gzip" stay compressed.
+        """
+        validator_file = self._validator_file(partial)
+        validator = None
+        if os.path.exists(validator_file):
+            with open(validator_file, "r") as f:
+                validator = f.read().strip()
+        if not validator:
+            self._discard_partial(partial)
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        headers = {"Accept-Encoding": "identity"}
+        if offset > 0:
+            headers.update({"Range": "bytes={}-".format(offset), "If-Range": validator})
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as r:
+            if r.status_code == 416:
+                total = r.headers.get("Content-Range", "").rpartition("/")[2]
+                if total.isdigit() and int(total) == offset:
+                    ## the partial download already holds the entire file
+                    return offset
+                ## the partial download does not belong to the current file
+                self._discard_partial(partial)
+                return self._transfer(url, partial)
+            r.raise_for_status()
+            if r.status_code == 206:
+                total = r.headers.get("Content-Range", "").rpartition("/")[2]
+                mode = "ab"
+            else:
+                total = r.headers.get("Content-Length")
+                mode = "wb"
+                etag = r.headers.get("ETag", "")
+                validator = etag if etag and not etag.startswith("W/") else ""
+                validator = validator or r.headers.get("Last-Modified", "")
+                with open(validator_file, "w") as f:
+                    f.write(validator)
+            with open(partial, mode) as f:
+                for chunk in r.raw.stream(self.chunk_size, decode_content=False):
+                    f.write(chunk)
+        return int(total) if total and total != "*" else None
+
+    def _fetch_other(self, source: str, partial: str) -> int:
+        """
+        Copy a local file or fetch an ftp url, without resume
+        """
+        if source.startswith("ftp://"):
+            with urllib.request.urlopen(source, timeout=self.timeout) as r, open(
+                partial, "wb"
+            ) as f:
+                shutil.copyfileobj(r, f, self.chunk_size)
+            return None
+        shutil.copyfile(source, partial)
+        return os.path.getsize(source)
+
+    def download(self, source: str, destination: str, sha256: str = None) -> str:
+        """
+        Fetch a single file to a destination path, retrying and resuming on failure
+        """
+        if os.path.exists(destination) and (sha256 is None or sha256sum(destination) == sha256):
+            return destination
+        os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+        partial = "{}.part".format(destination)
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                if source.startswith(("http://", "https://")):
+                    expected_size = self._transfer(source, partial)
+                else:
+                    expected_size = self._fetch_other(source, partial)
+            except (requests.RequestException, urllib3.exceptions.HTTPError, OSError) as e:
+                error = e
+                continue
+            observed_size = os.path.getsize(partial)
+            if expected_size is not None and observed_size != expected_size:
+                error = DownloadError(
+                    "{}: received {} of {} bytes".format(source, observed_size, expected_size)
+                )
+                if observed_size > expected_size:
+                    self._discard_partial(partial)
+                continue
+            if sha256 is not None and sha256sum(partial) != sha256:
+                self._discard_partial(partial)
+                error = DownloadError("{}: sha256 checksum mismatch".format(source))
+                continue
+            os.replace(partial, destination)
+            self._discard_partial(partial)
+            return destination
+        raise DownloadError("failed to download {}: {}".format(source, error))
+
+    def download_all(self, downloads: list) -> list:
+        """
+        Fetch (source, destination) pairs concurrently with a bounded thread pool.
+        All transfers are attempted; any failures are reported together afterwards.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.download, *x) for x in downloads]
+        failures = [x.exception() for x in futures if x.exception() is not None]
+        if len(failures) > 0:
+            raise DownloadError(
+                "{} of {} downloads failed:\n{}".format(
+                    len(failures), len(downloads), "\n".join(str(x) for x in failures)
+                )
+            )
+        return [x.result() for x in futures]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("source", help="http(s) or ftp url, or local path")
+    parser.add_argument("destination", help="local output path")
+    parser.add_argument("--sha256", default=None, help="expected sha256 digest")
+    parser.add_argument("--retries", type=int, default=3, help="attempts after the first")
+    args = parser.parse_args()
+    DownloadManager(max_workers=1, retries=args.retries).download(
+        args.source, args.destination, args.sha256
+    )
+
+
+if __name__ == "__main__":
+    main()
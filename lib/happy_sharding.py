@@ -0,0 +1,154 @@
+import pandas as pd
+
+## hap.py extended csv columns that identify a row rather than count something
+KEY_COLUMNS = ["Type", "Subtype", "Subset", "Filter", "Genotype", "QQ.Field", "QQ"]
+## binomial confidence bounds cannot be recovered by summing shards
+CONFIDENCE_COLUMNS = ["PREC.LOWER", "PREC.UPPER", "RECALL.LOWER", "RECALL.UPPER"]
+## describe the whole stratification rather than the shard, so they are the same in every shard
+SHARED_COLUMNS = ["Subset.Size", "Subset.Level"]
+
+
+def read_bed(filename: str) -> list:
+    """
+    Read (contig, start, end) intervals from a bedfile, skipping headers
+    """
+    res = []
+    with open(filename, "r") as f:
+        for line in f:
+            if line.startswith(("#", "track", "browser")) or len(line.strip()) == 0:
+                continue
+            line_data = line.split("\t")
+            res.append((line_data[0], int(line_data[1]), int(line_data[2])))
+    return res
+
+
+def shard_by_contig(intervals: list, n_shards: int) -> list:
+    """
+    Assign whole contigs to shards, balancing total bp per shard.
+
+    Contigs are placed largest first onto the currently smallest shard,
+    with ties broken by contig name and shard index, so assignment is
+    deterministic for a given bedfile.
+    """
+    contig_sizes = {}
+    for contig, start, end in intervals:
+        contig_sizes[contig] = contig_sizes.get(contig, 0) + end - start
+    loads = [0] * n_shards
+    assignment = {}
+    for contig in sorted(contig_sizes, key=lambda x: (-contig_sizes[x], x)):
+        shard = min(range(n_shards), key=lambda i: (loads[i], i))
+        assignment[contig] = shard
+        loads[shard] += contig_sizes[contig]
+    res = [[] for _ in range(n_shards)]
+    for contig, start, end in intervals:
+        res[assignment[contig]].append((contig, start, end))
+    return res
+
+
+def shard_by_chunk(intervals: list, n_shards: int) -> list:
+    """
+    Split intervals, in file order, into shards of approximately equal bp,
+    cutting intervals at shard boundaries where needed.
+    """
+    total = sum(end - start for contig, start, end in intervals)
+    target = total / n_shards if n_shards > 0 else 0
+    res = [[] for _ in range(n_shards)]
+    shard = 0
+    filled = 0
+    for contig, start, end in intervals:
+        while start < end:
+            if shard == n_shards - 1:
+                res[shard].append((contig, start, end))
+                break
+            remaining = int(round(target * (shard + 1))) - filled
+            if remaining <= 0:
+                shard += 1
+                continue
+            cut = min(end, start + remaining)
+            res[shard].append((contig, start, cut))
+            filled += cut - start
+            start = cut
+    return res
+
+
+def write_region_shards(bed: str, output_files: list, mode: str) -> None:
+    """
+    Split a confident region bedfile into one bedfile per output file,
+    either by whole contig ("contig") or by balanced genomic chunk ("chunk").
+    Shards with no assigned regions are written as empty files.
+    """
+    intervals = read_bed(bed)
+    if mode == "contig":
+        shards = shard_by_contig(intervals, len(output_files))
+    elif mode == "chunk":
+        shards = shard_by_chunk(intervals, len(output_files))
+    else:
+        raise ValueError('Unrecognized hap.py sharding mode: "{}"'.format(mode))
+    for output_file, shard in zip(output_files, shards):
+        with open(output_file, "w") as f:
+            f.writelines("{}\t{}\t{}\n".format(*x) for x in shard)
+
+
+def _ratio(numerator: pd.Series, denominator: pd.Series) -> pd.Series:
+    """
+    Compute a ratio of count columns, leaving undefined ratios missing
+    """
+    numerator = numerator.astype(float)
+    denominator = denominator.astype(float)
+    return (numerator / denominator).where(denominator > 0)
+
+
+def gather_extended_csvs(input_files: list, output_file: str) -> None:
+    """
+    Rebuild a hap.py extended csv from the extended csvs of region shards.
+
+    Count columns (TRUTH/QUERY totals, TP/FP/FN/UNK, and the confident size of
+    each subset) are summed across shards. Stratification size and level are
+    not limited to a shard, and are taken from the first shard. Precision, recall, F1, fraction not assessed,
+    and Ti/Tv and het/hom ratios are recomputed from the summed counts
+    rather than averaged. Binomial confidence bounds are left empty, as they
+    cannot be recovered from shard summaries. Empty shard outputs are skipped.
+    """
+    frames = []
+    for input_file in input_files:
+        try:
+            frames.append(pd.read_csv(input_file, dtype={"QQ": str}, keep_default_na=False))
+        except pd.errors.EmptyDataError:
+            continue
+    if len(frames) == 0:
+        open(output_file, "w").close()
+        return
+    df = pd.concat(frames, ignore_index=True)
+    columns = list(df.columns)
+    keys = [x for x in columns if x in KEY_COLUMNS]
+    values = [x for x in columns if x not in keys]
+    shared = [x for x in values if x in SHARED_COLUMNS]
+    summed = [x for x in values if x not in shared]
+    for column in summed:
+        df[column] = pd.to_numeric(df[column], errors="coerce")
+    grouped = df.groupby(keys, sort=False, dropna=False)
+    res = pd.concat([grouped[summed].sum(min_count=1), grouped[shared].first()], axis=1)
+    res = res.reset_index()
+
+    if {"TRUTH.TP", "TRUTH.FN"}.issubset(values):
+        res["METRIC.Recall"] = _ratio(res["TRUTH.TP"], res["TRUTH.TP"] + res["TRUTH.FN"])
+    if {"QUERY.TP", "QUERY.FP"}.issubset(values):
+        res["METRIC.Precision"] = _ratio(res["QUERY.TP"], res["QUERY.TP"] + res["QUERY.FP"])
+    if {"QUERY.UNK", "QUERY.TOTAL"}.issubset(values):
+        res["METRIC.Frac_NA"] = _ratio(res["QUERY.UNK"], res["QUERY.TOTAL"])
+    if {"METRIC.Recall", "METRIC.Precision"}.issubset(res.columns):
+        precision = res["METRIC.Precision"]
+        recall = res["METRIC.Recall"]
+        res["METRIC.F1_Score"] = _ratio(2 * precision * recall, precision + recall)
+    for column in values:
+        if column.endswith(".TiTv_ratio"):
+            prefix = column[: -len("TiTv_ratio")]
+            if prefix + "ti" in values and prefix + "tv" in values:
+                res[column] = _ratio(res[prefix + "ti"], res[prefix + "tv"])
+        elif column.endswith(".het_hom_ratio"):
+            prefix = column[: -len("het_hom_ratio")]
+            if prefix + "het" in values and prefix + "homalt" in values:
+                res[column] = _ratio(res[prefix + "het"], res[prefix + "homalt"])
+        elif column in CONFIDENCE_COLUMNS:
+            res[column] = float("nan")
+    res[columns].to_csv(output_file, index=False)
@@ -0,0 +1,204 @@
+import gzip
+
+import numpy as np
+import pandas as pd
+
+from lib.interval_index import IntervalIndex
+
+## hap.py variant types reported in extended csvs
+VARIANT_TYPES = ["SNP", "INDEL"]
+## hap.py filter levels: all query calls, or only passing query calls
+FILTERS = ["ALL", "PASS"]
+## counts computed post hoc for each subset, type and filter
+COUNT_COLUMNS = ["TRUTH.TP", "TRUTH.FN", "QUERY.TP", "QUERY.FP", "QUERY.UNK", "FP.gt", "FP.al"]
+## hap.py annotated vcf records are read in chunks of this many lines
+CHUNK_SIZE = 500_000
+
+
+def _read_header(f) -> list:
+    """
+    Consume vcf header lines from an open file, returning the column names
+    """
+    for line in f:
+        if line.startswith("#CHROM"):
+            return line.lstrip("#").rstrip("\n").split("\t")
+    raise ValueError("vcf has no #CHROM header line")
+
+
+def _format_fields(chunk: pd.DataFrame, sample: str, fields: list) -> pd.DataFrame:
+    """
+    Extract FORMAT fields for one sample, allowing FORMAT to vary between records
+    """
+    res = pd.DataFrame(".", index=chunk.index, columns=fields)
+    for layout, rows in chunk.groupby("FORMAT").groups.items():
+        keys = layout.split(":")
+        values = chunk.loc[rows, sample].str.split(":", expand=True)
+        for field in fields:
+            if field in keys and keys.index(field) < values.shape[1]:
+                res.loc[rows, field] = values[keys.index(field)].fillna(".")
+    return res
+
+
+def read_happy_vcf(filename: str, chunk_size: int = None):
+    """
+    Stream the annotated vcf written by hap.py, yielding for each chunk of records
+    their reference spans, whether the query call passed filters, and the hap.py
+    decision (BD), match kind (BK) and variant type (BVT) of each of the TRUTH and
+    QUERY samples.
+    """
+    opener = gzip.open if str(filename).endswith(".gz") else open
+    with opener(filename, "rt") as f:
+        columns = _read_header(f)
+        reader = pd.read_csv(
+            f,
+            sep="\t",
+            header=None,
+            names=columns,
+            usecols=["CHROM", "POS", "REF", "FILTER", "FORMAT", "TRUTH", "QUERY"],
+            dtype=str,
+            keep_default_na=False,
+            chunksize=chunk_size or CHUNK_SIZE,
+        )
+        for chunk in reader:
+            start = chunk["POS"].astype(np.int64).to_numpy() - 1
+            res = pd.DataFrame(
+                {
+                    "contig": chunk["CHROM"].to_numpy(),
+                    "start": start,
+                    "end": start + chunk["REF"].str.len().to_numpy(),
+                    "pass": chunk["FILTER"].isin(["PASS", "."]).to_numpy(),
+                }
+            )
+            for sample in ["TRUTH", "QUERY"]:
+                fields = _format_fields(chunk, sample, ["BD", "BK", "BVT"])
+                for field in fields.columns:
+                    res["{}.{}".format(sample, field)] = fields[field].to_numpy()
+            yield res
+
+
+def count_decisions(records: pd.DataFrame, variant_type: str, passing_only: bool) -> dict:
+    """
+    Count hap.py decisions for one variant type among a set of records.
+
+    Under the PASS filter, query calls failing filters are ignored, and truth
+    variants they matched are counted as false negatives.
+
+    As in hap.py, false positives matching truth alleles with a different genotype
+    (BK "am") are genotype mismatches, those with only a nearby truth variant (BK "lm")
+    are allele mismatches, and unmatched false positives are in neither count.
+    """
+    truth = records["TRUTH.BVT"] == variant_type
+    query = records["QUERY.BVT"] == variant_type
+    truth_tp = truth & (records["TRUTH.BD"] == "TP")
+    truth_fn = truth & (records["TRUTH.BD"] == "FN")
+    query_fp = query & (records["QUERY.BD"] == "FP")
+    query_tp = query & (records["QUERY.BD"] == "TP")
+    query_unk = query & (records["QUERY.BD"] == "UNK")
+    if passing_only:
+        truth_fn = truth_fn | (truth_tp & ~records["pass"])
+        truth_tp = truth_tp & records["pass"]
+        query_tp = query_tp & records["pass"]
+        query_fp = query_fp & records["pass"]
+        query_unk = query_unk & records["pass"]
+    return {
+        "TRUTH.TP": int(truth_tp.sum()),
+        "TRUTH.FN": int(truth_fn.sum()),
+        "QUERY.TP": int(query_tp.sum()),
+        "QUERY.FP": int(query_fp.sum()),
+        "QUERY.UNK": int(query_unk.sum()),
+        "FP.gt": int((query_fp & (records["QUERY.BK"] == "am")).sum()),
+        "FP.al": int((query_fp & (records["QUERY.BK"] == "lm")).sum()),
+    }
+
+
+def _ratio(numerator: pd.Series, denominator: pd.Series) -> pd.Series:
+    """
+    Compute a ratio of count columns, leaving undefined ratios missing
+    """
+    return (numerator / denominator.where(denominator > 0)).astype(float)
+
+
+def stratify_happy_vcf(vcf: str, stratifications: list, chunk_size: int = None) -> pd.DataFrame:
+    """
+    Compute per-stratification hap.py counts and metrics from the annotated vcf
+    of a single unstratified hap.py run.
+
+    The vcf is streamed once. A record is assigned to every stratification whose
+    bedfile it overlaps by at least one base. Rows follow the hap.py extended csv
+    schema for Subtype "*" and Genotype "*".
+    """
+    indices = [(name, IntervalIndex.from_bed(bed)) for name, bed in stratifications]
+    counts = {}
+    for records in read_happy_vcf(vcf, chunk_size):
+        for name, index in indices:
+            subset = records.loc[
+                index.overlaps(records["contig"], records["start"], records["end"])
+            ]
+            for variant_type in VARIANT_TYPES:
+                for filter_level in FILTERS:
+                    key = (variant_type, name, filter_level)
+                    observed = count_decisions(subset, variant_type, filter_level == "PASS")
+                    counts[key] = {
+                        x: counts.get(key, {}).get(x, 0) + observed[x] for x in COUNT_COLUMNS
+                    }
+    res = pd.DataFrame(
+        [
+            {
+                "Type": variant_type,
+                "Subtype": "*",
+                "Subset": name,
+                "Filter": filter_level,
+                "Genotype": "*",
+                "QQ.Field": "QUERY.TOTAL",
+                "QQ": "*",
+                **counts.get((variant_type, name, filter_level), dict.fromkeys(COUNT_COLUMNS, 0)),
+            }
+            for name, _ in stratifications
+            for variant_type in VARIANT_TYPES
+            for filter_level in FILTERS
+        ]
+    )
+    if len(res) == 0:
+        return res
+    res["TRUTH.TOTAL"] = res["TRUTH.TP"] + res["TRUTH.FN"]
+    res["QUERY.TOTAL"] = res["QUERY.TP"] + res["QUERY.FP"] + res["QUERY.UNK"]
+    res["METRIC.Recall"] = _ratio(res["TRUTH.TP"], res["TRUTH.TOTAL"])
+    res["METRIC.Precision"] = _ratio(res["QUERY.TP"], res["QUERY.TP"] + res["QUERY.FP"])
+    res["METRIC.Frac_NA"] = _ratio(res["QUERY.UNK"], res["QUERY.TOTAL"])
+    res["METRIC.F1_Score"] = _ratio(
+        2 * res["METRIC.Precision"] * res["METRIC.Recall"],
+        res["METRIC.Precision"] + res["METRIC.Recall"],
+    )
+    return res
+
+
+def write_post_hoc_stratified_csv(vcf: str, names: list, beds: list, output_file: str) -> None:
+    """
+    Write per-stratification hap.py rows for every stratification of a comparison,
+    from a single pass over the annotated vcf of its unstratified hap.py run.
+    Stratifications named more than once are only counted once.
+    """
+    stratifications = list(dict(zip(names, beds)).items())
+    stratify_happy_vcf(vcf, stratifications).to_csv(output_file, index=False)
+
+
+def write_post_hoc_extended_csv(
+    unstratified_csv: str, stratified_csv: str, names: list, output_file: str
+) -> None:
+    """
+    Write a hap.py extended csv for a stratification subset from a single
+    unstratified hap.py run.
+
+    Genome-wide ("*") rows are taken unchanged from the unstratified run's own
+    extended csv, and the subset's stratified rows are selected from the output of
+    write_post_hoc_stratified_csv. Columns that cannot be derived from the vcf, such
+    as subset sizes, Ti/Tv ratios and confidence bounds, are left empty for stratified rows.
+    """
+    background = pd.read_csv(unstratified_csv, dtype={"QQ": str}, keep_default_na=False)
+    background = background.loc[background["Subset"] == "*"]
+    stratified = pd.read_csv(stratified_csv, dtype={"QQ": str})
+    stratified = stratified.loc[stratified["Subset"].isin(names)]
+    res = pd.concat([background, stratified], ignore_index=True)
+    res[list(background.columns) + [x for x in res.columns if x not in background.columns]].to_csv(
+        output_file, index=False
+    )
@@ -0,0 +1,90 @@
+import gzip
+
+import numpy as np
+
+
+class IntervalIndex:
+    """
+    In-memory index of merged bed intervals, per contig, answering
+    vectorized containment queries with binary search.
+
+    Overlapping and abutting intervals are merged on construction, so each
+    query position falls in at most one indexed interval.
+    """
+
+    def __init__(self, intervals: list):
+        by_contig = {}
+        for contig, start, end in intervals:
+            by_contig.setdefault(contig, []).append((start, end))
+        ## contig -> (sorted merged starts, matching ends)
+        self.contigs = {}
+        for contig, spans in by_contig.items():
+            spans = np.array(sorted(spans), dtype=np.int64).reshape(-1, 2)
+            starts = spans[:, 0]
+            ends = np.maximum.accumulate(spans[:, 1])
+            ## a new merged interval begins wherever a start exceeds all previous ends
+            breaks = np.concatenate([[True], starts[1:] > ends[:-1]])
+            group = np.cumsum(breaks) - 1
+            merged_ends = np.zeros(group[-1] + 1, dtype=np.int64)
+            np.maximum.at(merged_ends, group, spans[:, 1])
+            self.contigs[contig] = (starts[breaks], merged_ends)
+
+    @classmethod
+    def from_bed(cls, filename: str) -> "IntervalIndex":
+        """
+        Build an index from a (possibly gzipped) bedfile, skipping headers
+        """
+        opener = gzip.open if str(filename).endswith(".gz") else open
+        intervals = []
+        with opener(filename, "rt") as f:
+            for line in f:
+                if line.startswith(("#", "track", "browser")) or len(line.strip()) == 0:
+                    continue
+                line_data = line.split("\t")
+                intervals.append((line_data[0], int(line_data[1]), int(line_data[2])))
+        return cls(intervals)
+
+    def contains(self, contigs: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """
+        Determine which half-open query spans lie entirely within a single
+        indexed interval. Zero-length spans (e.g. insertions) are treated
+        as covering the base at their start.
+        """
+        contigs = np.asarray(contigs)
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.maximum(np.asarray(ends, dtype=np.int64), starts + 1)
+        res = np.zeros(len(starts), dtype=bool)
+        for contig in np.unique(contigs):
+            if contig not in self.contigs:
+                continue
+            interval_starts, interval_ends = self.contigs[contig]
+            mask = contigs == contig
+            i = np.searchsorted(interval_starts, starts[mask], side="right") - 1
+            found = i >= 0
+            within = np.zeros(len(i), dtype=bool)
+            within[found] = interval_ends[i[found]] >= ends[mask][found]
+            res[mask] = within
+        return res
+
+    def overlaps(self, contigs: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """
+        Determine which half-open query spans overlap any indexed interval
+        by at least one base. Zero-length spans (e.g. insertions) are treated
+        as covering the base at their start.
+        """
+        contigs = np.asarray(contigs)
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.maximum(np.asarray(ends, dtype=np.int64), starts + 1)
+        res = np.zeros(len(starts), dtype=bool)
+        for contig in np.unique(contigs):
+            if contig not in self.contigs:
+                continue
+            interval_starts, interval_ends = self.contigs[contig]
+            mask = contigs == contig
+            ## only the last interval starting before the span ends can reach it
+            i = np.searchsorted(interval_starts, ends[mask], side="left") - 1
+            found = i >= 0
+            hit = np.zeros(len(i), dtype=bool)
+            hit[found] = interval_ends[i[found]] > starts[mask][found]
+            res[mask] = hit
+        return res
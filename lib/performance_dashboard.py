@@ -0,0 +1,255 @@
+import base64
+import json
+import os
+import re
+
+import pandas as pd
+from snakemake.io import Namedlist, regex
+
+## numeric columns written by snakemake's benchmark directive
+BENCHMARK_COLUMNS = [
+    "s",
+    "max_rss",
+    "max_vms",
+    "max_uss",
+    "max_pss",
+    "io_in",
+    "io_out",
+    "mean_load",
+    "cpu_time",
+]
+
+
+def read_benchmarks(
+    benchmark_patterns: dict, root: str = "results/performance_benchmarks"
+) -> pd.DataFrame:
+    """
+    Collect every benchmark tsv under a directory into a single table.
+
+    Each file is assigned to the first rule, in the order of benchmark_patterns
+    ({rule name: benchmark file pattern}), whose pattern matches its path, and the
+    wildcards parsed from the path are added as columns. Files that match no rule
+    are reported with a missing rule name. Repeated benchmark runs within a file
+    are kept as separate rows.
+    """
+    matchers = [(name, re.compile(regex(pattern))) for name, pattern in benchmark_patterns.items()]
+    frames = []
+    for directory, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if not filename.endswith(".tsv"):
+                continue
+            path = os.path.join(directory, filename)
+            try:
+                df = pd.read_csv(path, sep="\t")
+            except pd.errors.EmptyDataError:
+                continue
+            rule, wildcards = None, {}
+            for name, matcher in matchers:
+                match = matcher.match(path)
+                if match is not None:
+                    rule, wildcards = name, match.groupdict()
+                    break
+            df.insert(0, "path", path)
+            df.insert(0, "rule", rule)
+            for key, value in wildcards.items():
+                df[key] = value
+            frames.append(df)
+    if len(frames) == 0:
+        return pd.DataFrame(columns=["rule", "path"] + BENCHMARK_COLUMNS)
+    res = pd.concat(frames, ignore_index=True)
+    for column in BENCHMARK_COLUMNS:
+        if column in res.columns:
+            res[column] = pd.to_numeric(res[column], errors="coerce")
+    return res
+
+
+def requested_memory(rule: str, wildcards: dict, requested_mem_mb: dict) -> float:
+    """
+    Get the mem_mb a rule requests for a job with the given wildcards.
+
+    Rules may request memory as a number or as a function of wildcards; functions
+    that need more than wildcards (such as snakemake's default resources), or that
+    fail, give a missing value. Functions are evaluated now, so predictions from
+    benchmark history reflect the current history rather than that at submission.
+    """
+    value = requested_mem_mb.get(rule)
+    if callable(value):
+        try:
+            value = value(Namedlist(fromdict=wildcards))
+        except Exception:
+            return float("nan")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def add_memory_efficiency(benchmarks: pd.DataFrame, requested_mem_mb: dict) -> pd.DataFrame:
+    """
+    Annotate benchmark rows with requested memory and the fraction of it
+    used at peak (max_rss / mem_mb)
+    """
+    res = benchmarks.copy()
+    wildcard_columns = [
+        x for x in res.columns if x not in ["rule", "path", "h:m:s"] + BENCHMARK_COLUMNS
+    ]
+    res["mem_mb"] = [
+        requested_memory(
+            row["rule"],
+            {x: row[x] for x in wildcard_columns if isinstance(row[x], str)},
+            requested_mem_mb,
+        )
+        for _, row in res.iterrows()
+    ]
+    res["mem_efficiency"] = res["max_rss"] / res["mem_mb"].where(res["mem_mb"] > 0)
+    return res
+
+
+def summarize_rules(benchmarks: pd.DataFrame) -> pd.DataFrame:
+    """
+    Summarize benchmarked jobs per rule: job count, total and share of wall
+    and cpu hours, the distribution of wall time, and peak against requested
+    memory. Rules are ordered by total wall time, largest first.
+    """
+    df = benchmarks.assign(rule=benchmarks["rule"].fillna("(unmatched)"))
+    grouped = df.groupby("rule")
+    res = pd.DataFrame(
+        {
+            "jobs": grouped.size(),
+            "wall_hours": grouped["s"].sum() / 3600,
+            "cpu_hours": grouped["cpu_time"].sum() / 3600,
+            "min_s": grouped["s"].min(),
+            "median_s": grouped["s"].median(),
+            "p90_s": grouped["s"].quantile(0.9),
+            "max_s": grouped["s"].max(),
+            "max_rss_mb": grouped["max_rss"].max(),
+            "median_max_rss_mb": grouped["max_rss"].median(),
+            "median_mem_mb": grouped["mem_mb"].median(),
+            "median_mem_efficiency": grouped["mem_efficiency"].median(),
+            "max_mem_efficiency": grouped["mem_efficiency"].max(),
+        }
+    )
+    total = res["wall_hours"].sum()
+    res.insert(2, "wall_share", res["wall_hours"] / total if total > 0 else float("nan"))
+    return res.sort_values("wall_hours", ascending=False).reset_index()
+
+
+def read_job_metadata(metadata_dir: str = ".snakemake/metadata") -> list:
+    """
+    Reconstruct completed jobs from snakemake's per-output metadata records.
+
+    Records are stored under the urlsafe base64 encoding of each output path,
+    split into "@"-prefixed directories when long. Outputs of a single job share
+    a job hash; each job is reported once with all of its outputs, its inputs,
+    and its start and end times.
+    """
+    jobs = {}
+    for directory, _, filenames in os.walk(metadata_dir):
+        for filename in filenames:
+            record_path = os.path.join(directory, filename)
+            encoded = os.path.relpath(record_path, metadata_dir).split(os.sep)
+            try:
+                output = base64.urlsafe_b64decode("".join(x.lstrip("@") for x in encoded)).decode()
+                with open(record_path, "r") as f:
+                    record = json.load(f)
+            except (ValueError, OSError):
+                continue
+            if record.get("incomplete") or record.get("starttime") is None:
+                continue
+            key = (record["rule"], record.get("job_hash"), record["starttime"])
+            if key not in jobs:
+                jobs[key] = {
+                    "rule": record["rule"],
+                    "outputs": [],
+                    "inputs": record.get("input", []),
+                    "starttime": record["starttime"],
+                    "endtime": record["endtime"],
+                }
+            jobs[key]["outputs"].append(output)
+    return list(jobs.values())
+
+
+def critical_path(jobs: list) -> pd.DataFrame:
+    """
+    Find the chain of dependent jobs with the largest total runtime.
+
+    A job depends on another if it reads any of its outputs. Jobs are processed
+    in order of end time, which is a topological order for any single run, and
+    the longest chain ending at each job is extended from its slowest dependency.
+    """
+    columns = ["rule", "output", "seconds", "cumulative_seconds", "starttime", "endtime"]
+    if len(jobs) == 0:
+        return pd.DataFrame(columns=columns)
+    jobs = sorted(jobs, key=lambda x: x["endtime"])
+    producers = {}
+    for i, job in enumerate(jobs):
+        for output in job["outputs"]:
+            producers[output] = i
+    best = [0.0] * len(jobs)
+    previous = [None] * len(jobs)
+    for i, job in enumerate(jobs):
+        duration = max(job["endtime"] - job["starttime"], 0)
+        dependencies = [producers[x] for x in job["inputs"] if producers.get(x, i) < i]
+        if len(dependencies) > 0:
+            previous[i] = max(dependencies, key=lambda j: best[j])
+        best[i] = duration + (best[previous[i]] if previous[i] is not None else 0)
+    i = max(range(len(jobs)), key=lambda x: best[x])
+    res = []
+    while i is not None:
+        job = jobs[i]
+        res.append(
+            {
+                "rule": job["rule"],
+                "output": sorted(job["outputs"])[0],
+                "seconds": max(job["endtime"] - job["starttime"], 0),
+                "cumulative_seconds": best[i],
+                "starttime": pd.to_datetime(job["starttime"], unit="s"),
+                "endtime": pd.to_datetime(job["endtime"], unit="s"),
+            }
+        )
+        i = previous[i]
+    return pd.DataFrame(res[::-1], columns=columns)
+
+
+def write_performance_dashboard(
+    benchmark_patterns: dict,
+    requested_mem_mb: dict,
+    html_file: str,
+    tsv_file: str,
+    benchmark_dir: str = "results/performance_benchmarks",
+    metadata_dir: str = ".snakemake/metadata",
+) -> None:
+    """
+    Write the combined benchmark table as tsv, and an html dashboard with
+    per-rule summaries, the most oversized memory reservations, and the
+    critical path through completed jobs.
+    """
+    benchmarks = add_memory_efficiency(
+        read_benchmarks(benchmark_patterns, benchmark_dir), requested_mem_mb
+    )
+    benchmarks.to_csv(tsv_file, sep="\t", index=False)
+    summary = summarize_rules(benchmarks)
+    oversized = (
+        benchmarks.dropna(subset=["mem_efficiency"])
+        .sort_values("mem_efficiency")
+        .head(25)[["rule", "path", "s", "max_rss", "mem_mb", "mem_efficiency"]]
+    )
+    path = critical_path(read_job_metadata(metadata_dir))
+    sections = [
+        ("Per-rule totals", summary),
+        ("Least efficient memory reservations", oversized),
+        ("Critical path ({:.2f} hours)".format(path["seconds"].sum() / 3600), path),
+    ]
+    with open(html_file, "w") as f:
+        f.write("<html><head><title>Pipeline performance</title></head><body>\n")
+        f.write("<h1>Pipeline performance</h1>\n")
+        f.write(
+            "<p>{} benchmarked jobs, {:.2f} wall hours, {:.2f} cpu hours</p>\n".format(
+                len(benchmarks), benchmarks["s"].sum() / 3600, benchmarks["cpu_time"].sum() / 3600
+            )
+        )
+        for title, df in sections:
+            f.write("<h2>{}</h2>\n".format(title))
+            f.write(df.to_html(index=False, float_format="{:.3g}".format, na_rep=""))
+            f.write("\n")
+        f.write("</body></html>\n")
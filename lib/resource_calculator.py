@@ -1,4 +1,145 @@
+import os
 import random
+import subprocess
+import time
+from string import Formatter
+
+import numpy as np
+import pandas as pd
+from snakemake.io import glob_wildcards
+
+
+class PartitionSelector:
+    """
+    Uniform random choice among the partitions of a configured group
+    """
+
+    def choose(self, partitions: list) -> str:
+        return random.choice(partitions)
+
+
+class RoundRobinPartitionSelector(PartitionSelector):
+    """
+    Cycle through the partitions of each configured group in order
+    """
+
+    def __init__(self):
+        self._next = {}
+
+    def choose(self, partitions: list) -> str:
+        key = tuple(partitions)
+        index = self._next.get(key, 0)
+        self._next[key] = (index + 1) % len(partitions)
+        return partitions[index]
+
+
+class WeightedPartitionSelector(PartitionSelector):
+    """
+    Random choice among the partitions of a group, in proportion to
+    configured weights. Partitions without a configured weight get weight 1.
+    """
+
+    def __init__(self, weights: dict):
+        self.weights = weights
+
+    def choose(self, partitions: list) -> str:
+        return random.choices(partitions, [self.weights.get(x, 1) for x in partitions])[0]
+
+
+class LoadAwarePartitionSelector(PartitionSelector):
+    """
+    Choose the least occupied partition of a group, according to a queue status report.
+
+    The report is either the output of a shell command or the contents of a file,
+    with one whitespace-delimited "partition occupancy" pair per line. Reports are
+    reused for cache_seconds, so that DAG construction does not query the scheduler
+    once per job. Ties go to the first listed partition; if the report cannot be read,
+    or lists none of the partitions, selection falls back to uniform random choice.
+    """
+
+    def __init__(
+        self,
+        command: str = None,
+        filename: str = None,
+        cache_seconds: float = 30,
+        clock=time.monotonic,
+    ):
+        if command is None and filename is None:
+            raise ValueError("load-aware partition selection requires a load command or file")
+        self.command = command
+        self.filename = filename
+        self.cache_seconds = cache_seconds
+        self.clock = clock
+        self._occupancy = None
+        self._read_time = None
+
+    def read_occupancy(self) -> dict:
+        """
+        Read partition occupancy from the configured command or file
+        """
+        try:
+            if self.command is not None:
+                report = subprocess.run(
+                    self.command, shell=True, capture_output=True, text=True, check=True, timeout=30
+                ).stdout
+            else:
+                with open(self.filename, "r") as f:
+                    report = f.read()
+        except (OSError, subprocess.SubprocessError):
+            return {}
+        res = {}
+        for line in report.splitlines():
+            line_data = line.split()
+            if len(line_data) < 2:
+                continue
+            try:
+                res[line_data[0]] = float(line_data[1])
+            except ValueError:
+                continue
+        return res
+
+    def occupancy(self) -> dict:
+        """
+        Get partition occupancy, refreshing the report once it is older than the cache window
+        """
+        now = self.clock()
+        if self._read_time is None or now - self._read_time >= self.cache_seconds:
+            self._occupancy = self.read_occupancy()
+            self._read_time = now
+        return self._occupancy
+
+    def choose(self, partitions: list) -> str:
+        occupancy = self.occupancy()
+        known = [x for x in partitions if x in occupancy]
+        if len(known) == 0:
+            return random.choice(partitions)
+        return min(known, key=lambda x: occupancy[x])
+
+
+_partition_selector = PartitionSelector()
+
+
+def configure_partition_selection(settings: dict) -> None:
+    """
+    Set the strategy used by select_partition from the "partition-selection"
+    block of the resource configuration
+    """
+    global _partition_selector
+    strategy = settings.get("strategy", "random")
+    if strategy == "random":
+        _partition_selector = PartitionSelector()
+    elif strategy == "round-robin":
+        _partition_selector = RoundRobinPartitionSelector()
+    elif strategy == "weighted":
+        _partition_selector = WeightedPartitionSelector(settings.get("weights", {}))
+    elif strategy == "load-aware":
+        _partition_selector = LoadAwarePartitionSelector(
+            settings.get("load-command"),
+            settings.get("load-file"),
+            settings.get("cache-seconds", 30),
+        )
+    else:
+        raise ValueError('Unrecognized partition selection strategy: "{}"'.format(strategy))
 
 
 def select_partition(partitionname: str, all_partitions: dict) -> str:
@@ -7,9 +148,237 @@ def select_partition(partitionname: str, all_partitions: dict) -> str:
     yaml array of partition names to select partition targets for a rule resource
     """
     if partitionname in all_partitions.keys():
-        return random.choice(all_partitions[partitionname])
+        return _partition_selector.choose(all_partitions[partitionname])
     raise ValueError(
         "Configured partition set does not match anything in user resource config: {}".format(
             partitionname
         )
     )
+
+
+def get_partition_selector(partitionname: str, all_partitions: dict):
+    """
+    Get a rule resource function that selects a partition separately for each job,
+    so that load-aware and round-robin selection can spread jobs of the same rule.
+    Unknown partition groups are reported when the rule is defined.
+    """
+    select_partition(partitionname, all_partitions)
+    return lambda wildcards: select_partition(partitionname, all_partitions)
+
+
+def read_benchmark(filename: str) -> dict:
+    """
+    Read peak memory (MB) and wall time (minutes) from a snakemake benchmark tsv.
+    Repeated benchmark runs are reduced to their maximum.
+    """
+    df = pd.read_csv(filename, sep="\t")
+    max_rss = pd.to_numeric(df["max_rss"], errors="coerce").max()
+    seconds = pd.to_numeric(df["s"], errors="coerce").max()
+    return {"mem_mb": max_rss, "runtime": seconds / 60}
+
+
+def total_file_size_mb(filenames: list) -> float:
+    """
+    Sum the sizes of a set of files in MB, or return None if any is missing
+    """
+    try:
+        return sum(os.stat(x).st_size for x in filenames) / 1024**2
+    except FileNotFoundError:
+        return None
+
+
+class ResourcePredictor:
+    """
+    Predict per-job memory and runtime for a rule from its own benchmark history.
+
+    Each benchmark tsv matching the rule's benchmark pattern is paired with the total size
+    of the inputs named by input_files for the same wildcards, and peak memory and wall time
+    are fit as linear functions of that size. Predictions are inflated by margin and bounded
+    by the configured limits. Until enough observations are available, the configured
+    static memory and default runtime are used instead. The fit is computed on first use
+    and shared by every job of the rule; a disabled predictor never reads history.
+    """
+
+    def __init__(
+        self,
+        benchmark_pattern: str,
+        input_files,
+        mem_mb: int,
+        runtime: int,
+        margin: float = 1.25,
+        min_observations: int = 5,
+        min_mem_mb: int = 0,
+        enabled: bool = True,
+    ):
+        self.benchmark_pattern = benchmark_pattern
+        self.input_files = input_files
+        self.max_mem_mb = mem_mb
+        self.default_runtime = runtime
+        self.margin = margin
+        self.min_observations = min_observations
+        self.min_mem_mb = min_mem_mb
+        self._models = None if enabled else {}
+
+    def observations(self) -> pd.DataFrame:
+        """
+        Collect (input size, peak memory, wall time) for each completed benchmark
+        """
+        pattern_wildcards = glob_wildcards(self.benchmark_pattern)
+        names = pattern_wildcards._fields
+        res = []
+        for values in zip(*pattern_wildcards):
+            wildcards = pattern_wildcards.__class__(*values)
+            size = total_file_size_mb(self.input_files(wildcards))
+            if size is None:
+                continue
+            observed = read_benchmark(self.benchmark_pattern.format(**dict(zip(names, values))))
+            res.append({"size_mb": size, **observed})
+        return pd.DataFrame(res, columns=["size_mb", "mem_mb", "runtime"]).dropna()
+
+    def models(self) -> dict:
+        """
+        Fit, once, intercept and slope of memory and runtime against input size
+        """
+        if self._models is None:
+            self._models = {}
+            df = self.observations()
+            if len(df) >= self.min_observations:
+                design = np.column_stack([np.ones(len(df)), df["size_mb"]])
+                for column in ["mem_mb", "runtime"]:
+                    coefficients = np.linalg.lstsq(design, df[column].to_numpy(), rcond=None)[0]
+                    ## never predict below what was already observed to be needed
+                    self._models[column] = (coefficients, df[column].min())
+        return self._models
+
+    def predict(self, column: str, wildcards) -> float:
+        """
+        Predict a resource for a job, or return None without a usable fit
+        """
+        if column not in self.models():
+            return None
+        size = total_file_size_mb(self.input_files(wildcards))
+        if size is None:
+            return None
+        coefficients, floor = self.models()[column]
+        return max(coefficients[0] + coefficients[1] * size, floor) * self.margin
+
+    def mem_mb(self, wildcards) -> int:
+        """
+        Per-job memory in MB, bounded by the configured minimum and maximum
+        """
+        predicted = self.predict("mem_mb", wildcards)
+        if predicted is None:
+            return self.max_mem_mb
+        return int(min(max(np.ceil(predicted), self.min_mem_mb), self.max_mem_mb))
+
+    def runtime(self, wildcards) -> int:
+        """
+        Per-job runtime in minutes
+        """
+        predicted = self.predict("runtime", wildcards)
+        if predicted is None:
+            return self.default_runtime
+        return max(int(np.ceil(predicted)), 1)
+
+
+def get_resource_predictor(
+    config_resources: dict, tool_resources: dict, benchmark_pattern: str, input_files
+) -> ResourcePredictor:
+    """
+    Construct a benchmark-driven predictor for a tool's configured resources block,
+    using the settings under "resource-prediction". When prediction is disabled,
+    the predictor has no history and always returns the configured values.
+    """
+    settings = config_resources.get("resource-prediction", {})
+    return ResourcePredictor(
+        benchmark_pattern,
+        input_files,
+        tool_resources["memory"],
+        settings.get("default-runtime", 1440),
+        settings.get("margin", 1.25),
+        settings.get("min-observations", 5),
+        settings.get("min-memory", 0),
+        settings.get("enabled", False),
+    )
+
+
+def count_oom_records(marker: str) -> int:
+    """
+    Count the out-of-memory failures recorded for a job by workflow/scripts/oom_guard.bash
+    """
+    try:
+        with open(marker, "r") as f:
+            return sum(1 for line in f if len(line.strip()) > 0)
+    except FileNotFoundError:
+        return 0
+
+
+class MemoryEscalation:
+    """
+    Per-job memory that grows on snakemake retries (`--retries`) of jobs that
+    ran out of memory.
+
+    The base request is a fixed value or a function of wildcards (such as a
+    ResourcePredictor). Each retry multiplies it by factor, up to max_mem_mb,
+    but only for as many retries as the job's marker file records
+    out-of-memory failures: jobs failing for other reasons are retried at
+    the same size. A ceiling below the base request leaves the base unchanged.
+    """
+
+    def __init__(self, mem_mb, marker_pattern: str, factor: float = 1.5, max_mem_mb: int = None):
+        self.base_mem_mb = mem_mb
+        self.marker_pattern = marker_pattern
+        self.factor = factor
+        self.max_mem_mb = max_mem_mb
+
+    def marker(self, wildcards) -> str:
+        """
+        Get the out-of-memory marker file for a job
+        """
+        names = [x[1] for x in Formatter().parse(self.marker_pattern) if x[1] is not None]
+        return self.marker_pattern.format(**{x: getattr(wildcards, x) for x in names})
+
+    def base(self, wildcards) -> int:
+        """
+        Get the memory requested for a job's first attempt
+        """
+        if callable(self.base_mem_mb):
+            return int(self.base_mem_mb(wildcards))
+        return int(self.base_mem_mb)
+
+    def mem_mb(self, wildcards, attempt: int = 1) -> int:
+        """
+        Per-job memory in MB for a given attempt
+        """
+        base = self.base(wildcards)
+        escalations = min(attempt - 1, count_oom_records(self.marker(wildcards)))
+        if escalations <= 0:
+            return base
+        res = int(np.ceil(base * self.factor**escalations))
+        if self.max_mem_mb is not None:
+            res = min(res, max(self.max_mem_mb, base))
+        return res
+
+
+def get_memory_escalation(config_resources: dict, mem_mb, marker_pattern: str) -> MemoryEscalation:
+    """
+    Construct attempt-aware memory for a rule from a base request,
+    using the settings under "memory-escalation"
+    """
+    settings = config_resources.get("memory-escalation", {})
+    return MemoryEscalation(
+        mem_mb,
+        marker_pattern,
+        settings.get("factor", 1.5),
+        settings.get("max-memory"),
+    )
+
+
+def jvm_heap(config_resources: dict, mem_mb: int) -> str:
+    """
+    Format a JVM heap size (as for RTG_MEM) as the configured fraction of a job's
+    memory, under "memory-escalation", leaving the remainder for the process
+    outside the heap
+    """
+    fraction = config_resources.get("memory-escalation", {}).get("jvm-fraction", 0.5)
+    return "{}m".format(max(int(mem_mb * fraction), 1))
@@ -0,0 +1,30 @@
+def combine_extended_results(
+    input_files: list,
+    output_file: str,
+    experimental: str,
+    reference: str,
+    region: str,
+) -> None:
+    """
+    Stream hap.py-format extended csvs from separate stratification sets
+    into a single csv, prefixing each row with the experimental, reference,
+    and region identifiers.
+
+    Each input is read once and the merged output is written in the same pass.
+    Only the first header encountered is emitted; empty inputs, which can be
+    produced by SV comparisons with no variants, are skipped.
+    """
+    header_prefix = "Experimental,Reference,Region,"
+    row_prefix = "{},{},{},".format(experimental, reference, region)
+    header_written = False
+    with open(output_file, "w") as out:
+        for input_file in input_files:
+            with open(input_file, "r") as f:
+                header = f.readline()
+                if not header:
+                    continue
+                if not header_written:
+                    out.write(header_prefix + header.rstrip("\n") + "\n")
+                    header_written = True
+                for line in f:
+                    out.write(row_prefix + line.rstrip("\n") + "\n")
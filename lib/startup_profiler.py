@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+## set this environment variable to a non-empty value to report Snakefile startup timings
+PROFILE_ENVIRONMENT_VARIABLE = "WGS_VALIDATION_PROFILE_STARTUP"
+
+
+class StartupProfiler:
+    """
+    Accumulate wall time spent in named stages of workflow startup,
+    such as imports, manifest loading, schema validation and target construction.
+
+    Disabled profilers time nothing and report nothing, so stages can be
+    left in place at negligible cost.
+    """
+
+    def __init__(self, enabled: bool = None, stream=None):
+        if enabled is None:
+            enabled = len(os.environ.get(PROFILE_ENVIRONMENT_VARIABLE, "")) > 0
+        self.enabled = enabled
+        self.stream = stream if stream is not None else sys.stderr
+        self.timings = {}
+        self.start_time = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time a block of startup code, adding to any previous time under the same name
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def report(self) -> str:
+        """
+        Format stage timings, in order of first use, along with
+        total time since the profiler was created
+        """
+        total = time.perf_counter() - self.start_time
+        width = max([len(x) for x in self.timings] + [len("total")])
+        lines = ["startup profile:"]
+        for name, seconds in self.timings.items():
+            lines.append(
+                "  {:<{}}  {:8.3f}s  {:5.1f}%".format(
+                    name, width, seconds, 100 * seconds / total if total > 0 else 0
+                )
+            )
+        lines.append("  {:<{}}  {:8.3f}s".format("total", width, total))
+        return "\n".join(lines)
+
+    def write_report(self) -> None:
+        """
+        Write the timing report to the configured stream, if enabled
+        """
+        if self.enabled:
+            print(self.report(), file=self.stream)
@@ -1,17 +1,33 @@
+import gzip
+import hashlib
 import os
 import re
+from functools import lru_cache
 from math import ceil
 
 import pandas as pd
 from snakemake.checkpoints import Checkpoints
-from snakemake.io import AnnotatedString, Namedlist, Wildcards, expand
-from snakemake.remote.FTP import RemoteProvider as FTPRemoteProvider
-from snakemake.remote.HTTP import RemoteProvider as HTTPRemoteProvider
-from snakemake.remote.S3 import RemoteProvider as S3RemoteProvider
+from snakemake.io import AnnotatedString, Namedlist, expand
 
-FTP = FTPRemoteProvider()
-S3 = S3RemoteProvider()
-HTTP = HTTPRemoteProvider()
+
+@lru_cache(maxsize=None)
+def get_remote_provider(protocol: str):
+    """
+    Create the snakemake remote provider for a protocol on first use.
+
+    Importing and instantiating the providers pulls in boto3 and ftputil, which is
+    wasted work for the many invocations (dry runs, cluster jobs) that never touch
+    a remote file of that type.
+    """
+    if protocol == "s3":
+        from snakemake.remote.S3 import RemoteProvider
+    elif protocol == "http":
+        from snakemake.remote.HTTP import RemoteProvider
+    elif protocol == "ftp":
+        from snakemake.remote.FTP import RemoteProvider
+    else:
+        raise ValueError('Unrecognized remote protocol: "{}"'.format(protocol))
+    return RemoteProvider()
 
 
 def annotate_remote_file(fn: str):
@@ -24,9 +40,9 @@ def annotate_remote_file(fn: str):
     the rule is queued.
     """
     if fn.startswith("https://") or fn.startswith("http://"):
-        return HTTP.remote(fn)
+        return get_remote_provider("http").remote(fn)
     if fn.startswith("s3://"):
-        return S3.remote(fn)
+        return get_remote_provider("s3").remote(fn)
     return fn
 
 
@@ -36,14 +52,135 @@ def wrap_remote_file(fn: str) -> str | AnnotatedString:
     """
     mapped_name = fn
     if mapped_name.startswith("s3://"):
-        return S3.remote(mapped_name)
+        return get_remote_provider("s3").remote(mapped_name)
     elif mapped_name.startswith("https://") or mapped_name.startswith("http://"):
-        return HTTP.remote(mapped_name)
+        return get_remote_provider("http").remote(mapped_name)
     elif mapped_name.startswith("ftp://"):
-        return FTP.remote(mapped_name)
+        return get_remote_provider("ftp").remote(mapped_name)
     return mapped_name
 
 
+class ComparisonIndex:
+    """
+    Lookup tables linking report names to the comparisons, replicates,
+    and variant types they require, along with per-dataset vcf lists.
+
+    Snakemake evaluates input functions once per job, so scanning the
+    manifests on every call scales with the product of manifest size and
+    job count. The index is built in a single pass across whichever
+    manifests are provided, after which all queries are dict lookups.
+    """
+
+    def __init__(
+        self,
+        manifest_comparisons: pd.DataFrame = None,
+        manifest_experiment: pd.DataFrame = None,
+        manifest_reference: pd.DataFrame = None,
+    ):
+        self.sources = (manifest_comparisons, manifest_experiment, manifest_reference)
+        ## report -> list of (experimental, reference, comparison_type), in manifest order
+        self.comparisons = {}
+        ## report -> set of comparison types requested by that report
+        self.comparison_types = {}
+        ## report -> unique experimental datasets, as dict keys to preserve manifest order
+        self.experimental_datasets = {}
+        ## experimental dataset -> list of replicates
+        self.dataset_replicates = {}
+        ## experimental dataset -> list of vcfs, in manifest order
+        self.experimental_vcfs = {}
+        ## reference dataset -> vcf
+        self.reference_vcfs = {}
+        ## report -> set of replicates, filled lazily from the above
+        self._report_replicates = {}
+
+        if manifest_experiment is not None:
+            for experimental, replicate, vcf in zip(
+                manifest_experiment["experimental_dataset"],
+                manifest_experiment["replicate"],
+                manifest_experiment["vcf"],
+            ):
+                self.dataset_replicates.setdefault(experimental, []).append(replicate)
+                self.experimental_vcfs.setdefault(experimental, []).append(vcf)
+        if manifest_reference is not None:
+            for reference, vcf in zip(
+                manifest_reference["reference_dataset"], manifest_reference["vcf"]
+            ):
+                self.reference_vcfs[reference] = vcf
+        if manifest_comparisons is not None:
+            for experimental, reference, comparison_type, report in zip(
+                manifest_comparisons["experimental_dataset"],
+                manifest_comparisons["reference_dataset"],
+                manifest_comparisons["comparison_type"],
+                manifest_comparisons["report"],
+            ):
+                for comparison in report.split(","):
+                    self.comparisons.setdefault(comparison, []).append(
+                        (experimental, reference, comparison_type)
+                    )
+                    self.comparison_types.setdefault(comparison, set()).add(comparison_type)
+                    self.experimental_datasets.setdefault(comparison, {})[experimental] = None
+
+    def is_built_from(
+        self,
+        manifest_comparisons: pd.DataFrame,
+        manifest_experiment: pd.DataFrame,
+        manifest_reference: pd.DataFrame,
+    ) -> bool:
+        """
+        Determine whether this index was constructed from exactly these manifest objects
+        """
+        return all(
+            x is y
+            for x, y in zip(
+                self.sources, (manifest_comparisons, manifest_experiment, manifest_reference)
+            )
+        )
+
+    def reports(self) -> list:
+        """
+        Get all report names, in order of first appearance in the comparisons manifest
+        """
+        return list(self.comparisons.keys())
+
+    def report_replicates(self, comparison: str) -> set:
+        """
+        Get the set of experimental replicates included in a report
+        """
+        if comparison not in self._report_replicates:
+            res = set()
+            for experimental in self.experimental_datasets.get(comparison, []):
+                res.update(self.dataset_replicates.get(experimental, []))
+            self._report_replicates[comparison] = res
+        return self._report_replicates[comparison]
+
+
+_comparison_index_cache = {}
+
+
+def get_comparison_index(
+    manifest_comparisons: pd.DataFrame = None,
+    manifest_experiment: pd.DataFrame = None,
+    manifest_reference: pd.DataFrame = None,
+) -> ComparisonIndex:
+    """
+    Get a ComparisonIndex for a set of manifests, building it only
+    the first time that combination of manifests is seen.
+
+    Manifests are keyed by object identity. The cached index holds a
+    reference to each manifest, so identities cannot be recycled while
+    the cache entry exists. Manifests are loaded once in the Snakefile
+    and not modified afterwards, so identity is sufficient here.
+    """
+    key = (id(manifest_comparisons), id(manifest_experiment), id(manifest_reference))
+    res = _comparison_index_cache.get(key)
+    if res is None or not res.is_built_from(
+        manifest_comparisons, manifest_experiment, manifest_reference
+    ):
+        res = ComparisonIndex(manifest_comparisons, manifest_experiment, manifest_reference)
+        _comparison_index_cache[key] = res
+    return res
+
+
 def get_benchmarking_output_files(
     wildcards,
     config,
@@ -56,22 +193,17 @@ def get_benchmarking_output_files(
     Comparisons are specified as rows in manifest_comparisons. The entries in those
     two columns *should* exist as indices in the corresponding other manifests.
     """
+    index = get_comparison_index(manifest_comparisons)
     res = []
-    for reference, experimental, comparison_type, report in zip(
-        manifest_comparisons["reference_dataset"],
-        manifest_comparisons["experimental_dataset"],
-        manifest_comparisons["comparison_type"],
-        manifest_comparisons["report"],
-    ):
-        if wildcards.comparison in report.split(","):
-            res.append(
-                "results/{}/{}/{}/{}/results.extended.csv".format(
-                    "happy" if comparison_type == "SNV" else config["sv-toolname"],
-                    experimental,
-                    reference,
-                    wildcards.region,
-                )
+    for experimental, reference, comparison_type in index.comparisons.get(wildcards.comparison, []):
+        res.append(
+            "results/{}/{}/{}/{}/results.extended.csv".format(
+                "happy" if comparison_type == "SNV" else config["sv-toolname"],
+                experimental,
+                reference,
+                wildcards.region,
             )
+        )
     return res
 
 
@@ -84,18 +216,8 @@ def get_happy_comparison_subjects(
     Use configuration and manifest data to generate the set of subjects
     included in a specific comparison set.
     """
-    res = []
-    for experimental, report in zip(
-        manifest_comparisons["experimental_dataset"],
-        manifest_comparisons["report"],
-    ):
-        if wildcards.comparison in report.split(","):
-            res.extend(
-                manifest_experiment.loc[
-                    manifest_experiment["experimental_dataset"] == experimental, "replicate"
-                ].to_list()
-            )
-    return list(set(res))
+    index = get_comparison_index(manifest_comparisons, manifest_experiment)
+    return list(index.report_replicates(wildcards.comparison))
 
 
 def get_variant_types(manifest_comparisons: pd.DataFrame, comparison: str) -> list:
@@ -103,18 +225,16 @@ def get_variant_types(manifest_comparisons: pd.DataFrame, comparison: str) -> li
     Determine the variant types that should be queried from hap.py output files
     based on requested comparison type
     """
+    index = get_comparison_index(manifest_comparisons)
     res = []
-    for report, comparison_type in zip(
-        manifest_comparisons["report"], manifest_comparisons["comparison_type"]
-    ):
-        if comparison in report.split(","):
-            if comparison_type == "SV":
-                res.append("SV")
-            elif comparison_type == "SNV":
-                res.append("SNP")
-                res.append("INDEL")
-            else:
-                raise ValueError('Unrecognized comparison type: "{}"'.format(comparison_type))
+    for comparison_type in index.comparison_types.get(comparison, set()):
+        if comparison_type == "SV":
+            res.append("SV")
+        elif comparison_type == "SNV":
+            res.append("SNP")
+            res.append("INDEL")
+        else:
+            raise ValueError('Unrecognized comparison type: "{}"'.format(comparison_type))
     return list(set(res))
 
 
@@ -125,29 +245,17 @@ def construct_targets(
     Use comparison manifest data to generate the set of comparisons
     required for a full pipeline run.
     """
-    comparisons = [x.split(",") for x in manifest_comparisons["report"]]
-    comparisons = [x for y in comparisons for x in y]
+    index = get_comparison_index(manifest_comparisons, manifest_experiment)
+    confident_regions = config["genomes"][config["genome-build"]]["confident-regions"]
     res = []
-    for comparison in comparisons:
+    for comparison in index.reports():
         regions = []
-        confident_regions = config["genomes"][config["genome-build"]]["confident-regions"]
         for region in confident_regions:
             if "inclusion" in confident_regions[region]:
-                target_subjects = []
-                for experimental, report in zip(
-                    manifest_comparisons["experimental_dataset"], manifest_comparisons["report"]
-                ):
-                    if comparison in report.split(","):
-                        target_subjects.extend(
-                            manifest_experiment.loc[
-                                manifest_experiment["experimental_dataset"] == experimental,
-                                "replicate",
-                            ].to_list()
-                        )
-                target_subjects = list(set(target_subjects))
                 target_pattern = re.compile(confident_regions[region]["inclusion"])
-                target_subjects = list(filter(target_pattern.match, target_subjects))
-                if len(target_subjects) > 0:
+                if any(
+                    target_pattern.match(subject) for subject in index.report_replicates(comparison)
+                ):
                     regions.append(region)
             else:
                 regions.append(region)
@@ -189,45 +297,419 @@ def map_experimental_file(wildcards: Namedlist, manifest: pd.DataFrame) -> str |
     ## and return wrapped objects related to the remote provider service when appropriate.
     ## There have been periodic issues with the remote provider interface, but it seems
     ## to be working, somewhat inefficiently but very conveniently, for the time being.
-    mapped_names = manifest[manifest["experimental_dataset"] == wildcards.experimental]["vcf"]
+    mapped_names = get_comparison_index(manifest_experiment=manifest).experimental_vcfs.get(
+        wildcards.experimental, []
+    )
     res = [annotate_remote_file(x) for x in mapped_names]
     return res
 
 
-def get_happy_stratification_by_index(wildcards, config, checkpoints):
+def get_source_id(source: str, sha256: str = "") -> str:
     """
-    Given the index of a stratification region in its original annotation file,
-    return the list of implicated entries.
+    Get the input store identifier of a vcf source (url or path),
+    and its expected sha256 checksum if declared
     """
-    beds_per_set = config["happy-bedfiles-per-stratification"]
-    stratification_sets = [
-        x
-        for x in filter(
-            lambda z: z != "*",
-            config["genomes"][config["genome-build"]]["stratification-regions"][
-                "region-inclusions"
-            ].keys(),
-        )
-    ]
-    regions = pd.read_table(
+    return hashlib.sha256("{}\t{}".format(source, sha256).encode()).hexdigest()[:20]
+
+
+def _optional_column(manifest: pd.DataFrame, column: str) -> list:
+    """
+    Get the values of an optional manifest column, with empty strings where absent
+    """
+    if column not in manifest.columns:
+        return [""] * len(manifest)
+    return ["" if pd.isna(x) else str(x) for x in manifest[column]]
+
+
+class InputStore:
+    """
+    Content-addressed layout of the input vcfs named in the manifests.
+
+    Each distinct source (url or path, along with its declared sha256 checksum, if any)
+    is fetched and indexed once, under results/input-store/sources/, however many
+    experimental or reference datasets name it. Experimental datasets built from several
+    vcfs are merged once per distinct list of sources, under results/input-store/merged/.
+    The per-dataset files under results/experimentals/ and results/references/ are
+    links to these.
+
+    A source may declare an existing tabix (.tbi) or CSI (.csi) index in the optional
+    vcf_index manifest column; that index is fetched and reused rather than rebuilt,
+    provided it validates against the vcf.
+    """
+
+    def __init__(
+        self, manifest_experiment: pd.DataFrame = None, manifest_reference: pd.DataFrame = None
+    ):
+        self.sources = (manifest_experiment, manifest_reference)
+        ## source id -> (url or path, sha256 or "")
+        self.source_files = {}
+        ## source id -> url or path of a declared index
+        self.source_indexes = {}
+        ## experimental dataset -> list of source ids, in manifest order
+        self.experimental_sources = {}
+        ## reference dataset -> source id
+        self.reference_sources = {}
+        ## merge id -> list of source ids
+        self.merges = {}
+        if manifest_experiment is not None:
+            for experimental, vcf, sha256, index in zip(
+                manifest_experiment["experimental_dataset"],
+                manifest_experiment["vcf"],
+                _optional_column(manifest_experiment, "vcf_sha256"),
+                _optional_column(manifest_experiment, "vcf_index"),
+            ):
+                source_id = self._add_source(vcf, sha256, index)
+                self.experimental_sources.setdefault(experimental, []).append(source_id)
+            for source_ids in self.experimental_sources.values():
+                if len(source_ids) > 1:
+                    self.merges[get_source_id(",".join(source_ids))] = source_ids
+        if manifest_reference is not None:
+            for reference, vcf, sha256, index in zip(
+                manifest_reference["reference_dataset"],
+                manifest_reference["vcf"],
+                _optional_column(manifest_reference, "vcf_sha256"),
+                _optional_column(manifest_reference, "vcf_index"),
+            ):
+                source_id = self._add_source(vcf, sha256, index)
+                self.reference_sources[reference] = source_id
+
+    def _add_source(self, vcf: str, sha256: str, index: str) -> str:
+        """
+        Register a vcf source, and the first index declared for it
+        """
+        source_id = get_source_id(vcf, sha256)
+        self.source_files[source_id] = (vcf, sha256)
+        if index != "" and source_id not in self.source_indexes:
+            self.source_indexes[source_id] = index
+        return source_id
+
+    def is_built_from(
+        self, manifest_experiment: pd.DataFrame, manifest_reference: pd.DataFrame
+    ) -> bool:
+        """
+        Determine whether this store was constructed from exactly these manifest objects
+        """
+        return all(x is y for x, y in zip(self.sources, (manifest_experiment, manifest_reference)))
+
+    def source(self, source_id: str) -> tuple:
+        """
+        Get the (url or path, sha256 or "") of a source
+        """
+        if source_id not in self.source_files:
+            raise ValueError('Unrecognized input store source: "{}"'.format(source_id))
+        return self.source_files[source_id]
+
+    def local_inputs(self, source_id: str) -> list:
+        """
+        Get a source as a rule input if it is a local file, so that its
+        changes are tracked; remote sources are fetched by url instead
+        """
+        source = self.source(source_id)[0]
+        return [] if "://" in source else [source]
+
+    def index_source(self, source_id: str, index_format: str) -> str:
+        """
+        Get the declared index of a stored source in the requested format ("tbi" or "csi"),
+        or an empty string if the index must be built
+        """
+        index = self.source_indexes.get(source_id, "")
+        return index if index.endswith(".{}".format(index_format)) else ""
+
+    def index_inputs(self, source_id: str, index_format: str) -> list:
+        """
+        Get the declared index of a source as a rule input if it is a local file
+        """
+        index = self.index_source(source_id, index_format)
+        return [] if index == "" or "://" in index else [index]
+
+    def index_file(self, source_id: str) -> str:
+        """
+        Get the stored index of a source, in the format of its declared index;
+        sources without one are indexed with tabix
+        """
+        index_format = "csi" if self.index_source(source_id, "csi") != "" else "tbi"
+        return "results/input-store/sources/{}.vcf.gz.{}".format(source_id, index_format)
+
+    def merge_inputs(self, merge_id: str) -> list:
+        """
+        Get the stored source vcfs combined into a merged vcf
+        """
+        if merge_id not in self.merges:
+            raise ValueError('Unrecognized input store merge: "{}"'.format(merge_id))
+        return [
+            "results/input-store/sources/{}.vcf.gz".format(source_id)
+            for source_id in self.merges[merge_id]
+        ]
+
+    def merge_indexes(self, merge_id: str) -> list:
+        """
+        Get the stored indexes of the source vcfs combined into a merged vcf
+        """
+        if merge_id not in self.merges:
+            raise ValueError('Unrecognized input store merge: "{}"'.format(merge_id))
+        return [self.index_file(source_id) for source_id in self.merges[merge_id]]
+
+    def _dataset_sources(self, dataset_type: str, dataset_name: str) -> list:
+        """
+        Get the source ids of an experimental or reference dataset
+        """
+        if dataset_type == "references":
+            return [self.reference_sources[dataset_name]]
+        if dataset_type == "experimentals":
+            return self.experimental_sources[dataset_name]
+        raise ValueError('Unrecognized dataset type: "{}"'.format(dataset_type))
+
+    def dataset_index(self, dataset_type: str, dataset_name: str) -> str:
+        """
+        Get the index of an experimental or reference dataset, in the format of
+        the stored index it links to: that of the declared index of a single
+        source, and tabix for merged vcfs
+        """
+        source_ids = self._dataset_sources(dataset_type, dataset_name)
+        index_format = "tbi"
+        if len(source_ids) == 1:
+            index_format = self.index_file(source_ids[0]).rsplit(".", 1)[1]
+        return "results/{}/{}.vcf.gz.{}".format(dataset_type, dataset_name, index_format)
+
+    def dataset_file(self, dataset_type: str, dataset_name: str) -> str:
+        """
+        Get the stored vcf that an experimental or reference dataset links to
+        """
+        source_ids = self._dataset_sources(dataset_type, dataset_name)
+        if len(source_ids) == 1:
+            return "results/input-store/sources/{}.vcf.gz".format(source_ids[0])
+        return "results/input-store/merged/{}.vcf.gz".format(get_source_id(",".join(source_ids)))
+
+
+_input_store_cache = {}
+
+
+def get_input_store(
+    manifest_experiment: pd.DataFrame = None, manifest_reference: pd.DataFrame = None
+) -> InputStore:
+    """
+    Get an InputStore for a set of manifests, building it only
+    the first time that combination of manifests is seen.
+    Manifests are keyed by object identity, as for get_comparison_index.
+    """
+    key = (id(manifest_experiment), id(manifest_reference))
+    res = _input_store_cache.get(key)
+    if res is None or not res.is_built_from(manifest_experiment, manifest_reference):
+        res = InputStore(manifest_experiment, manifest_reference)
+        _input_store_cache[key] = res
+    return res
+
+
+_parsed_file_cache = {}
+## optional lib.dag_cache.DagCache persisting parsed files between invocations
+_persistent_cache = None
+
+
+def configure_persistent_cache(cache) -> None:
+    """
+    Persist files parsed by read_with_cache between snakemake invocations
+    in a DagCache, or stop persisting them if cache is None
+    """
+    global _persistent_cache
+    _persistent_cache = cache
+
+
+def read_with_cache(filename, parser):
+    """
+    Parse a file with the provided parser, reusing the previous result
+    for as long as the file's modification time and size are unchanged.
+
+    Checkpoint outputs are read by input functions once per job during
+    DAG evaluation, so this turns thousands of parses into one parse and
+    a stat per call. When a checkpoint reruns and rewrites its output,
+    the changed mtime invalidates the cached result. With a persistent
+    cache configured, parses are also reused by later invocations.
+    """
+    filename = str(filename)
+    stat = os.stat(filename)
+    fingerprint = (stat.st_mtime_ns, stat.st_size)
+    key = (filename, parser)
+    cached = _parsed_file_cache.get(key)
+    if cached is None or cached[0] != fingerprint:
+        if _persistent_cache is None:
+            parsed = parser(filename)
+        else:
+            parsed = _persistent_cache.get_parsed(
+                (os.path.abspath(filename), "{}.{}".format(parser.__module__, parser.__qualname__)),
+                fingerprint,
+                lambda: parser(filename),
+            )
+        cached = (fingerprint, parsed)
+        _parsed_file_cache[key] = cached
+    return cached[1]
+
+
+class StratificationLinker:
+    """
+    Parsed contents of the stratification linker checkpoint output,
+    which maps GA4GH-style stratification names to relative bedfile paths.
+    """
+
+    def __init__(self, filename: str):
+        ## (name, relative path) in file order
+        self.entries = []
+        with open(filename, "r") as f:
+            for line in f.readlines():
+                line_data = line.rstrip("\r\n").split("\t")
+                if len(line_data) < 2:
+                    continue
+                self.entries.append((line_data[0], line_data[1].rstrip()))
+        self.paths_by_name = {}
+        for name, path in self.entries:
+            self.paths_by_name.setdefault(name, []).append(path)
+        self._selections = {}
+
+    def select(self, names: tuple) -> list:
+        """
+        Get (name, path) pairs for the requested stratification names,
+        in order of the requested names. Results are cached by name tuple.
+        """
+        if names not in self._selections:
+            res = []
+            for name in names:
+                if name not in self.paths_by_name:
+                    raise ValueError(
+                        'cannot find stratification region with name "{}"'.format(name)
+                    )
+                res.extend((name, path) for path in self.paths_by_name[name])
+            self._selections[names] = res
+        return self._selections[names]
+
+    def filter(self, names: tuple) -> list:
+        """
+        Get (name, path) pairs for any of the requested stratification names
+        that are present, in linker file order. Results are cached by name tuple.
+        """
+        key = ("filter", names)
+        if key not in self._selections:
+            targets = set(names)
+            self._selections[key] = [x for x in self.entries if x[0] in targets]
+        return self._selections[key]
+
+
+def get_stratification_linker(config: dict, checkpoints: Checkpoints) -> StratificationLinker:
+    """
+    Get the parsed stratification linker for the configured genome build,
+    reusing the parsed copy until the checkpoint rewrites the file.
+    """
+    return read_with_cache(
         checkpoints.get_stratification_linker.get(genome_build=config["genome-build"]).output[0],
-        header=None,
-        names=["key", "path"],
-    ).set_index("key", drop=False)
-    lines = [
-        "{}\\tresults/stratification-sets/{}/{}".format(x, config["genome-build"], y)
-        for x, y in zip(
-            regions.loc[stratification_sets, "key"], regions.loc[stratification_sets, "path"]
+        StratificationLinker,
+    )
+
+
+def get_stratification_sets(config: dict) -> tuple:
+    """
+    Get the names of stratification sets selected in user configuration,
+    excluding the genome-wide background "*"
+    """
+    return tuple(
+        x
+        for x in config["genomes"][config["genome-build"]]["stratification-regions"][
+            "region-inclusions"
+        ].keys()
+        if x != "*"
+    )
+
+
+def count_bed_intervals(filename: str) -> int:
+    """
+    Count the intervals in a possibly gzipped bedfile
+    """
+    opener = gzip.open if str(filename).endswith(".gz") else open
+    res = 0
+    with opener(filename, "rt") as f:
+        for line in f:
+            if line.startswith(("#", "track", "browser")) or len(line.strip()) == 0:
+                continue
+            res += 1
+    return res
+
+
+def count_bed_bases(filename: str) -> int:
+    """
+    Sum the interval lengths in a possibly gzipped bedfile
+    """
+    opener = gzip.open if str(filename).endswith(".gz") else open
+    res = 0
+    with opener(filename, "rt") as f:
+        for line in f:
+            if line.startswith(("#", "track", "browser")) or len(line.strip()) == 0:
+                continue
+            line_data = line.split("\t")
+            res += int(line_data[2]) - int(line_data[1])
+    return res
+
+
+HAPPY_STRATIFICATION_COSTS = {"intervals": count_bed_intervals, "bp": count_bed_bases}
+
+
+def pack_happy_stratification_sets(regions: list, beds_per_set: int, costs: list = None) -> list:
+    """
+    Split (name, path) stratification entries into ceil(len / beds_per_set) subsets.
+
+    Without costs, entries are sliced into consecutive groups of beds_per_set.
+    With costs, entries are placed most expensive first onto the currently cheapest
+    subset, so that no single hap.py run is stuck with all the genome-wide beds.
+    Ties are broken by name and subset index, so the same inputs always produce
+    the same subsets, and the number of subsets does not depend on the costs.
+    """
+    n_sets = ceil(len(regions) / beds_per_set)
+    if costs is None:
+        return [regions[i * beds_per_set : (i + 1) * beds_per_set] for i in range(n_sets)]
+    loads = [0] * n_sets
+    assignment = [[] for _ in range(n_sets)]
+    order = sorted(range(len(regions)), key=lambda i: (-costs[i], regions[i][0], i))
+    for i in order:
+        target = min(range(n_sets), key=lambda x: (loads[x], x))
+        assignment[target].append(i)
+        loads[target] += costs[i]
+    return [[regions[i] for i in sorted(x)] for x in assignment]
+
+
+def get_happy_stratification_subset(linker_filename: str, config: dict, stratification_set) -> list:
+    """
+    Given the stratification linker and the index of a hap.py stratification subset,
+    return the (name, bedfile) pairs assigned to that subset.
+
+    How bedfiles are assigned to subsets is controlled by "happy-stratification-packing":
+    "position" groups bedfiles in configuration order, while "intervals" and "bp" balance
+    subsets by the interval count or total size of each bedfile. The cost-based modes read
+    the bedfiles themselves, so this is only called once they have been downloaded.
+    """
+    beds_per_set = config["happy-bedfiles-per-stratification"]
+    packing = config.get("happy-stratification-packing", "position")
+    regions = [
+        (x, "results/stratification-sets/{}/{}".format(config["genome-build"], y))
+        for x, y in read_with_cache(linker_filename, StratificationLinker).select(
+            get_stratification_sets(config)
         )
     ]
-    lines = [
-        lines[i]
-        for i in range(
-            int(wildcards.stratification_set) * beds_per_set,
-            min((int(wildcards.stratification_set) + 1) * beds_per_set, len(lines)),
+    if packing == "position":
+        costs = None
+    elif packing in HAPPY_STRATIFICATION_COSTS:
+        costs = [read_with_cache(y, HAPPY_STRATIFICATION_COSTS[packing]) for x, y in regions]
+    else:
+        raise ValueError('Unrecognized hap.py stratification packing: "{}"'.format(packing))
+    return pack_happy_stratification_sets(regions, beds_per_set, costs)[int(stratification_set)]
+
+
+def write_happy_stratification_subset(
+    linker_filename: str, output_file: str, config: dict, stratification_set
+) -> None:
+    """
+    Write a hap.py stratification tsv for a single stratification subset
+    """
+    with open(output_file, "w") as f:
+        f.writelines(
+            "{}\t{}\n".format(x, y)
+            for x, y in get_happy_stratification_subset(linker_filename, config, stratification_set)
         )
-    ]
-    return "\\n".join(lines)
 
 
 def get_happy_stratification_set_indices(wildcards, config, checkpoints):
@@ -236,21 +718,7 @@ def get_happy_stratification_set_indices(wildcards, config, checkpoints):
     be used as intermediate names for the region files during DAG construction.
     """
     beds_per_set = config["happy-bedfiles-per-stratification"]
-    stratification_sets = [
-        x
-        for x in filter(
-            lambda z: z != "*",
-            config["genomes"][config["genome-build"]]["stratification-regions"][
-                "region-inclusions"
-            ].keys(),
-        )
-    ]
-    regions = pd.read_table(
-        checkpoints.get_stratification_linker.get(genome_build=config["genome-build"]).output[0],
-        header=None,
-        names=["key", "path"],
-    ).set_index("key", drop=False)
-    regions = regions.loc[stratification_sets]
+    regions = get_stratification_linker(config, checkpoints).select(get_stratification_sets(config))
     return [x for x in range(ceil(len(regions) / beds_per_set))]
 
 
@@ -276,103 +744,159 @@ def flatten_region_definitions(config: dict, labels: pd.DataFrame, reference_bui
     return res
 
 
-def get_bedfile_from_name(wildcards, checkpoints, prefix, reference_build: str):
+class StratificationSubset:
     """
-    pull data from checkpoint output
+    Parsed contents of a single hap.py stratification subset checkpoint output,
+    which lists the stratification set names and bedfiles grouped into one subset.
+    """
+
+    def __init__(self, filename: str):
+        ## stratification names in file order
+        self.names = []
+        ## stratification name -> workflow-relative bedfile path
+        self.beds = {}
+        with open(filename, "r") as f:
+            for line in f.readlines():
+                line_data = line.rstrip("\r\n").split("\t")
+                if len(line_data[0].strip()) == 0:
+                    continue
+                name = line_data[0].strip()
+                self.names.append(name)
+                if len(line_data) > 1:
+                    self.beds[name] = line_data[1].strip()
+        self._outputs = {}
+
+    def comparison_outputs(self, toolname: str, wildcards) -> list:
+        """
+        Get the per-stratification output files of an SV comparison tool
+        for this subset, memoized by tool and dataset wildcards.
+        """
+        key = (
+            toolname,
+            wildcards.experimental,
+            wildcards.reference,
+            wildcards.region,
+            wildcards.stratification_set,
+        )
+        if key not in self._outputs:
+            if toolname not in SV_COMPARISON_OUTPUTS:
+                raise ValueError('Unrecognized SV comparison tool: "{}"'.format(toolname))
+            template, include_background = SV_COMPARISON_OUTPUTS[toolname]
+            names = (["all_background"] if include_background else []) + self.names
+            self._outputs[key] = [
+                template.format(
+                    experimental=wildcards.experimental,
+                    reference=wildcards.reference,
+                    region=wildcards.region,
+                    stratification_set=wildcards.stratification_set,
+                    subset_name=name,
+                )
+                for name in names
+            ]
+        return self._outputs[key]
+
+
+## per-stratification outputs of each SV comparison tool, and whether
+## the tool is also run against the confident region background
+SV_COMPARISON_OUTPUTS = {
+    "svdb": (
+        "results/svdb/{experimental}/{reference}/{region}/{stratification_set}/"
+        "{subset_name}.between-svdb.counts.tsv",
+        True,
+    ),
+    "truvari": (
+        "results/truvari/{experimental}/{reference}/{region}/{stratification_set}/"
+        "{subset_name}/summary.json",
+        True,
+    ),
+    "svanalyzer": (
+        "results/svanalyzer/{experimental}/{reference}/{region}/{stratification_set}/"
+        "{subset_name}.report",
+        False,
+    ),
+}
+
+
+def get_stratification_subset(
+    checkpoints: Checkpoints, reference_build: str, stratification_set: str
+) -> StratificationSubset:
+    """
+    Get the parsed hap.py stratification subset for a subset index,
+    reusing the parsed copy until the checkpoint rewrites the file.
     """
-    with open(
+    return read_with_cache(
         checkpoints.happy_create_stratification_subset.get(
-            genome_build=reference_build, stratification_set=wildcards.subset_group
+            genome_build=reference_build, stratification_set=stratification_set
         ).output[0],
-        "r",
-    ) as f:
-        if wildcards.subset_name == "all_background":
-            return "results/confident-regions/{}.bed".format(wildcards.region)
-        for line in f.readlines():
-            line_data = line.split("\t")
-            if line_data[0].strip().rstrip() == wildcards.subset_name:
-                return "{}/{}".format(prefix, line_data[1].strip().rstrip())
+        StratificationSubset,
+    )
+
+
+def get_bedfile_from_name(wildcards, checkpoints, reference_build: str):
+    """
+    pull data from checkpoint output
+    """
+    if wildcards.subset_name == "all_background":
+        return "results/confident-regions/{}.bed".format(wildcards.region)
+    subset = get_stratification_subset(checkpoints, reference_build, wildcards.subset_group)
+    if wildcards.subset_name in subset.beds:
+        return subset.beds[wildcards.subset_name]
     raise ValueError(
         'cannot find stratification region with name "{}"'.format(wildcards.subset_name)
     )
 
 
-def find_datasets_in_subset(wildcards, checkpoints, prefix, reference_build: str):
+def find_datasets_in_subset(wildcards, checkpoints, reference_build: str):
     """
     pull data from checkpoint output
     """
-    res = []
-    if wildcards.toolname == "svdb":
-        res.append(
-            "results/svdb/{}/{}/{}/{}/all_background.between-svdb.vcf.gz.pwv_comparison".format(
-                wildcards.experimental,
-                wildcards.reference,
-                wildcards.region,
-                wildcards.stratification_set,
-            )
+    subset = get_stratification_subset(checkpoints, reference_build, wildcards.stratification_set)
+    return subset.comparison_outputs(wildcards.toolname, wildcards)
+
+
+def get_stratification_intersections(wildcards, checkpoints, reference_build: str) -> list:
+    """
+    Get the cached intersections of each stratification in a hap.py stratification
+    subset with a confident region, in subset order
+    """
+    subset = get_stratification_subset(checkpoints, reference_build, wildcards.stratification_set)
+    return [
+        "results/stratification-intersections/{}/{}/{}.bed".format(
+            wildcards.region, wildcards.stratification_set, name
         )
-    elif wildcards.toolname == "truvari":
-        res.append(
-            "results/truvari/{}/{}/{}/{}/all_background/summary.json".format(
-                wildcards.experimental,
-                wildcards.reference,
-                wildcards.region,
-                wildcards.stratification_set,
-            )
+        for name in subset.names
+    ]
+
+
+def get_stratification_downloads(linker_filename: str, config: dict, genome_build: str) -> list:
+    """
+    Get (url, local path) pairs for the bedfiles of all stratification sets
+    selected in user configuration, including the genome-wide background "*",
+    in linker order.
+    """
+    stratification_regions = config["genomes"][genome_build]["stratification-regions"]
+    target_regions = tuple(stratification_regions["region-inclusions"].keys())
+    site = stratification_regions["ftp"]
+    if "://" not in site:
+        site = "https://{}".format(site)
+    return [
+        (
+            "{}/{}/{}".format(site, stratification_regions["dir"], path),
+            "results/stratification-sets/{}/{}".format(genome_build, path),
         )
-    with open(
-        checkpoints.happy_create_stratification_subset.get(
-            genome_build=reference_build, stratification_set=wildcards.stratification_set
-        ).output[0],
-        "r",
-    ) as f:
-        for line in f.readlines():
-            if len(line.rstrip()) > 0:
-                if wildcards.toolname == "svdb":
-                    res.append(
-                        "results/svdb/{}/{}/{}/{}/{}.between-svdb.vcf.gz.pwv_comparison".format(
-                            wildcards.experimental,
-                            wildcards.reference,
-                            wildcards.region,
-                            wildcards.stratification_set,
-                            line.split("\t")[0].strip().rstrip(),
-                        )
-                    )
-                elif wildcards.toolname == "truvari":
-                    res.append(
-                        "results/truvari/{}/{}/{}/{}/{}/summary.json".format(
-                            wildcards.experimental,
-                            wildcards.reference,
-                            wildcards.region,
-                            wildcards.stratification_set,
-                            line.split("\t")[0].strip().rstrip(),
-                        )
-                    )
-                elif wildcards.toolname == "svanalyzer":
-                    res.append(
-                        "results/svanalyzer/{}/{}/{}/{}/{}.report".format(
-                            wildcards.experimental,
-                            wildcards.reference,
-                            wildcards.region,
-                            wildcards.stratification_set,
-                            line.split("\t")[0].strip().rstrip(),
-                        )
-                    )
-    return res
+        for name, path in read_with_cache(linker_filename, StratificationLinker).filter(
+            target_regions
+        )
+    ]
 
 
-def get_required_stratifications(wildcards: Wildcards, config: dict, checkpoints: Checkpoints):
-    stratification_regions = config["genomes"][config["genome-build"]]["stratification-regions"]
-    target_regions = [region for region in stratification_regions["region-inclusions"].keys()]
-    target_files = []
-    with checkpoints.get_stratification_linker.get(genome_build=config["genome-build"]).output[
-        0
-    ].open() as f:
-        for line in f.readlines():
-            if line.split("\t")[0] in target_regions:
-                target_files.append(
-                    "results/stratification-sets/{}/{}".format(
-                        config["genome-build"], line.split("\t")[1].rstrip()
-                    )
-                )
-    return target_files
+def get_bedfile_dependency(wildcards, checkpoints, reference_build: str) -> str:
+    """
+    Get the workflow target that provides the bedfile for a stratification name:
+    the confident region itself for the whole background, and otherwise
+    the bulk download of all stratification bedfiles
+    """
+    res = get_bedfile_from_name(wildcards, checkpoints, reference_build)
+    if wildcards.subset_name == "all_background":
+        return res
+    return "results/stratification-sets/{}/stratification_files.downloaded".format(reference_build)
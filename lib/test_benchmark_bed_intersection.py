@@ -0,0 +1,40 @@
+import shutil
+import sys
+
+import pytest
+
+from lib import benchmark_bed_intersection as bbi
+
+
+def test_write_random_bed(tmp_path):
+    """
+    Test that synthetic bedfiles are sorted and reproducible
+    """
+    first, second = tmp_path / "first.bed", tmp_path / "second.bed"
+    bbi.write_random_bed(first, ["chr1", "chr2"], 100, 0)
+    bbi.write_random_bed(second, ["chr1", "chr2"], 100, 0)
+    assert first.read_text() == second.read_text()
+    intervals = [x.split("\t") for x in first.read_text().splitlines()]
+    assert len(intervals) == 100
+    assert intervals == sorted(intervals, key=lambda x: (x[0], int(x[1]), int(x[2])))
+
+
+def test_main_without_bedtools(monkeypatch, capsys):
+    """
+    Test that the benchmark is skipped cleanly when bedtools is not on the PATH
+    """
+    monkeypatch.setattr(shutil, "which", lambda x: None)
+    monkeypatch.setattr(sys, "argv", ["benchmark_bed_intersection"])
+    bbi.main()
+    assert "skipping" in capsys.readouterr().out
+    with pytest.raises(RuntimeError):
+        bbi.run_benchmark(1, 1, 10, 10)
+
+
+@pytest.mark.skipif(shutil.which("bedtools") is None, reason="requires bedtools")
+def test_run_benchmark():
+    """
+    Test that inline and cached filtering are both timed
+    """
+    observed = bbi.run_benchmark(2, 2, 100, 100)
+    assert observed["mode"].to_list() == ["inline", "cached"]
@@ -0,0 +1,50 @@
+import pandas as pd
+
+from lib import benchmark_dag_construction as bdc
+from lib import target_construction as tc
+
+
+def test_make_linker(tmp_path):
+    """
+    Test that synthetic linkers list the background and every requested bedfile,
+    and that the bedfiles are written relative to the workflow root
+    """
+    linker = bdc.make_linker(str(tmp_path), 5)
+    observed = tc.StratificationLinker(linker)
+    assert len(observed.entries) == 6
+    for _, path in observed.entries:
+        assert (tmp_path / "results" / "stratification-sets" / "grch38" / path).exists()
+
+
+def test_run_benchmark():
+    """
+    Test that every function is measured at every requested size
+    """
+    observed = bdc.run_benchmark([10], 2, [20], 3)
+    assert list(observed.columns) == ["function", "size", "calls", "seconds", "peak_mb"]
+    assert len(observed) == 7
+    assert observed.loc[observed["function"] == "find_datasets_in_subset", "calls"].item() == 6
+    assert (observed["peak_mb"] > 0).all()
+
+
+def test_compare_to_baseline(tmp_path):
+    """
+    Test that only slowdowns or memory growth beyond the tolerance,
+    above the noise floor, are flagged as regressions
+    """
+    baseline = pd.DataFrame(
+        {
+            "function": ["a", "b", "c", "d"],
+            "size": [10, 10, 10, 10],
+            "calls": [1, 1, 1, 1],
+            "seconds": [1.0, 1.0, 0.001, 1.0],
+            "peak_mb": [10.0, 10.0, 10.0, 10.0],
+        }
+    )
+    bdc.save_baseline(baseline, tmp_path / "baseline.json")
+    results = baseline.copy()
+    results["seconds"] = [1.8, 2.5, 0.05, 1.0]
+    results["peak_mb"] = [10.0, 10.0, 10.0, 40.0]
+    results.loc[4] = ["e", 10, 1, 100.0, 100.0]
+    observed = bdc.compare_to_baseline(results, pd.read_json(tmp_path / "baseline.json"))
+    assert observed["regression"].to_list() == [False, True, False, True, False]
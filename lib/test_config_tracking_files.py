@@ -34,138 +34,100 @@ def test_construct_tracker_filename_list():
     assert expected == observed
 
 
-def test_update_analysis_tracking_file_none_before_defined_after(tmp_path):
+@pytest.mark.parametrize(
+    "setting1, setting2, same",
+    [
+        ({"a": 1, "b": [1, 2]}, {"b": [1, 2], "a": 1}, True),
+        ({"a": 1}, {"a": 2}, False),
+        ("in-use", "in-use", True),
+        (None, "in-use", False),
+    ],
+)
+def test_hash_setting(setting1, setting2, same):
     """
-    Test the following circumstance:
-
-    - a tracking file already exists
-    - the tracking file is empty, signifying a None setting
-    - the new setting is not None
+    Test that setting digests depend on content but not dict key order
     """
-    tracking_file = tmp_path / "nonetest" / "mysetting.tracking"
-    pathlib.Path(os.path.dirname(tracking_file)).mkdir(parents=True, exist_ok=True)
-    open(tracking_file, "w").close()
-    ctf.update_analysis_tracking_file(tmp_path, "nonetest", "newsetting", "mysetting")
-    assert pathlib.Path(tmp_path / "nonetest" / "mysetting.tracking").is_file()
-    with open(tracking_file, "r") as f:
-        lines = f.readlines()
-    assert lines == ["newsetting\n"]
+    assert (ctf.hash_setting(setting1) == ctf.hash_setting(setting2)) == same
 
 
-def test_update_analysis_tracking_file_none_before_none_after(tmp_path):
+def test_get_tracked_settings(config):
     """
-    Test the following circumstance:
-
-    - a tracking file already exists
-    - the tracking file is empty, signifying a None setting
-    - the new setting is None
+    Test that stratification sets and tool settings are tracked by name
     """
-    tracking_file = tmp_path / "nonetest" / "mysetting.tracking"
-    pathlib.Path(os.path.dirname(tracking_file)).mkdir(parents=True, exist_ok=True)
-    open(tracking_file, "w").close()
-    file_mod_time_start = os.path.getmtime(tracking_file)
-    ctf.update_analysis_tracking_file(tmp_path, "nonetest", None, "mysetting")
-    assert pathlib.Path(tmp_path / "nonetest" / "mysetting.tracking").is_file()
-    assert os.stat(pathlib.Path(tmp_path / "nonetest" / "mysetting.tracking")).st_size == 0
-    file_mod_time_end = os.path.getmtime(tracking_file)
-    assert file_mod_time_start == file_mod_time_end
+    config["sv-settings"] = {"svdb": {"bnd-distance": 10, "overlap": 0.5}}
+    observed = ctf.get_tracked_settings(config)
+    assert observed["stratification-sets/grch100/name1"] == "in-use"
+    assert "stratification-sets/grch100/*" not in observed
+    assert observed["svdb"] == {"bnd-distance": 10, "overlap": 0.5}
+    assert observed["truvari"] is None
+    assert observed["happy"]["happy-bedfiles-per-stratification"] == 1
 
 
-def test_update_analysis_tracking_file_defined_before_none_after(tmp_path):
+def test_tracking_store_new_setting(tmp_path):
     """
-    Test the following circumstance:
-
-    - a tracking file already exists
-    - the tracking file is full
-    - the new setting is None
+    Test that committing a new setting creates its tracker
+    and records it in the store
     """
-    tracking_file = tmp_path / "nonetest" / "mysetting.tracking"
-    pathlib.Path(os.path.dirname(tracking_file)).mkdir(parents=True, exist_ok=True)
-    with open(tracking_file, "w") as f:
-        f.write("mysettingval\n")
-    ctf.update_analysis_tracking_file(tmp_path, "nonetest", None, "mysetting")
-    assert pathlib.Path(tmp_path / "nonetest" / "mysetting.tracking").is_file()
-    assert os.stat(pathlib.Path(tmp_path / "nonetest" / "mysetting.tracking")).st_size == 0
+    store = ctf.TrackingStore(tmp_path)
+    tracker = store.track("svdb", {"overlap": 0.6})
+    store.commit()
+    assert pathlib.Path(tracker).is_file()
+    assert ctf.hash_setting({"overlap": 0.6}) in tracker
+    assert ctf.TrackingStore(tmp_path).digests == {"svdb": ctf.hash_setting({"overlap": 0.6})}
 
 
-def test_update_analysis_tracking_file_absent_before_none_after(tmp_path):
+def test_tracking_store_unchanged_setting(tmp_path):
     """
-    Test the following circumstance:
-
-    - a tracking file doesn't exist
-    - the new setting is None
+    Test that an unchanged setting leaves both its tracker
+    and the store untouched
     """
-    ctf.update_analysis_tracking_file(tmp_path, "nonetest", None, "mysetting")
-    assert pathlib.Path(tmp_path / "nonetest" / "mysetting.tracking").is_file()
-    assert os.stat(pathlib.Path(tmp_path / "nonetest" / "mysetting.tracking")).st_size == 0
+    store = ctf.TrackingStore(tmp_path)
+    tracker = store.track("svdb", {"overlap": 0.6})
+    store.commit()
+    tracker_mtime = os.path.getmtime(tracker)
+    store_mtime = os.path.getmtime(store.filename)
+    store = ctf.TrackingStore(tmp_path)
+    assert store.track("svdb", {"overlap": 0.6}) == tracker
+    assert store.pending == {}
+    store.commit()
+    assert os.path.getmtime(tracker) == tracker_mtime
+    assert os.path.getmtime(store.filename) == store_mtime
 
 
-def test_update_analysis_tracking_file_file_dne(tmp_path):
+def test_tracking_store_deleted_tracker(tmp_path):
     """
-    Test that dynamic updating successfully constructs
-    the tracking file and injects content into it
-    when the file does not already exist
+    Test that a deleted tracker is recreated even when
+    the stored digest is unchanged
     """
-    analysis_name = "myanalysis"
-    output_tag = "mytag"
-    current_setting = [3, 2, 1, 4, 5]
-    expected_dir = tmp_path / analysis_name
-    expected_file = expected_dir / "mytag.tracking"
-    expected_contents = [str(setting) for setting in current_setting]
-    expected_contents.sort()
-    ctf.update_analysis_tracking_file(tmp_path, analysis_name, current_setting, output_tag)
-
-    assert expected_dir.is_dir()
-    assert expected_file.is_file()
-    with open(expected_file, "r") as f:
-        lines = [line.rstrip() for line in f.readlines()]
-    assert lines == expected_contents
+    store = ctf.TrackingStore(tmp_path)
+    tracker = store.track("svdb", {"overlap": 0.6})
+    store.commit()
+    os.remove(tracker)
+    store = ctf.TrackingStore(tmp_path)
+    assert store.track("svdb", {"overlap": 0.6}) == tracker
+    store.commit()
+    assert pathlib.Path(tracker).is_file()
 
 
-def test_update_analysis_tracking_file_file_same(tmp_path):
+def test_tracking_store_changed_setting(tmp_path):
     """
-    Test that dynamic updating leaves a file alone
-    when the content matches the new settings
+    Test that a changed setting gets a new tracker path, and that
+    reverting to a previous setting reuses its original tracker
     """
-    analysis_name = "myanalysis"
-    output_tag = "mytag"
-    current_setting = [3, 2, 1, 4, 5]
-    expected_dir = tmp_path / analysis_name
-    expected_dir.mkdir(parents=True, exist_ok=True)
-    expected_file = expected_dir / "mytag.tracking"
-    expected_contents = [str(setting) for setting in current_setting]
-    expected_contents.sort()
-    with open(expected_file, "w") as f:
-        f.writelines(setting + "\n" for setting in expected_contents)
-    file_mod_time_start = os.path.getmtime(expected_file)
-    ctf.update_analysis_tracking_file(tmp_path, analysis_name, current_setting, output_tag)
-    file_mod_time_end = os.path.getmtime(expected_file)
-    with open(expected_file, "r") as f:
-        lines = [line.rstrip() for line in f.readlines()]
-    assert lines == expected_contents
-    assert file_mod_time_start == file_mod_time_end
-
-
-def test_update_analysis_tracking_file_file_differs(tmp_path):
-    """
-    Test that dynamic updating successfully replaces
-    the tracking file when the file exists but doesn't
-    match the current setting
-    """
-    analysis_name = "myanalysis"
-    output_tag = "mytag"
-    current_setting = [3, 2, 1, 4, 5]
-    expected_dir = tmp_path / analysis_name
-    expected_dir.mkdir(parents=True, exist_ok=True)
-    expected_file = expected_dir / "mytag.tracking"
-    expected_contents = [str(setting) for setting in current_setting]
-    expected_contents.sort()
-    with open(expected_file, "w") as f:
-        f.writelines(setting + "\n" for setting in ["1", "2", "3", "4", "5", "6"])
-    ctf.update_analysis_tracking_file(tmp_path, analysis_name, current_setting, output_tag)
-    with open(expected_file, "r") as f:
-        lines = [line.rstrip() for line in f.readlines()]
-    assert lines == expected_contents
+    store = ctf.TrackingStore(tmp_path)
+    tracker1 = store.track("svdb", {"overlap": 0.6})
+    store.commit()
+    tracker1_mtime = os.path.getmtime(tracker1)
+    store = ctf.TrackingStore(tmp_path)
+    tracker2 = store.track("svdb", {"overlap": 0.7})
+    store.commit()
+    assert tracker1 != tracker2
+    assert pathlib.Path(tracker2).is_file()
+    store = ctf.TrackingStore(tmp_path)
+    assert store.track("svdb", {"overlap": 0.6}) == tracker1
+    store.commit()
+    assert os.path.getmtime(tracker1) == tracker1_mtime
+    assert len(list(tmp_path.glob("tracking/*.tmp"))) == 0
 
 
 def test_update_analysis_tracking_files(config, tmp_path):
@@ -182,7 +144,9 @@ def test_update_analysis_tracking_files(config, tmp_path):
         config,
         results_prefix,
     )
-    filenames = ctf.get_ftp_tracking_files(config, results_prefix)
+    filenames = ctf.get_ftp_tracking_files(config, results_prefix) + [
+        ctf.get_tracking_file(config, results_prefix, x) for x in ["happy", "svdb", "truvari"]
+    ]
     for filename in filenames:
         assert pathlib.Path(filename).is_file()
 
@@ -195,7 +159,9 @@ def test_ftp_tracking_files(config):
     results_prefix = "results"
     expected_names = ["name1", "name2"]
     expected = [
-        "results/stratification-sets/{}/{}.tracking".format(config["genome-build"], val)
+        "results/tracking/stratification-sets/{}/{}/{}.tracking".format(
+            config["genome-build"], val, ctf.hash_setting("in-use")
+        )
         for val in expected_names
     ]
     expected.sort()
@@ -0,0 +1,123 @@
+import os
+
+import pytest
+
+from lib import dag_cache as dc
+from lib import target_construction as tc
+
+
+def test_hash_files(tmp_path):
+    """
+    Test that file digests change with contents, and tolerate missing files
+    """
+    (tmp_path / "manifest.tsv").write_text("a\tb\n")
+    files = [tmp_path / "manifest.tsv", tmp_path / "missing.tsv"]
+    first = dc.hash_files(files)
+    assert dc.hash_files(files) == first
+    (tmp_path / "manifest.tsv").write_text("a\tc\n")
+    assert dc.hash_files(files) != first
+
+
+def test_hash_settings():
+    """
+    Test that settings digests do not depend on dict key order
+    """
+    assert dc.hash_settings({"a": 1, "b": [2]}, 3) == dc.hash_settings({"b": [2], "a": 1}, 3)
+    assert dc.hash_settings({"a": 1}) != dc.hash_settings({"a": 2})
+
+
+def test_dag_cache_startup(tmp_path):
+    """
+    Test that startup results are reused by later invocations with the same key,
+    and recomputed when the key changes
+    """
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return ["results/reports/report.html"]
+
+    for key, expected_calls in [("first", 1), ("first", 1), ("second", 2)]:
+        cache = dc.DagCache(str(tmp_path), enabled=True)
+        cache.set_key({"config": key})
+        assert cache.get("targets", compute) == ["results/reports/report.html"]
+        assert len(calls) == expected_calls
+
+
+def test_dag_cache_disabled(tmp_path):
+    """
+    Test that a disabled cache always computes and writes nothing
+    """
+    for _ in range(2):
+        cache = dc.DagCache(str(tmp_path / "cache"), enabled=False)
+        cache.set_key("key")
+        assert cache.get("value", lambda: 1) == 1
+        assert cache.get_parsed(("file", "parser"), (1, 1), lambda: 2) == 2
+        cache.flush()
+    assert not os.path.exists(tmp_path / "cache")
+
+
+def test_dag_cache_disabled_by_environment(tmp_path, monkeypatch):
+    """
+    Test that the cache is disabled by environment variable
+    """
+    monkeypatch.setenv(dc.DISABLE_ENVIRONMENT_VARIABLE, "1")
+    assert not dc.DagCache(str(tmp_path)).enabled
+    monkeypatch.delenv(dc.DISABLE_ENVIRONMENT_VARIABLE)
+    assert dc.DagCache(str(tmp_path)).enabled
+
+
+@pytest.fixture
+def persistent_cache(tmp_path):
+    """
+    Persistent cache for read_with_cache, removed after each test
+    """
+    cache = dc.DagCache(str(tmp_path / "cache"), enabled=True)
+    tc.configure_persistent_cache(cache)
+    tc._parsed_file_cache.clear()
+    yield cache
+    tc.configure_persistent_cache(None)
+    tc._parsed_file_cache.clear()
+
+
+def test_read_with_cache_persistent(tmp_path, persistent_cache, monkeypatch):
+    """
+    Test that parsed checkpoint outputs are reused by later invocations
+    until the file changes
+    """
+    subset = tmp_path / "stratification_subset.tsv"
+    subset.write_text("segdup\tresults/segdup.bed.gz\n")
+    assert tc.read_with_cache(subset, tc.StratificationSubset).names == ["segdup"]
+    persistent_cache.flush()
+    ## a later invocation, with an empty in-memory cache
+    tc._parsed_file_cache.clear()
+    tc.configure_persistent_cache(dc.DagCache(str(tmp_path / "cache"), enabled=True))
+    parses = []
+    original = tc.StratificationSubset.__init__
+    monkeypatch.setattr(
+        tc.StratificationSubset,
+        "__init__",
+        lambda self, filename: parses.append(filename) or original(self, filename),
+    )
+    assert tc.read_with_cache(subset, tc.StratificationSubset).beds == {
+        "segdup": "results/segdup.bed.gz"
+    }
+    assert len(parses) == 0
+    subset.write_text("segdup\tresults/segdup.bed.gz\nlowmap\tresults/lowmap.bed.gz\n")
+    assert tc.read_with_cache(subset, tc.StratificationSubset).names == ["segdup", "lowmap"]
+    assert len(parses) == 1
+
+
+def test_dag_cache_parsed_key(tmp_path):
+    """
+    Test that parsed entries stored under one key are dropped under another,
+    as when the workflow code that produced them changes
+    """
+    cache = dc.DagCache(str(tmp_path), enabled=True)
+    cache.set_key("old code")
+    assert cache.get_parsed(("file", "parser"), (1, 1), lambda: "old") == "old"
+    cache.flush()
+    for key, expected in [("old code", "old"), ("new code", "new")]:
+        cache = dc.DagCache(str(tmp_path), enabled=True)
+        cache.set_key(key)
+        assert cache.get_parsed(("file", "parser"), (1, 1), lambda: "new") == expected
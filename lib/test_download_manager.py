@@ -0,0 +1,204 @@
+import gzip
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from lib import download_manager as dm
+
+PAYLOAD = bytes(range(256)) * 400
+ETAG = '"payload-v1"'
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serve PAYLOAD at any path with ETAG, honoring single open-ended Range requests
+    unless an If-Range header does not match ETAG.
+    Paths starting with /truncated drop the connection after half the payload
+    on the first request, paths starting with /missing return 404, and paths
+    starting with /encoded serve PAYLOAD gzipped with "Content-Encoding: gzip".
+    """
+
+    requests_seen = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.requests_seen.append((self.path, self.headers.get("Range")))
+        if self.path.startswith("/missing"):
+            self.send_error(404)
+            return
+        payload = gzip.compress(PAYLOAD, mtime=0) if self.path.startswith("/encoded") else PAYLOAD
+        start = 0
+        if self.headers.get("Range") is not None and self.headers.get("If-Range", ETAG) == ETAG:
+            start = int(self.headers["Range"].split("=")[1].split("-")[0])
+            if start >= len(payload):
+                self.send_response(416)
+                self.send_header("Content-Range", "bytes */{}".format(len(payload)))
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", "bytes {}-{}/{}".format(start, len(payload) - 1, len(payload))
+            )
+        else:
+            self.send_response(200)
+        body = payload[start:]
+        self.send_header("ETag", ETAG)
+        if self.path.startswith("/encoded"):
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        first_attempt = [x for x in self.requests_seen if x[0] == self.path] == [
+            (self.path, self.headers.get("Range"))
+        ]
+        if self.path.startswith("/truncated") and first_attempt:
+            self.wfile.write(body[: len(body) // 2])
+            self.wfile.flush()
+            self.connection.close()
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def http_server():
+    """
+    Local http server supporting range requests
+    """
+    RangeRequestHandler.requests_seen = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}".format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def manager():
+    """
+    Download manager that retries immediately, in small chunks
+    """
+    return dm.DownloadManager(max_workers=4, retries=2, timeout=5, chunk_size=1024, backoff=0)
+
+
+def test_download(http_server, manager, tmp_path):
+    """
+    Test that a file is fetched and verified against its checksum
+    """
+    output = tmp_path / "sub" / "file.bed.gz"
+    manager.download(http_server + "/file.bed.gz", str(output), hashlib.sha256(PAYLOAD).hexdigest())
+    assert output.read_bytes() == PAYLOAD
+    assert not (tmp_path / "sub" / "file.bed.gz.part").exists()
+
+
+def test_download_resumes_partial(http_server, manager, tmp_path):
+    """
+    Test that an existing partial transfer is completed with a range request
+    """
+    output = tmp_path / "file.bed.gz"
+    (tmp_path / "file.bed.gz.part").write_bytes(PAYLOAD[:1000])
+    (tmp_path / "file.bed.gz.part.validator").write_text(ETAG)
+    manager.download(http_server + "/file.bed.gz", str(output))
+    assert output.read_bytes() == PAYLOAD
+    assert RangeRequestHandler.requests_seen == [("/file.bed.gz", "bytes=1000-")]
+    assert not (tmp_path / "file.bed.gz.part.validator").exists()
+
+
+@pytest.mark.parametrize(
+    "partial, validator",
+    [
+        ## a partial download of an older version of the file
+        (b"x" * 1000, '"payload-v0"'),
+        ## a partial download without a recorded validator
+        (b"x" * 1000, None),
+        ## a stale partial download longer than the current file
+        (b"x" * (len(PAYLOAD) + 10), ETAG),
+    ],
+)
+def test_download_restarts_stale_partial(http_server, manager, tmp_path, partial, validator):
+    """
+    Test that a partial transfer that cannot be shown to belong
+    to the current file is replaced rather than resumed
+    """
+    output = tmp_path / "file.bed.gz"
+    (tmp_path / "file.bed.gz.part").write_bytes(partial)
+    if validator is not None:
+        (tmp_path / "file.bed.gz.part.validator").write_text(validator)
+    manager.download(http_server + "/file.bed.gz", str(output))
+    assert output.read_bytes() == PAYLOAD
+
+
+def test_download_keeps_content_encoding(http_server, manager, tmp_path):
+    """
+    Test that a gzipped file served with "Content-Encoding: gzip" is stored compressed
+    """
+    output = tmp_path / "file.vcf.gz"
+    manager.download(http_server + "/encoded.vcf.gz", str(output))
+    assert gzip.decompress(output.read_bytes()) == PAYLOAD
+
+
+def test_download_resumes_interrupted(http_server, manager, tmp_path):
+    """
+    Test that a dropped connection is retried from where it stopped
+    """
+    output = tmp_path / "file.bed.gz"
+    manager.download(http_server + "/truncated.bed.gz", str(output))
+    assert output.read_bytes() == PAYLOAD
+    assert RangeRequestHandler.requests_seen[0] == ("/truncated.bed.gz", None)
+    assert RangeRequestHandler.requests_seen[1][1] is not None
+
+
+def test_download_checksum_mismatch(http_server, manager, tmp_path):
+    """
+    Test that a checksum mismatch fails without leaving a destination file
+    """
+    output = tmp_path / "file.bed.gz"
+    with pytest.raises(dm.DownloadError):
+        manager.download(http_server + "/file.bed.gz", str(output), "0" * 64)
+    assert not output.exists()
+
+
+def test_download_skips_existing(http_server, manager, tmp_path):
+    """
+    Test that completed downloads are not fetched again
+    """
+    output = tmp_path / "file.bed.gz"
+    output.write_bytes(b"already here")
+    manager.download(http_server + "/file.bed.gz", str(output))
+    assert output.read_bytes() == b"already here"
+    assert RangeRequestHandler.requests_seen == []
+
+
+def test_download_local_file(manager, tmp_path):
+    """
+    Test that local paths are copied
+    """
+    source = tmp_path / "source.bed"
+    source.write_bytes(PAYLOAD)
+    output = tmp_path / "file.bed"
+    manager.download(str(source), str(output))
+    assert output.read_bytes() == PAYLOAD
+
+
+def test_download_all(http_server, manager, tmp_path):
+    """
+    Test that many files are fetched concurrently, and that failures
+    are reported after all other transfers complete
+    """
+    downloads = [
+        (http_server + "/set{}/file.bed.gz".format(i), str(tmp_path / "set{}.bed.gz".format(i)))
+        for i in range(10)
+    ]
+    manager.download_all(downloads)
+    assert all((tmp_path / "set{}.bed.gz".format(i)).read_bytes() == PAYLOAD for i in range(10))
+    with pytest.raises(dm.DownloadError, match="1 of 2 downloads failed"):
+        manager.download_all(
+            [
+                (http_server + "/missing.bed.gz", str(tmp_path / "missing.bed.gz")),
+                (http_server + "/other.bed.gz", str(tmp_path / "other.bed.gz")),
+            ]
+        )
+    assert (tmp_path / "other.bed.gz").exists()
@@ -0,0 +1,134 @@
+import pandas as pd
+import pytest
+
+from lib import happy_sharding as hs
+
+
+@pytest.fixture
+def region_bed(tmp_path):
+    """
+    Confident regions across three contigs of differing total size
+    """
+    filename = tmp_path / "region.bed"
+    filename.write_text("#header\nchr1\t0\t100\nchr1\t200\t300\nchr2\t0\t150\nchr3\t0\t60\n")
+    return filename
+
+
+@pytest.fixture
+def shard_csvs(tmp_path):
+    """
+    Minimal hap.py extended csvs from two region shards,
+    along with an empty csv from a shard with no regions
+    """
+    header = (
+        "Type,Subtype,Subset,Filter,Genotype,QQ.Field,QQ,METRIC.Recall,METRIC.Precision,"
+        "METRIC.Frac_NA,METRIC.F1_Score,PREC.LOWER,TRUTH.TOTAL,TRUTH.TOTAL.ti,TRUTH.TOTAL.tv,"
+        "TRUTH.TOTAL.TiTv_ratio,TRUTH.TP,TRUTH.FN,QUERY.TOTAL,QUERY.TP,QUERY.FP,QUERY.UNK,"
+        "Subset.Size,Subset.IS_CONF.Size,Subset.Level\n"
+    )
+    filenames = [tmp_path / str(i) / "results.extended.csv" for i in range(3)]
+    for filename in filenames:
+        filename.parent.mkdir()
+    filenames[0].write_text(
+        header
+        + "SNP,*,*,PASS,*,QUAL,*,0.9,1.0,0.0,0.947,0.5,10,6,4,1.5,9,1,9,9,0,0,5000,300,1\n"
+        + "INDEL,*,*,PASS,*,QUAL,*,0.5,0.5,0.5,0.5,0.5,2,,,,1,1,4,1,1,2,5000,300,1\n"
+    )
+    filenames[1].write_text("")
+    filenames[2].write_text(
+        header + "SNP,*,*,PASS,*,QUAL,*,0.1,0.5,0.0,0.167,0.5,10,2,8,0.25,1,9,2,1,1,0,5000,200,1\n"
+    )
+    return filenames
+
+
+def test_read_bed(region_bed):
+    """
+    Test that bed intervals are read without headers
+    """
+    observed = hs.read_bed(region_bed)
+    assert observed == [("chr1", 0, 100), ("chr1", 200, 300), ("chr2", 0, 150), ("chr3", 0, 60)]
+
+
+def test_shard_by_contig(region_bed):
+    """
+    Test that whole contigs are balanced across shards by total size
+    """
+    observed = hs.shard_by_contig(hs.read_bed(region_bed), 2)
+    assert observed == [[("chr1", 0, 100), ("chr1", 200, 300)], [("chr2", 0, 150), ("chr3", 0, 60)]]
+
+
+def test_shard_by_contig_excess_shards(region_bed):
+    """
+    Test that requesting more shards than contigs leaves empty shards
+    """
+    observed = hs.shard_by_contig(hs.read_bed(region_bed), 5)
+    assert [len(x) for x in observed] == [2, 1, 1, 0, 0]
+
+
+def test_shard_by_chunk(region_bed):
+    """
+    Test that intervals are cut into shards of approximately equal total size
+    """
+    observed = hs.shard_by_chunk(hs.read_bed(region_bed), 3)
+    assert observed == [
+        [("chr1", 0, 100), ("chr1", 200, 237)],
+        [("chr1", 237, 300), ("chr2", 0, 73)],
+        [("chr2", 73, 150), ("chr3", 0, 60)],
+    ]
+
+
+@pytest.mark.parametrize("mode", ["contig", "chunk"])
+def test_write_region_shards(region_bed, tmp_path, mode):
+    """
+    Test that every input base is written to exactly one shard
+    """
+    outputs = [tmp_path / "shard-{}.bed".format(i) for i in range(4)]
+    hs.write_region_shards(region_bed, outputs, mode)
+    observed = sum(
+        (hs.read_bed(x) for x in outputs if x.stat().st_size > 0),
+        [],
+    )
+    assert sum(end - start for _, start, end in observed) == 410
+
+
+def test_write_region_shards_bad_mode(region_bed, tmp_path):
+    """
+    Test that an unknown sharding mode is rejected
+    """
+    with pytest.raises(ValueError):
+        hs.write_region_shards(region_bed, [tmp_path / "shard-0.bed"], "by-vibes")
+
+
+def test_gather_extended_csvs(shard_csvs, tmp_path):
+    """
+    Test that counts are summed across shards and metrics are
+    recomputed from the summed counts rather than averaged
+    """
+    output = tmp_path / "results.extended.csv"
+    hs.gather_extended_csvs(shard_csvs, output)
+    observed = pd.read_csv(output).set_index("Type")
+    assert list(observed.index) == ["SNP", "INDEL"]
+    assert observed.loc["SNP", "TRUTH.TP"] == 10
+    assert observed.loc["SNP", "TRUTH.FN"] == 10
+    assert observed.loc["SNP", "METRIC.Recall"] == pytest.approx(0.5)
+    assert observed.loc["SNP", "METRIC.Precision"] == pytest.approx(10 / 11)
+    assert observed.loc["SNP", "METRIC.F1_Score"] == pytest.approx(
+        2 * 0.5 * (10 / 11) / (0.5 + 10 / 11)
+    )
+    assert observed.loc["SNP", "TRUTH.TOTAL.TiTv_ratio"] == pytest.approx(8 / 12)
+    assert observed.loc["INDEL", "METRIC.Frac_NA"] == pytest.approx(0.5)
+    assert pd.isna(observed.loc["INDEL", "TRUTH.TOTAL.TiTv_ratio"])
+    assert observed["PREC.LOWER"].isna().all()
+    assert observed.loc["SNP", "Subset.Size"] == 5000
+    assert observed.loc["SNP", "Subset.IS_CONF.Size"] == 500
+    assert observed.loc["SNP", "Subset.Level"] == 1
+    assert observed.loc["INDEL", "Subset.IS_CONF.Size"] == 300
+
+
+def test_gather_extended_csvs_all_empty(shard_csvs, tmp_path):
+    """
+    Test that entirely empty shard output produces an empty output
+    """
+    output = tmp_path / "results.extended.csv"
+    hs.gather_extended_csvs([shard_csvs[1]], output)
+    assert output.read_text() == ""
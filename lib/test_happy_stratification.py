@@ -0,0 +1,166 @@
+import gzip
+
+import pandas as pd
+import pytest
+
+from lib import happy_stratification as hstrat
+
+
+@pytest.fixture
+def happy_vcf(tmp_path):
+    """
+    Minimal hap.py annotated vcf, with records inside and outside
+    a stratification covering chr1:100-200
+    """
+    records = [
+        ## truth and query SNP match inside the stratification
+        ("chr1", 101, "A", "PASS", "GT:BD:BK:BVT", "0/1:TP:gm:SNP", "0/1:TP:gm:SNP"),
+        ## filtered query SNP matching truth inside the stratification
+        ("chr1", 150, "C", "LowQual", "GT:BD:BK:BVT", "0/1:TP:gm:SNP", "0/1:TP:gm:SNP"),
+        ## false positive SNP with a genotype mismatch
+        ("chr1", 160, "G", "PASS", "GT:BD:BK:BVT", "0/1:FN:am:SNP", "1/1:FP:am:SNP"),
+        ## deletion starting before the stratification and overlapping it
+        ("chr1", 95, "ACGTACGT", "PASS", "GT:BD:BVT", ".:.:NOCALL", "0/1:FP:INDEL"),
+        ## missed SNP outside the stratification
+        ("chr2", 10, "T", ".", "GT:BD:BK:BVT", "0/1:FN:.:SNP", ".:.:.:NOCALL"),
+        ## unassessed query SNP outside the stratification
+        ("chr1", 500, "T", "PASS", "GT:BD:BK:BVT", ".:.:.:NOCALL", "0/1:UNK:.:SNP"),
+    ]
+    filename = tmp_path / "results.vcf.gz"
+    with gzip.open(filename, "wt") as f:
+        f.write("##fileformat=VCFv4.2\n")
+        f.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tTRUTH\tQUERY\n")
+        for contig, pos, ref, filt, fmt, truth, query in records:
+            f.write(
+                "\t".join([contig, str(pos), ".", ref, "N", ".", filt, ".", fmt, truth, query])
+                + "\n"
+            )
+    (tmp_path / "strat.bed").write_text("chr1\t100\t200\n")
+    (tmp_path / "empty.bed").write_text("")
+    return filename
+
+
+def test_read_happy_vcf(happy_vcf):
+    """
+    Test that records are parsed into spans, filter status and per-sample hap.py fields
+    """
+    observed = pd.concat(list(hstrat.read_happy_vcf(happy_vcf, chunk_size=4)), ignore_index=True)
+    assert observed["start"].to_list() == [100, 149, 159, 94, 9, 499]
+    assert observed["end"].to_list() == [101, 150, 160, 102, 10, 500]
+    assert observed["pass"].to_list() == [True, False, True, True, True, True]
+    assert observed["QUERY.BD"].to_list() == ["TP", "TP", "FP", "FP", ".", "UNK"]
+    assert observed["TRUTH.BK"].to_list() == ["gm", "gm", "am", ".", ".", "."]
+
+
+def test_count_decisions(happy_vcf):
+    """
+    Test that filtered query calls count toward ALL, and leave their truth variants as FN under PASS
+    """
+    records = pd.concat(list(hstrat.read_happy_vcf(happy_vcf)), ignore_index=True)
+    observed = hstrat.count_decisions(records, "SNP", False)
+    assert observed == {
+        "TRUTH.TP": 2,
+        "TRUTH.FN": 2,
+        "QUERY.TP": 2,
+        "QUERY.FP": 1,
+        "QUERY.UNK": 1,
+        "FP.gt": 1,
+        "FP.al": 0,
+    }
+    observed = hstrat.count_decisions(records, "SNP", True)
+    assert observed["TRUTH.TP"] == 1
+    assert observed["TRUTH.FN"] == 3
+    assert observed["QUERY.TP"] == 1
+
+
+def test_count_decisions_fp_mismatches():
+    """
+    Test that false positives are split into genotype and allele mismatches
+    by match type, leaving unmatched false positives in neither count
+    """
+    records = pd.DataFrame(
+        {
+            "TRUTH.BVT": ["NOCALL"] * 4,
+            "TRUTH.BD": ["."] * 4,
+            "QUERY.BVT": ["SNP"] * 4,
+            "QUERY.BD": ["FP", "FP", "FP", "FP"],
+            "QUERY.BK": ["am", "lm", "lm", "."],
+            "pass": [True] * 4,
+        }
+    )
+    observed = hstrat.count_decisions(records, "SNP", False)
+    assert observed["QUERY.FP"] == 4
+    assert observed["FP.gt"] == 1
+    assert observed["FP.al"] == 2
+
+
+def test_stratify_happy_vcf(happy_vcf, tmp_path):
+    """
+    Test that records are assigned to overlapping stratifications across chunks
+    """
+    observed = hstrat.stratify_happy_vcf(
+        happy_vcf,
+        [("strat", tmp_path / "strat.bed"), ("empty", tmp_path / "empty.bed")],
+        chunk_size=2,
+    ).set_index(["Subset", "Type", "Filter"])
+    snp = observed.loc[("strat", "SNP", "ALL")]
+    assert snp["TRUTH.TOTAL"] == 3
+    assert snp["QUERY.TOTAL"] == 3
+    assert snp["METRIC.Recall"] == pytest.approx(2 / 3)
+    assert snp["METRIC.Precision"] == pytest.approx(2 / 3)
+    assert snp["METRIC.F1_Score"] == pytest.approx(2 / 3)
+    snp = observed.loc[("strat", "SNP", "PASS")]
+    assert snp["METRIC.Recall"] == pytest.approx(1 / 3)
+    assert snp["METRIC.Precision"] == pytest.approx(1 / 2)
+    indel = observed.loc[("strat", "INDEL", "ALL")]
+    assert indel["QUERY.FP"] == 1
+    assert indel["FP.gt"] == 0
+    assert indel["FP.al"] == 0
+    assert observed.loc[("strat", "SNP", "ALL")]["FP.gt"] == 1
+    assert pd.isna(indel["METRIC.Recall"])
+    assert observed.loc[("empty", "SNP", "ALL")]["TRUTH.TOTAL"] == 0
+
+
+def test_write_post_hoc_extended_csv(happy_vcf, tmp_path):
+    """
+    Test that stratified rows for all stratifications are computed in one pass, and that
+    each subset keeps the genome-wide rows of the unstratified run followed by its own rows
+    """
+    unstratified = tmp_path / "unstratified.extended.csv"
+    pd.DataFrame(
+        {
+            "Type": ["SNP", "SNP"],
+            "Subtype": ["*", "ti"],
+            "Subset": ["*", "*"],
+            "Filter": ["ALL", "ALL"],
+            "Genotype": ["*", "*"],
+            "QQ.Field": ["QUERY.TOTAL", "QUERY.TOTAL"],
+            "QQ": ["*", "*"],
+            "METRIC.Recall": [0.5, 0.4],
+            "Subset.Size": [1000, 1000],
+        }
+    ).to_csv(unstratified, index=False)
+    stratified = tmp_path / "stratified.csv"
+    hstrat.write_post_hoc_stratified_csv(
+        happy_vcf,
+        ["strat", "empty", "strat"],
+        [tmp_path / "strat.bed", tmp_path / "empty.bed", tmp_path / "strat.bed"],
+        stratified,
+    )
+    assert pd.read_csv(stratified)["Subset"].to_list() == ["strat"] * 4 + ["empty"] * 4
+    output = tmp_path / "results.extended.csv"
+    hstrat.write_post_hoc_extended_csv(unstratified, stratified, ["strat"], output)
+    observed = pd.read_csv(output)
+    assert list(observed.columns[:9]) == [
+        "Type",
+        "Subtype",
+        "Subset",
+        "Filter",
+        "Genotype",
+        "QQ.Field",
+        "QQ",
+        "METRIC.Recall",
+        "Subset.Size",
+    ]
+    assert observed["Subset"].to_list() == ["*", "*"] + ["strat"] * 4
+    assert observed["Subset.Size"].isna().sum() == 4
@@ -0,0 +1,54 @@
+import gzip
+
+import numpy as np
+
+from lib.interval_index import IntervalIndex
+
+
+def test_interval_index_merges_intervals():
+    """
+    Test that overlapping and abutting intervals are merged per contig
+    """
+    index = IntervalIndex(
+        [("chr1", 50, 60), ("chr1", 0, 10), ("chr1", 5, 20), ("chr1", 20, 30), ("chr2", 0, 5)]
+    )
+    assert index.contigs["chr1"][0].tolist() == [0, 50]
+    assert index.contigs["chr1"][1].tolist() == [30, 60]
+    assert index.contigs["chr2"][1].tolist() == [5]
+
+
+def test_interval_index_contains():
+    """
+    Test that spans are contained only when entirely within a single merged interval
+    """
+    index = IntervalIndex([("chr1", 0, 10), ("chr1", 5, 30), ("chr1", 50, 60)])
+    observed = index.contains(
+        np.array(["chr1", "chr1", "chr1", "chr1", "chr1", "chr2"]),
+        np.array([0, 25, 40, 55, 60, 0]),
+        np.array([30, 35, 45, 55, 60, 1]),
+    )
+    assert observed.tolist() == [True, False, False, True, False, False]
+
+
+def test_interval_index_from_bed(tmp_path):
+    """
+    Test that gzipped bedfiles with headers are indexed
+    """
+    bed = tmp_path / "strat.bed.gz"
+    with gzip.open(bed, "wt") as f:
+        f.write("#header\nchr1\t10\t20\n")
+    index = IntervalIndex.from_bed(bed)
+    assert index.contains(["chr1", "chr1"], [10, 19], [20, 21]).tolist() == [True, False]
+
+
+def test_interval_index_overlaps():
+    """
+    Test that spans overlapping any interval by at least one base are detected
+    """
+    index = IntervalIndex([("chr1", 10, 20), ("chr1", 40, 50)])
+    observed = index.overlaps(
+        np.array(["chr1", "chr1", "chr1", "chr1", "chr1", "chr2"]),
+        np.array([5, 19, 20, 30, 45, 15]),
+        np.array([11, 25, 40, 60, 45, 16]),
+    )
+    assert observed.tolist() == [True, True, False, True, True, False]
@@ -0,0 +1,130 @@
+import base64
+import json
+
+import pandas as pd
+import pytest
+
+from lib import performance_dashboard as pdash
+
+BENCHMARK_HEADER = (
+    "s\th:m:s\tmax_rss\tmax_vms\tmax_uss\tmax_pss\tio_in\tio_out\tmean_load\tcpu_time\n"
+)
+
+
+@pytest.fixture
+def benchmark_dir(tmp_path):
+    """
+    Benchmark tsvs from two rules, plus one that matches no rule
+    """
+    contents = {
+        "happy_run/exp1/ref1/all/0/results.tsv": (3600, 6000),
+        "happy_run/exp1/ref1/all/1/results.tsv": (7200, 3000),
+        "create_sdf/grch38.tsv": (60, 100),
+        "orphan/results.tsv": (1, "-"),
+    }
+    for path, (seconds, max_rss) in contents.items():
+        filename = tmp_path / "benchmarks" / path
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        filename.write_text(
+            BENCHMARK_HEADER + "{}\t0\t{}\t1\t1\t1\t1\t1\t1\t{}\n".format(seconds, max_rss, seconds)
+        )
+    return tmp_path / "benchmarks"
+
+
+def benchmark_patterns(benchmark_dir):
+    """
+    Benchmark patterns for the rules in the benchmark fixture
+    """
+    return {
+        "happy_run": str(
+            benchmark_dir / "happy_run/{experimental}/{reference}/{region}/{set}/results.tsv"
+        ),
+        "create_sdf": str(benchmark_dir / "create_sdf/{genome}.tsv"),
+    }
+
+
+def write_metadata(metadata_dir, output, record):
+    """
+    Write a snakemake metadata record for a single output file
+    """
+    metadata_dir.mkdir(parents=True, exist_ok=True)
+    name = base64.urlsafe_b64encode(output.encode()).decode()
+    (metadata_dir / name).write_text(json.dumps(record))
+
+
+def test_read_benchmarks(benchmark_dir):
+    """
+    Test that benchmarks are assigned to rules with wildcards parsed from their paths
+    """
+    observed = pdash.read_benchmarks(benchmark_patterns(benchmark_dir), str(benchmark_dir))
+    assert len(observed) == 4
+    happy = observed.loc[observed["rule"] == "happy_run"].sort_values("set")
+    assert happy["set"].to_list() == ["0", "1"]
+    assert happy["experimental"].to_list() == ["exp1", "exp1"]
+    assert observed["rule"].isna().sum() == 1
+    assert observed["max_rss"].isna().sum() == 1
+
+
+def test_summarize_rules(benchmark_dir):
+    """
+    Test that totals, distributions and memory efficiency are summarized per rule,
+    with memory requests given either as numbers or functions of wildcards
+    """
+    benchmarks = pdash.add_memory_efficiency(
+        pdash.read_benchmarks(benchmark_patterns(benchmark_dir), str(benchmark_dir)),
+        {
+            "happy_run": lambda wildcards: 6000 * (int(wildcards.set) + 1),
+            "create_sdf": 1000,
+        },
+    )
+    observed = pdash.summarize_rules(benchmarks).set_index("rule")
+    assert observed.index[0] == "happy_run"
+    assert observed.loc["happy_run", "jobs"] == 2
+    assert observed.loc["happy_run", "wall_hours"] == pytest.approx(3)
+    assert observed.loc["happy_run", "max_s"] == 7200
+    assert observed.loc["happy_run", "median_mem_efficiency"] == pytest.approx(0.625)
+    assert observed.loc["create_sdf", "max_mem_efficiency"] == pytest.approx(0.1)
+    assert pd.isna(observed.loc["(unmatched)", "median_mem_mb"])
+
+
+def test_critical_path(tmp_path):
+    """
+    Test that the slowest chain of dependent jobs is reported in order,
+    combining jobs with multiple outputs
+    """
+    metadata_dir = tmp_path / "metadata"
+    records = [
+        ("ref.fa", {"rule": "get_ref", "input": [], "starttime": 0, "endtime": 10}),
+        ("exp.vcf", {"rule": "get_exp", "input": [], "starttime": 0, "endtime": 30}),
+        ("happy.csv", {"rule": "happy", "input": ["ref.fa", "exp.vcf"], "starttime": 30}),
+        ("happy.vcf", {"rule": "happy", "input": ["ref.fa", "exp.vcf"], "starttime": 30}),
+        ("sdf", {"rule": "sdf", "input": ["ref.fa"], "starttime": 10, "endtime": 20}),
+        ("report.html", {"rule": "report", "input": ["happy.csv", "sdf"], "starttime": 100}),
+    ]
+    for output, record in records:
+        record.setdefault("endtime", {"happy": 90, "report": 110}.get(record["rule"]))
+        record["job_hash"] = hash(record["rule"])
+        write_metadata(metadata_dir, output, record)
+    jobs = pdash.read_job_metadata(str(metadata_dir))
+    assert len(jobs) == 5
+    observed = pdash.critical_path(jobs)
+    assert observed["rule"].to_list() == ["get_exp", "happy", "report"]
+    assert observed["cumulative_seconds"].to_list() == [30, 90, 100]
+
+
+def test_write_performance_dashboard(benchmark_dir, tmp_path):
+    """
+    Test that the dashboard and combined table are written without job metadata
+    """
+    html = tmp_path / "dashboard.html"
+    tsv = tmp_path / "benchmarks.tsv"
+    pdash.write_performance_dashboard(
+        benchmark_patterns(benchmark_dir),
+        {"create_sdf": 1000},
+        html,
+        tsv,
+        str(benchmark_dir),
+        str(tmp_path / "missing"),
+    )
+    assert "Critical path" in html.read_text()
+    assert len(pd.read_csv(tsv, sep="\t")) == 4
@@ -0,0 +1,274 @@
+from types import SimpleNamespace
+
+import pytest
+
+from lib import resource_calculator as rc
+
+BENCHMARK_HEADER = (
+    "s\th:m:s\tmax_rss\tmax_vms\tmax_uss\tmax_pss\tio_in\tio_out\tmean_load\tcpu_time\n"
+)
+
+
+@pytest.fixture
+def benchmark_history(tmp_path):
+    """
+    Benchmark tsvs and matching inputs for five jobs, where peak memory
+    is 1000 MB plus 100 MB per MB of input and runtime is 1 minute per MB
+    """
+    for i in range(1, 6):
+        (tmp_path / "inputs").mkdir(exist_ok=True)
+        (tmp_path / "inputs" / "sample{}.vcf.gz".format(i)).write_bytes(b"\0" * (i * 1024**2))
+        benchmark = tmp_path / "benchmarks" / "sample{}".format(i) / "results.tsv"
+        benchmark.parent.mkdir(parents=True)
+        benchmark.write_text(
+            BENCHMARK_HEADER
+            + "{}\t0:00:00\t{}\t1\t1\t1\t1\t1\t1\t1\n".format(60 * i, 1000 + 100 * i)
+        )
+    return tmp_path
+
+
+def make_predictor(tmp_path, **kwargs):
+    """
+    Construct a predictor against the benchmark history fixture
+    """
+    return rc.ResourcePredictor(
+        str(tmp_path / "benchmarks" / "{sample}" / "results.tsv"),
+        lambda wildcards: [str(tmp_path / "inputs" / "{}.vcf.gz".format(wildcards.sample))],
+        64000,
+        1440,
+        **kwargs
+    )
+
+
+@pytest.fixture
+def queue_status(tmp_path):
+    """
+    Stub scheduler queue report, listing occupancy per partition
+    """
+    res = tmp_path / "queue_status.txt"
+    res.write_text("small 40\nlarge 3\nmedium not-a-number\n")
+    return res
+
+
+@pytest.fixture(autouse=True)
+def reset_partition_selection():
+    """
+    Restore the default partition selection strategy after each test
+    """
+    yield
+    rc.configure_partition_selection({})
+
+
+def test_select_partition():
+    """
+    Test that a partition is chosen from the configured group
+    """
+    assert rc.select_partition("small", {"small": ["a", "b"]}) in ["a", "b"]
+    with pytest.raises(ValueError):
+        rc.select_partition("large", {"small": ["a", "b"]})
+
+
+def test_select_partition_round_robin():
+    """
+    Test that round-robin selection cycles through a group in order
+    """
+    rc.configure_partition_selection({"strategy": "round-robin"})
+    partitions = {"small": ["a", "b", "c"]}
+    observed = [rc.select_partition("small", partitions) for _ in range(4)]
+    assert observed == ["a", "b", "c", "a"]
+
+
+def test_select_partition_weighted():
+    """
+    Test that weighted selection never chooses a zero-weight partition
+    """
+    rc.configure_partition_selection({"strategy": "weighted", "weights": {"a": 0, "b": 2}})
+    observed = {rc.select_partition("small", {"small": ["a", "b"]}) for _ in range(20)}
+    assert observed == {"b"}
+
+
+@pytest.mark.parametrize("source", ["load-file", "load-command"])
+def test_select_partition_load_aware(queue_status, source):
+    """
+    Test that load-aware selection picks the least occupied partition
+    from either a status file or a status command
+    """
+    settings = {"strategy": "load-aware"}
+    settings[source] = str(queue_status) if source == "load-file" else "cat {}".format(queue_status)
+    rc.configure_partition_selection(settings)
+    assert rc.select_partition("all", {"all": ["small", "large", "medium"]}) == "large"
+
+
+def test_load_aware_partition_selector_cache(queue_status):
+    """
+    Test that queue status is reused within the cache window and refreshed after it
+    """
+    now = [0]
+    selector = rc.LoadAwarePartitionSelector(
+        filename=str(queue_status), cache_seconds=30, clock=lambda: now[0]
+    )
+    assert selector.choose(["small", "large"]) == "large"
+    queue_status.write_text("small 1\nlarge 3\n")
+    now[0] = 10
+    assert selector.choose(["small", "large"]) == "large"
+    now[0] = 30
+    assert selector.choose(["small", "large"]) == "small"
+
+
+def test_load_aware_partition_selector_fallback(tmp_path):
+    """
+    Test that an unreadable queue status falls back to random selection
+    """
+    selector = rc.LoadAwarePartitionSelector(filename=str(tmp_path / "missing.txt"))
+    assert selector.choose(["a", "b"]) in ["a", "b"]
+    with pytest.raises(ValueError):
+        rc.LoadAwarePartitionSelector()
+
+
+def test_configure_partition_selection_unknown():
+    """
+    Test that an unknown strategy is rejected
+    """
+    with pytest.raises(ValueError):
+        rc.configure_partition_selection({"strategy": "by-vibes"})
+
+
+def test_get_partition_selector():
+    """
+    Test that per-job partition selection validates the group up front
+    """
+    observed = rc.get_partition_selector("small", {"small": ["a"]})
+    assert observed(None) == "a"
+    with pytest.raises(ValueError):
+        rc.get_partition_selector("large", {"small": ["a"]})
+
+
+def test_read_benchmark(benchmark_history):
+    """
+    Test that peak memory and wall time are read from a benchmark tsv
+    """
+    observed = rc.read_benchmark(benchmark_history / "benchmarks" / "sample2" / "results.tsv")
+    assert observed == {"mem_mb": 1200, "runtime": 2}
+
+
+def test_resource_predictor(benchmark_history):
+    """
+    Test that memory and runtime are predicted from input size with a margin
+    """
+    predictor = make_predictor(benchmark_history, margin=1.5)
+    wildcards = SimpleNamespace(sample="sample3")
+    assert predictor.mem_mb(wildcards) == pytest.approx(1300 * 1.5, abs=1)
+    assert predictor.runtime(wildcards) == 5
+    assert len(predictor.observations()) == 5
+
+
+def test_resource_predictor_bounds(benchmark_history):
+    """
+    Test that predicted memory respects the configured minimum and maximum
+    """
+    wildcards = SimpleNamespace(sample="sample3")
+    assert make_predictor(benchmark_history, min_mem_mb=8000).mem_mb(wildcards) == 8000
+    predictor = make_predictor(benchmark_history, margin=100.0)
+    assert predictor.mem_mb(wildcards) == 64000
+
+
+@pytest.mark.parametrize(
+    "kwargs, sample",
+    [
+        ({"min_observations": 6}, "sample3"),
+        ({"enabled": False}, "sample3"),
+        ({}, "sample_missing"),
+    ],
+)
+def test_resource_predictor_fallback(benchmark_history, kwargs, sample):
+    """
+    Test that configured resources are used without enough history,
+    when disabled, or when the job's inputs are not yet present
+    """
+    predictor = make_predictor(benchmark_history, **kwargs)
+    wildcards = SimpleNamespace(sample=sample)
+    assert predictor.mem_mb(wildcards) == 64000
+    assert predictor.runtime(wildcards) == 1440
+
+
+def test_get_resource_predictor():
+    """
+    Test that prediction settings are read from resource configuration
+    """
+    config_resources = {
+        "resource-prediction": {"enabled": True, "margin": 2.0, "min-memory": 100},
+        "happy": {"threads": 1, "memory": 4000, "partition": "small"},
+    }
+    observed = rc.get_resource_predictor(
+        config_resources, config_resources["happy"], "{sample}.tsv", lambda x: []
+    )
+    assert observed.max_mem_mb == 4000
+    assert observed.margin == 2.0
+    assert observed.min_mem_mb == 100
+    assert observed.min_observations == 5
+
+
+@pytest.mark.parametrize(
+    "attempt, oom_records, expected",
+    [
+        (1, 0, 4000),
+        (1, 2, 4000),
+        (2, 0, 4000),
+        (2, 1, 6000),
+        (3, 1, 6000),
+        (3, 2, 9000),
+        (4, 3, 10000),
+    ],
+)
+def test_memory_escalation(tmp_path, attempt, oom_records, expected):
+    """
+    Test that memory only escalates on retries of jobs recorded as out of memory,
+    and never past the ceiling
+    """
+    marker = tmp_path / "oom" / "sample1.txt"
+    if oom_records > 0:
+        marker.parent.mkdir()
+        marker.write_text("1700000000\t137\n" * oom_records)
+    escalation = rc.MemoryEscalation(4000, str(tmp_path / "oom" / "{sample}.txt"), 1.5, 10000)
+    wildcards = SimpleNamespace(sample="sample1")
+    assert escalation.marker(wildcards) == str(marker)
+    assert escalation.mem_mb(wildcards, attempt) == expected
+
+
+def test_memory_escalation_callable_base(tmp_path):
+    """
+    Test that a base request computed from wildcards is escalated, and that
+    a ceiling below the base request leaves the base unchanged
+    """
+    (tmp_path / "sample1.txt").write_text("1700000000\t137\n")
+    escalation = rc.MemoryEscalation(
+        lambda wildcards: 3000 if wildcards.sample == "sample1" else 1000,
+        str(tmp_path / "{sample}.txt"),
+        2.0,
+        2000,
+    )
+    assert escalation.mem_mb(SimpleNamespace(sample="sample1"), 2) == 3000
+    assert escalation.mem_mb(SimpleNamespace(sample="sample2"), 2) == 1000
+    escalation.max_mem_mb = None
+    assert escalation.mem_mb(SimpleNamespace(sample="sample1"), 2) == 6000
+
+
+def test_get_memory_escalation():
+    """
+    Test that escalation settings are read from resource configuration, with defaults
+    """
+    config_resources = {"memory-escalation": {"factor": 2.0, "max-memory": 128000}}
+    observed = rc.get_memory_escalation(config_resources, 4000, "{sample}.txt")
+    assert observed.factor == 2.0
+    assert observed.max_mem_mb == 128000
+    observed = rc.get_memory_escalation({}, 4000, "{sample}.txt")
+    assert observed.factor == 1.5
+    assert observed.max_mem_mb is None
+
+
+def test_jvm_heap():
+    """
+    Test that JVM heaps are the configured fraction of job memory
+    """
+    assert rc.jvm_heap({"memory-escalation": {"jvm-fraction": 0.25}}, 64000) == "16000m"
+    assert rc.jvm_heap({}, 16000) == "8000m"
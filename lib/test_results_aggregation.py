@@ -0,0 +1,59 @@
+import pytest
+
+from lib import results_aggregation as ra
+
+
+@pytest.fixture
+def extended_csvs(tmp_path):
+    """
+    Minimal hap.py extended csvs from two stratification sets,
+    along with an empty csv from a set with no variants
+    """
+    header = "Type,Subtype,Subset,Filter,METRIC.Recall\n"
+    filenames = [tmp_path / str(i) / "results.extended.csv" for i in range(3)]
+    for filename in filenames:
+        filename.parent.mkdir()
+    filenames[0].write_text(header + "SNP,*,*,PASS,0.9\nINDEL,*,*,PASS,0.8\n")
+    filenames[1].write_text("")
+    filenames[2].write_text(header + "SNP,*,*,PASS,0.9\nSNP,*,segdup,PASS,0.7")
+    return filenames
+
+
+def test_combine_extended_results(extended_csvs, tmp_path):
+    """
+    Test that extended csvs are annotated and concatenated
+    under a single header
+    """
+    output = tmp_path / "results.extended.csv"
+    ra.combine_extended_results(extended_csvs, output, "exp1", "ref1", "reg1")
+    expected = [
+        "Experimental,Reference,Region,Type,Subtype,Subset,Filter,METRIC.Recall\n",
+        "exp1,ref1,reg1,SNP,*,*,PASS,0.9\n",
+        "exp1,ref1,reg1,INDEL,*,*,PASS,0.8\n",
+        "exp1,ref1,reg1,SNP,*,*,PASS,0.9\n",
+        "exp1,ref1,reg1,SNP,*,segdup,PASS,0.7\n",
+    ]
+    with open(output, "r") as f:
+        observed = f.readlines()
+    assert observed == expected
+
+
+def test_combine_extended_results_empty_first(extended_csvs, tmp_path):
+    """
+    Test that an empty leading input does not suppress the header
+    """
+    output = tmp_path / "results.extended.csv"
+    ra.combine_extended_results(extended_csvs[1:], output, "exp1", "ref1", "reg1")
+    with open(output, "r") as f:
+        observed = f.readlines()
+    assert observed[0].startswith("Experimental,Reference,Region,Type,")
+    assert len(observed) == 3
+
+
+def test_combine_extended_results_all_empty(extended_csvs, tmp_path):
+    """
+    Test that entirely empty input produces an empty output
+    """
+    output = tmp_path / "results.extended.csv"
+    ra.combine_extended_results([extended_csvs[1]], output, "exp1", "ref1", "reg1")
+    assert output.read_text() == ""
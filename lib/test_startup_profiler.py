@@ -0,0 +1,52 @@
+import io
+
+import pytest
+
+from lib import startup_profiler as sp
+
+
+@pytest.mark.parametrize("value, expected", [("1", True), ("", False), (None, False)])
+def test_startup_profiler_environment(monkeypatch, value, expected):
+    """
+    Test that profiling is enabled by a non-empty environment variable
+    """
+    monkeypatch.delenv(sp.PROFILE_ENVIRONMENT_VARIABLE, raising=False)
+    if value is not None:
+        monkeypatch.setenv(sp.PROFILE_ENVIRONMENT_VARIABLE, value)
+    assert sp.StartupProfiler().enabled == expected
+
+
+def test_startup_profiler_stages():
+    """
+    Test that repeated stages accumulate and are reported in order of first use
+    """
+    stream = io.StringIO()
+    profiler = sp.StartupProfiler(enabled=True, stream=stream)
+    with profiler.stage("imports"):
+        pass
+    with profiler.stage("validation"):
+        pass
+    with profiler.stage("imports"):
+        pass
+    assert list(profiler.timings.keys()) == ["imports", "validation"]
+    profiler.write_report()
+    lines = stream.getvalue().splitlines()
+    assert lines[0] == "startup profile:"
+    assert lines[1].strip().startswith("imports")
+    assert lines[3].strip().startswith("total")
+
+
+def test_startup_profiler_disabled():
+    """
+    Test that a disabled profiler records and writes nothing,
+    and still runs the profiled code
+    """
+    stream = io.StringIO()
+    profiler = sp.StartupProfiler(enabled=False, stream=stream)
+    ran = []
+    with profiler.stage("imports"):
+        ran.append(True)
+    profiler.write_report()
+    assert ran == [True]
+    assert profiler.timings == {}
+    assert stream.getvalue() == ""
@@ -1,6 +1,9 @@
+import gzip
 import os
 import pathlib
+import re
 
+import pandas as pd
 import pytest
 from snakemake.io import AnnotatedString, Namedlist, expand
 from snakemake.remote.FTP import RemoteProvider as FTPRemoteProvider
@@ -69,6 +72,16 @@ def test_map_reference_file_ftp():
     assert observed == expected
 
 
+def test_get_remote_provider():
+    """
+    Test that remote providers are created once per protocol, on request
+    """
+    assert tc.get_remote_provider("http") is tc.get_remote_provider("http")
+    assert tc.get_remote_provider("http") is not tc.get_remote_provider("s3")
+    with pytest.raises(ValueError):
+        tc.get_remote_provider("gopher")
+
+
 def test_construct_targets(config, manifest_experiment, manifest_comparisons):
     """
     Test that construct_targets successfully populates all final reports
@@ -113,3 +126,405 @@ def test_flatten_region_definitions(config, label_df):
     expected = ["*", "everybody", ".*", "name1", "some1", ".*", "name2", "some2", ".*"]
     observed = tc.flatten_region_definitions(config, label_df, "grch100")
     assert observed == expected
+
+
+def test_comparison_index_reports(manifest_comparisons, manifest_experiment):
+    """
+    Test that ComparisonIndex collects report names and their
+    comparisons from comma-delimited report entries
+    """
+    index = tc.ComparisonIndex(manifest_comparisons, manifest_experiment)
+    assert index.reports() == ["comp2", "comp1", "comp3"]
+    assert index.comparisons["comp1"] == [("exp1", "ref2", "SNV"), ("exp2", "ref2", "SNV")]
+    assert index.comparison_types["comp3"] == {"SV", "SNV"}
+    assert index.report_replicates("comp1") == {"rep1"}
+    assert index.report_replicates("nonexistent") == set()
+
+
+def test_get_comparison_index_is_reused(manifest_comparisons, manifest_experiment):
+    """
+    Test that get_comparison_index only builds a single index
+    for a given set of manifest objects
+    """
+    first = tc.get_comparison_index(manifest_comparisons, manifest_experiment)
+    second = tc.get_comparison_index(manifest_comparisons, manifest_experiment)
+    assert first is second
+    third = tc.get_comparison_index(manifest_comparisons.copy(), manifest_experiment)
+    assert third is not first
+
+
+def test_get_benchmarking_output_files(wildcards_for_report, config, manifest_comparisons):
+    """
+    Test that get_benchmarking_output_files emits one combined
+    results file per comparison in the requested report
+    """
+    config["sv-toolname"] = "truvari"
+    expected = [
+        "results/happy/exp1/ref1/back1/results.extended.csv",
+        "results/happy/exp1/ref2/back1/results.extended.csv",
+    ]
+    observed = tc.get_benchmarking_output_files(wildcards_for_report, config, manifest_comparisons)
+    assert observed == expected
+
+
+def test_get_happy_comparison_subjects(
+    wildcards_for_report, manifest_experiment, manifest_comparisons
+):
+    """
+    Test that get_happy_comparison_subjects finds the unique replicates
+    of all experimental datasets in a report
+    """
+    observed = tc.get_happy_comparison_subjects(
+        wildcards_for_report, manifest_experiment, manifest_comparisons
+    )
+    assert observed == ["rep1"]
+
+
+@pytest.mark.parametrize(
+    "comparison, expected", [("comp1", ["INDEL", "SNP"]), ("comp3", ["INDEL", "SNP", "SV"])]
+)
+def test_get_variant_types(manifest_comparisons, comparison, expected):
+    """
+    Test that get_variant_types maps comparison types onto
+    the variant types reported by the comparison tools
+    """
+    observed = tc.get_variant_types(manifest_comparisons, comparison)
+    observed.sort()
+    assert observed == expected
+
+
+def test_read_with_cache_reuses_parse(tmp_path):
+    """
+    Test that read_with_cache only reparses a file
+    when its modification time changes
+    """
+    filename = tmp_path / "file.txt"
+    filename.write_text("first")
+    calls = []
+
+    def parser(fn):
+        calls.append(fn)
+        with open(fn, "r") as f:
+            return f.read()
+
+    assert tc.read_with_cache(filename, parser) == "first"
+    assert tc.read_with_cache(filename, parser) == "first"
+    assert len(calls) == 1
+    filename.write_text("second!")
+    os.utime(filename, ns=(0, 0))
+    assert tc.read_with_cache(filename, parser) == "second!"
+    assert len(calls) == 2
+
+
+def test_get_happy_stratification_subset(config, stratification_linker):
+    """
+    Test that stratification subsets are sliced from configured
+    stratification sets in configuration order
+    """
+    config["happy-bedfiles-per-stratification"] = 1
+    expected = [("name2", "results/stratification-sets/grch100/GenomeSpecific/name2.bed.gz")]
+    observed = tc.get_happy_stratification_subset(stratification_linker, config, "1")
+    assert observed == expected
+
+
+def test_get_happy_stratification_subset_by_cost(
+    config, stratification_linker, tmp_path, monkeypatch
+):
+    """
+    Test that cost-based packing reads the stratification bedfiles
+    and places the largest bedfile first
+    """
+    monkeypatch.chdir(tmp_path)
+    beds = {
+        "LowComplexity/name1.bed.gz": "chr1\t0\t10\n",
+        "GenomeSpecific/name2.bed.gz": "chr1\t0\t10\nchr1\t20\t1000\n",
+    }
+    for path, contents in beds.items():
+        filename = tmp_path / "results/stratification-sets/grch100" / path
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(filename, "wt") as f:
+            f.write(contents)
+    config["happy-bedfiles-per-stratification"] = 1
+    for packing in ["intervals", "bp"]:
+        config["happy-stratification-packing"] = packing
+        observed = tc.get_happy_stratification_subset(stratification_linker, config, 0)
+        assert observed == [
+            ("name2", "results/stratification-sets/grch100/GenomeSpecific/name2.bed.gz")
+        ]
+    config["happy-stratification-packing"] = "by-vibes"
+    with pytest.raises(ValueError):
+        tc.get_happy_stratification_subset(stratification_linker, config, 0)
+
+
+@pytest.mark.parametrize(
+    "costs, expected",
+    [
+        (None, [["a", "b"], ["c", "d"], ["e"]]),
+        ([1, 1, 1, 1, 1], [["a", "d"], ["b", "e"], ["c"]]),
+        ([100, 1, 1, 50, 60], [["a"], ["e"], ["b", "c", "d"]]),
+    ],
+)
+def test_pack_happy_stratification_sets(costs, expected):
+    """
+    Test that subsets are sliced by position without costs, and balanced
+    deterministically by cost otherwise, always with the same number of subsets
+    """
+    regions = [(x, "{}.bed".format(x)) for x in "abcde"]
+    observed = tc.pack_happy_stratification_sets(regions, 2, costs)
+    assert [[x for x, y in subset] for subset in observed] == expected
+
+
+def test_write_happy_stratification_subset(config, stratification_linker, tmp_path):
+    """
+    Test that a stratification subset is written as a hap.py stratification tsv
+    """
+    config["happy-bedfiles-per-stratification"] = 2
+    output = tmp_path / "stratification_subset.tsv"
+    tc.write_happy_stratification_subset(stratification_linker, output, config, "0")
+    assert output.read_text() == (
+        "name1\tresults/stratification-sets/grch100/LowComplexity/name1.bed.gz\n"
+        "name2\tresults/stratification-sets/grch100/GenomeSpecific/name2.bed.gz\n"
+    )
+
+
+def test_get_happy_stratification_set_indices(config, checkpoints):
+    """
+    Test that the number of stratification subsets reflects
+    the number of bedfiles permitted per hap.py run
+    """
+    config["happy-bedfiles-per-stratification"] = 3
+    assert tc.get_happy_stratification_set_indices(None, config, checkpoints) == [0]
+    config["happy-bedfiles-per-stratification"] = 1
+    assert tc.get_happy_stratification_set_indices(None, config, checkpoints) == [0, 1]
+
+
+def test_get_stratification_downloads(config, stratification_linker):
+    """
+    Test that all configured stratification bedfiles, including the
+    genome-wide background, are requested in linker order
+    """
+    expected = [
+        (
+            "ftp://target/ftpdir/GRCh100-all.bed.gz",
+            "results/stratification-sets/grch100/GRCh100-all.bed.gz",
+        ),
+        (
+            "ftp://target/ftpdir/GenomeSpecific/name2.bed.gz",
+            "results/stratification-sets/grch100/GenomeSpecific/name2.bed.gz",
+        ),
+        (
+            "ftp://target/ftpdir/LowComplexity/name1.bed.gz",
+            "results/stratification-sets/grch100/LowComplexity/name1.bed.gz",
+        ),
+    ]
+    observed = tc.get_stratification_downloads(stratification_linker, config, "grch100")
+    assert observed == expected
+    config["genomes"]["grch100"]["stratification-regions"]["ftp"] = "target"
+    observed = tc.get_stratification_downloads(stratification_linker, config, "grch100")
+    assert observed[0][0] == "https://target/ftpdir/GRCh100-all.bed.gz"
+
+
+@pytest.mark.parametrize(
+    "subset_name, expected",
+    [
+        ("all_background", "results/confident-regions/reg3.bed"),
+        ("name2", "results/stratification-sets/grch100/stratification_files.downloaded"),
+    ],
+)
+def test_get_bedfile_dependency(checkpoints, subset_name, expected):
+    """
+    Test that stratification bedfiles are provided by the bulk download,
+    and the whole background by its confident region
+    """
+    wildcards = Namedlist(
+        fromdict={"region": "reg3", "subset_group": "0", "subset_name": subset_name}
+    )
+    assert tc.get_bedfile_dependency(wildcards, checkpoints, "grch100") == expected
+
+
+@pytest.mark.parametrize(
+    "subset_name, expected",
+    [
+        ("all_background", "results/confident-regions/reg3.bed"),
+        ("name2", "results/stratification-sets/grch100/GenomeSpecific/name2.bed.gz"),
+    ],
+)
+def test_get_bedfile_from_name(checkpoints, subset_name, expected):
+    """
+    Test that bedfiles are looked up by stratification name, with
+    the confident region standing in for the whole background
+    """
+    wildcards = Namedlist(
+        fromdict={"region": "reg3", "subset_group": "0", "subset_name": subset_name}
+    )
+    observed = tc.get_bedfile_from_name(wildcards, checkpoints, "grch100")
+    assert observed == expected
+
+
+def test_get_bedfile_from_name_missing(checkpoints):
+    """
+    Test that requesting a stratification absent from the subset is an error
+    """
+    wildcards = Namedlist(fromdict={"region": "reg3", "subset_group": "0", "subset_name": "name3"})
+    with pytest.raises(ValueError):
+        tc.get_bedfile_from_name(wildcards, checkpoints, "grch100")
+
+
+@pytest.mark.parametrize(
+    "toolname, expected",
+    [
+        (
+            "svdb",
+            [
+                "results/svdb/exp1/ref1/reg3/0/{}.between-svdb.counts.tsv".format(x)
+                for x in ["all_background", "name1", "name2"]
+            ],
+        ),
+        (
+            "truvari",
+            [
+                "results/truvari/exp1/ref1/reg3/0/{}/summary.json".format(x)
+                for x in ["all_background", "name1", "name2"]
+            ],
+        ),
+        (
+            "svanalyzer",
+            ["results/svanalyzer/exp1/ref1/reg3/0/{}.report".format(x) for x in ["name1", "name2"]],
+        ),
+    ],
+)
+def test_find_datasets_in_subset(checkpoints, toolname, expected):
+    """
+    Test that per-stratification SV comparison outputs are
+    constructed for every stratification in a subset
+    """
+    wildcards = Namedlist(
+        fromdict={
+            "toolname": toolname,
+            "experimental": "exp1",
+            "reference": "ref1",
+            "region": "reg3",
+            "stratification_set": "0",
+        }
+    )
+    observed = tc.find_datasets_in_subset(wildcards, checkpoints, "grch100")
+    assert observed == expected
+
+
+def test_get_stratification_intersections(checkpoints):
+    """
+    Test that cached region intersections are listed for every stratification in a subset
+    """
+    wildcards = Namedlist(fromdict={"region": "reg3", "stratification_set": "0"})
+    observed = tc.get_stratification_intersections(wildcards, checkpoints, "grch100")
+    assert observed == [
+        "results/stratification-intersections/reg3/0/name1.bed",
+        "results/stratification-intersections/reg3/0/name2.bed",
+    ]
+
+
+def test_get_source_id():
+    """
+    Test that source ids depend on both source and declared checksum
+    """
+    assert tc.get_source_id("s3://bucket/a.vcf.gz") == tc.get_source_id("s3://bucket/a.vcf.gz")
+    assert tc.get_source_id("s3://bucket/a.vcf.gz") != tc.get_source_id("s3://bucket/b.vcf.gz")
+    assert tc.get_source_id("a.vcf.gz") != tc.get_source_id("a.vcf.gz", "0" * 64)
+    assert re.fullmatch("[0-9a-f]{20}", tc.get_source_id("a.vcf.gz"))
+
+
+def test_input_store(manifest_reference):
+    """
+    Test that a vcf named by several datasets is stored once, and
+    that each distinct set of experimental vcfs is merged once
+    """
+    manifest_experiment = pd.DataFrame(
+        {
+            "experimental_dataset": ["exp1", "exp2", "exp3", "exp3", "exp4", "exp4"],
+            "vcf": [
+                "dummy/path3.vcf.gz",
+                "s3://bucket/exp.vcf.gz",
+                "dummy/chr1.vcf.gz",
+                "dummy/chr2.vcf.gz",
+                "dummy/chr1.vcf.gz",
+                "dummy/chr2.vcf.gz",
+            ],
+        }
+    )
+    store = tc.InputStore(manifest_experiment, manifest_reference)
+    assert len(store.source_files) == 6
+    assert len(store.merges) == 1
+    assert store.dataset_file("experimentals", "exp1") == store.dataset_file("references", "ref1")
+    merged = store.dataset_file("experimentals", "exp3")
+    assert merged == store.dataset_file("experimentals", "exp4")
+    assert merged.startswith("results/input-store/merged/")
+    merge_id = os.path.basename(merged).split(".")[0]
+    assert store.merge_inputs(merge_id) == [
+        "results/input-store/sources/{}.vcf.gz".format(tc.get_source_id(x))
+        for x in ["dummy/chr1.vcf.gz", "dummy/chr2.vcf.gz"]
+    ]
+    assert store.local_inputs(tc.get_source_id("s3://bucket/exp.vcf.gz")) == []
+    assert store.local_inputs(tc.get_source_id("dummy/path3.vcf.gz")) == ["dummy/path3.vcf.gz"]
+    with pytest.raises(ValueError):
+        store.source("0" * 20)
+
+
+def test_get_input_store(manifest_experiment, manifest_reference):
+    """
+    Test that input stores are built once per combination of manifests
+    """
+    store = tc.get_input_store(manifest_experiment, manifest_reference)
+    assert tc.get_input_store(manifest_experiment, manifest_reference) is store
+    assert tc.get_input_store(manifest_experiment.copy(), manifest_reference) is not store
+
+
+def test_input_store_indexes():
+    """
+    Test that declared indexes are reused in their own format,
+    and that other indexes are built
+    """
+    manifest_reference = pd.DataFrame(
+        {
+            "reference_dataset": ["ref1", "ref2", "ref3"],
+            "vcf": ["dummy/path1.vcf.gz", "s3://bucket/ref.vcf.gz", "dummy/path3.vcf.gz"],
+            "vcf_index": ["dummy/path1.vcf.gz.tbi", "s3://bucket/ref.vcf.gz.csi", None],
+        }
+    )
+    store = tc.InputStore(None, manifest_reference)
+    tbi_source, csi_source, unindexed = [tc.get_source_id(x) for x in manifest_reference["vcf"]]
+    assert store.index_source(tbi_source, "tbi") == "dummy/path1.vcf.gz.tbi"
+    assert store.index_source(tbi_source, "csi") == ""
+    assert store.index_inputs(tbi_source, "tbi") == ["dummy/path1.vcf.gz.tbi"]
+    assert store.index_inputs(csi_source, "csi") == []
+    assert store.index_file(csi_source) == "results/input-store/sources/{}.vcf.gz.csi".format(
+        csi_source
+    )
+    assert store.index_file(unindexed) == "results/input-store/sources/{}.vcf.gz.tbi".format(
+        unindexed
+    )
+    assert store.index_source(unindexed, "tbi") == ""
+    assert store.dataset_index("references", "ref1") == "results/references/ref1.vcf.gz.tbi"
+    assert store.dataset_index("references", "ref2") == "results/references/ref2.vcf.gz.csi"
+    assert store.dataset_index("references", "ref3") == "results/references/ref3.vcf.gz.tbi"
+
+
+def test_input_store_merge_indexes():
+    """
+    Test that merges depend on the stored index of each merged source
+    """
+    manifest_experiment = pd.DataFrame(
+        {
+            "experimental_dataset": ["exp1", "exp1"],
+            "vcf": ["dummy/chr1.vcf.gz", "dummy/chr2.vcf.gz"],
+            "vcf_index": ["dummy/chr1.vcf.gz.csi", ""],
+        }
+    )
+    store = tc.InputStore(manifest_experiment, None)
+    merge_id = list(store.merges)[0]
+    assert store.merge_indexes(merge_id) == [
+        "results/input-store/sources/{}.vcf.gz.csi".format(tc.get_source_id("dummy/chr1.vcf.gz")),
+        "results/input-store/sources/{}.vcf.gz.tbi".format(tc.get_source_id("dummy/chr2.vcf.gz")),
+    ]
+    with pytest.raises(ValueError):
+        store.merge_indexes("0" * 20)
+    assert store.dataset_index("experimentals", "exp1") == "results/experimentals/exp1.vcf.gz.tbi"
@@ -0,0 +1,85 @@
+import gzip
+import json
+
+import pandas as pd
+import pytest
+
+from lib import truvari_stratification as ts
+
+
+@pytest.fixture
+def truvari_dir(tmp_path):
+    """
+    Genome-wide truvari bench output vcfs, with records inside and
+    outside a stratification covering chr1:100-200
+    """
+    records = {
+        "tp-base": [
+            "chr1\t101\t.\tN\t<DEL>\t.\tPASS\tSVTYPE=DEL;END=150",
+            "chr2\t5\t.\tN\t<DEL>\t.\tPASS\tEND=50",
+        ],
+        "tp-comp": [
+            "chr1\t102\t.\tN\t<DEL>\t.\tPASS\tSVTYPE=DEL;END=151",
+            "chr2\t5\t.\tN\t<DEL>\t.\tPASS\tEND=50",
+        ],
+        "fp": [
+            "chr1\t150\t.\tA\tACCCC\t.\tPASS\tSVTYPE=INS",
+            "chr1\t190\t.\tN\t<DEL>\t.\tPASS\tEND=300",
+        ],
+        "fn": [],
+    }
+    res = tmp_path / "truvari"
+    res.mkdir()
+    for name, lines in records.items():
+        with gzip.open(res / "{}.vcf.gz".format(name), "wt") as f:
+            f.write("##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+            f.writelines(x + "\n" for x in lines)
+    (tmp_path / "strat.bed").write_text("chr1\t100\t200\n")
+    (tmp_path / "empty.bed").write_text("")
+    return res
+
+
+def test_read_vcf_spans(truvari_dir):
+    """
+    Test that record spans use INFO/END where present, and REF length otherwise
+    """
+    observed = ts.read_vcf_spans(truvari_dir / "fp.vcf.gz")
+    assert observed.values.tolist() == [["chr1", 149, 150], ["chr1", 189, 300]]
+
+
+def test_summarize_counts():
+    """
+    Test that truvari's headline metrics are computed from counts, with undefined ratios missing
+    """
+    observed = ts.summarize_counts({"TP-base": 3, "TP-comp": 2, "FP": 2, "FN": 1})
+    assert observed["precision"] == pytest.approx(0.5)
+    assert observed["recall"] == pytest.approx(0.75)
+    assert observed["f1"] == pytest.approx(0.6)
+    assert observed["base cnt"] == 4
+    observed = ts.summarize_counts({"TP-base": 0, "TP-comp": 0, "FP": 0, "FN": 0})
+    assert observed["precision"] is None and observed["f1"] is None
+
+
+def test_write_single_pass_results(truvari_dir, tmp_path):
+    """
+    Test that a single truvari run is summarized per stratification and for the whole background
+    """
+    output_csv = tmp_path / "results.extended.csv"
+    output_json = tmp_path / "summary.json"
+    ts.write_single_pass_results(
+        truvari_dir,
+        ["strat", "empty"],
+        [tmp_path / "strat.bed", tmp_path / "empty.bed"],
+        output_csv,
+        output_json,
+    )
+    summaries = json.loads(output_json.read_text())
+    assert summaries["all_background"]["TP-base"] == 2
+    assert summaries["all_background"]["FP"] == 2
+    assert summaries["strat"]["TP-base"] == 1
+    assert summaries["strat"]["FP"] == 1
+    assert summaries["strat"]["precision"] == pytest.approx(0.5)
+    observed = pd.read_csv(output_csv)
+    assert observed["Subset"].to_list() == ["*", "strat", "empty"]
+    assert observed["METRIC.Recall"].to_list()[:2] == [1.0, 1.0]
+    assert pd.isna(observed.loc[2, "METRIC.Precision"])
@@ -0,0 +1,119 @@
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+
+from lib.interval_index import IntervalIndex
+
+## truvari bench output vcfs, by the summary count each contributes to
+TRUVARI_OUTPUTS = {"TP-base": "tp-base", "TP-comp": "tp-comp", "FP": "fp", "FN": "fn"}
+
+
+def read_vcf_spans(filename: str) -> pd.DataFrame:
+    """
+    Read the half-open reference span (contig, start, end) of every record in a vcf,
+    using INFO/END where present and otherwise the length of REF
+    """
+    opener = gzip.open if str(filename).endswith(".gz") else open
+    contigs, starts, ends = [], [], []
+    with opener(filename, "rt") as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            line_data = line.split("\t", 8)
+            start = int(line_data[1]) - 1
+            end = start + len(line_data[3])
+            for entry in line_data[7].split(";"):
+                if entry.startswith("END="):
+                    end = int(entry[4:])
+                    break
+            contigs.append(line_data[0])
+            starts.append(start)
+            ends.append(end)
+    return pd.DataFrame(
+        {
+            "contig": np.array(contigs, dtype=object),
+            "start": np.array(starts, dtype=np.int64),
+            "end": np.array(ends, dtype=np.int64),
+        }
+    )
+
+
+def _ratio(numerator: int, denominator: int):
+    """
+    Compute a ratio, or None when undefined, as truvari reports it
+    """
+    return numerator / denominator if denominator > 0 else None
+
+
+def summarize_counts(counts: dict) -> dict:
+    """
+    Compute the headline fields of truvari's summary.json from TP/FP/FN counts
+    """
+    precision = _ratio(counts["TP-comp"], counts["TP-comp"] + counts["FP"])
+    recall = _ratio(counts["TP-base"], counts["TP-base"] + counts["FN"])
+    f1 = None
+    if precision is not None and recall is not None and precision + recall > 0:
+        f1 = 2 * precision * recall / (precision + recall)
+    return {
+        "TP-base": counts["TP-base"],
+        "TP-comp": counts["TP-comp"],
+        "FP": counts["FP"],
+        "FN": counts["FN"],
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "base cnt": counts["TP-base"] + counts["FN"],
+        "comp cnt": counts["TP-comp"] + counts["FP"],
+    }
+
+
+def stratify_truvari_results(truvari_dir: str, stratifications: list) -> dict:
+    """
+    Assign the records of a single genome-wide truvari bench run to stratifications
+    and summarize each, returning {stratification name: summary}.
+
+    Each output vcf is read once, and a record is assigned to every stratification
+    whose bedfile contains its full span in a single interval, as with the
+    `bedtools intersect -f 1` filtering used for per-stratification truvari runs.
+    Matching itself is not repeated, so a call matched across a stratification
+    boundary keeps its match rather than becoming a FP/FN pair. The whole background
+    is reported under "all_background", and includes every record.
+    """
+    spans = {
+        key: read_vcf_spans("{}/{}.vcf.gz".format(truvari_dir, value))
+        for key, value in TRUVARI_OUTPUTS.items()
+    }
+    res = {"all_background": summarize_counts({key: len(df) for key, df in spans.items()})}
+    for name, bed in stratifications:
+        index = IntervalIndex.from_bed(bed)
+        res[name] = summarize_counts(
+            {
+                key: int(index.contains(df["contig"], df["start"], df["end"]).sum())
+                for key, df in spans.items()
+            }
+        )
+    return res
+
+
+def write_single_pass_results(
+    truvari_dir: str, names: list, beds: list, output_csv: str, output_json: str
+) -> None:
+    """
+    Write per-stratification summaries from a single genome-wide truvari run as json,
+    and as the hap.py-style extended csv otherwise built from per-stratification runs
+    """
+    summaries = stratify_truvari_results(truvari_dir, list(zip(names, beds)))
+    with open(output_json, "w") as f:
+        json.dump(summaries, f, indent=2)
+    pd.DataFrame(
+        {
+            "Type": "SV",
+            "Subset": ["*" if x == "all_background" else x for x in summaries],
+            "Filter": "PASS",
+            "METRIC.Recall": [x["recall"] for x in summaries.values()],
+            "METRIC.Precision": [x["precision"] for x in summaries.values()],
+            "METRIC.F1_Score": [x["f1"] for x in summaries.values()],
+        }
+    ).to_csv(output_csv, index=False, na_rep="NA")
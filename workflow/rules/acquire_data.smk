@@ -1,73 +1,181 @@
-rule download_reference_data:
+localrules:
+    link_input_dataset,
+    link_input_dataset_index,
+
+
+rule input_store_fetch:
     """
-    Using wildcards and configuration data, get reference vcf.
+    Get a single input vcf source into the content-addressed input store, once,
+    however many experimental or reference datasets name it.
 
     This is refactored to old garbage bash style, as the snakemake FTP remote
-    has serious timeout problems.
+    has serious timeout problems. Non-S3 remote sources are fetched with resume
+    and size verification by lib/download_manager.py, and local files are copied.
+    A sha256 checksum declared in the manifest is verified for every source.
     """
+    input:
+        lambda wildcards: tc.get_input_store(manifest_experiment, manifest_reference).local_inputs(
+            wildcards.source_id
+        ),
     output:
-        "results/references/{reference,[^/]+}.vcf.gz",
+        "results/input-store/sources/{source_id,[0-9a-f]+}.vcf.gz",
     params:
-        lambda wildcards: tc.map_reference_file(wildcards, manifest_reference),
+        source=lambda wildcards: tc.get_input_store(
+            manifest_experiment, manifest_reference
+        ).source(wildcards.source_id)[0],
+        sha256=lambda wildcards: tc.get_input_store(
+            manifest_experiment, manifest_reference
+        ).source(wildcards.source_id)[1],
     conda:
         "../envs/awscli.yaml"
     threads: config_resources["default"]["threads"]
     resources:
-        slurm_partition=rc.select_partition(
+        slurm_partition=rc.get_partition_selector(
             config_resources["default"]["partition"], config_resources["partitions"]
         ),
         mem_mb=config_resources["default"]["memory"],
     shell:
-        "if [[ {params} = s3://* ]] ; then "
-        "aws s3 cp {input} {output} ; "
-        "elif [[ {params} = ftp://* ]] || [[ {params} = https://* ]] || [[ {params} = http://* ]] ; then "
-        "wget -O {output} {params} ; "
-        "else cp {params} {output} ; fi"
+        "if [[ {params.source} = s3://* ]] ; then "
+        "aws s3 cp {params.source} {output} ; "
+        "elif [[ {params.source} = *://* ]] ; then "
+        "python -m lib.download_manager {params.source} {output} ; "
+        "else cp {params.source} {output} ; fi && "
+        'if [[ -n "{params.sha256}" ]] ; then echo "{params.sha256}  {output}" | sha256sum -c --quiet ; fi'
 
 
-rule merge_experimental_data:
+rule input_store_merge:
     """
     Update support for experimental vcf input
     to support multiple input vcfs from the same
-    sample.
+    sample, merging each distinct list of sources once.
+
+    Already sorted, disjoint inputs such as per-chromosome vcfs are
+    concatenated in order without a sort. Other inputs are merged
+    and sorted per contig in parallel.
     """
     input:
-        vcf=lambda wildcards: expand(
-            "results/experimentals/{{experimental}}/{index}.vcf.gz",
-            index=[
-                x for x in range(len(tc.map_experimental_file(wildcards, manifest_experiment)))
-            ],
-        ),
-        tbi=lambda wildcards: expand(
-            "results/experimentals/{{experimental}}/{index}.vcf.gz.tbi",
-            index=[
-                x for x in range(len(tc.map_experimental_file(wildcards, manifest_experiment)))
-            ],
-        ),
+        vcf=lambda wildcards: tc.get_input_store(
+            manifest_experiment, manifest_reference
+        ).merge_inputs(wildcards.merge_id),
+        index=lambda wildcards: tc.get_input_store(
+            manifest_experiment, manifest_reference
+        ).merge_indexes(wildcards.merge_id),
+        script="workflow/scripts/merge_vcfs.bash",
     output:
-        "results/experimentals/{experimental,[^/]+}.vcf.gz",
+        "results/input-store/merged/{merge_id,[0-9a-f]+}.vcf.gz",
+    params:
+        tmpdir="temp/input_store_merge/{merge_id}",
     conda:
         "../envs/bcftools.yaml"
     threads: config_resources["bcftools"]["threads"]
     resources:
-        slurm_partition=rc.select_partition(
+        slurm_partition=rc.get_partition_selector(
+            config_resources["bcftools"]["partition"], config_resources["partitions"]
+        ),
+        mem_mb=config_resources["bcftools"]["memory"],
+    shell:
+        "bash {input.script} {output} {threads} {params.tmpdir} {input.vcf}"
+
+
+rule input_store_index:
+    """
+    Index a vcf in the input store, once. An index declared for the source
+    in the manifest is fetched and kept if it matches the vcf; otherwise,
+    or if none is declared, the index is built with tabix.
+    """
+    input:
+        vcf="results/input-store/{store_type}/{store_id}.vcf.gz",
+        index=lambda wildcards: tc.get_input_store(
+            manifest_experiment, manifest_reference
+        ).index_inputs(wildcards.store_id, wildcards.index_format),
+        script="workflow/scripts/store_vcf_index.bash",
+    output:
+        "results/input-store/{store_type,sources|merged}/{store_id,[0-9a-f]+}.vcf.gz.{index_format,tbi|csi}",
+    params:
+        source=lambda wildcards: tc.get_input_store(
+            manifest_experiment, manifest_reference
+        ).index_source(wildcards.store_id, wildcards.index_format),
+    conda:
+        "../envs/vcf_index.yaml"
+    threads: config_resources["bcftools"]["threads"]
+    resources:
+        slurm_partition=rc.get_partition_selector(
             config_resources["bcftools"]["partition"], config_resources["partitions"]
         ),
         mem_mb=config_resources["bcftools"]["memory"],
     shell:
-        "bcftools concat --allow-overlaps -D -O u --threads {threads} {input.vcf} | "
-        "bcftools sort -O z -o {output}"
+        'bash {input.script} {input.vcf} {output} "{params.source}"'
 
 
-rule download_experimental_data:
+rule link_input_dataset:
     """
-    Get a copy of an experimental input file.
+    Link an experimental or reference dataset to its vcf in the input store,
+    falling back to a copy across filesystems
     """
     input:
-        lambda wildcards: tc.map_experimental_file(wildcards, manifest_experiment)[
-            int(wildcards.index)
-        ],
+        lambda wildcards: tc.get_input_store(manifest_experiment, manifest_reference).dataset_file(
+            wildcards.dataset_type, wildcards.dataset_name
+        ),
     output:
-        temp("results/experimentals/{experimental}/{index}.vcf.gz"),
+        "results/{dataset_type,experimentals|references}/{dataset_name,[^/]+}.vcf.gz",
     shell:
-        "cp {input} {output}"
+        "ln -f {input} {output} 2>/dev/null || cp {input} {output}"
+
+
+rule link_input_dataset_index:
+    """
+    Link the index of an experimental or reference dataset to the index of
+    its vcf in the input store, so each stored vcf is indexed once
+    """
+    input:
+        lambda wildcards: "{}.{}".format(
+            tc.get_input_store(manifest_experiment, manifest_reference).dataset_file(
+                wildcards.dataset_type, wildcards.dataset_name
+            ),
+            wildcards.index_format,
+        ),
+    output:
+        "results/{dataset_type,experimentals|references}/{dataset_name,[^/]+}.vcf.gz.{index_format,tbi|csi}",
+    shell:
+        "ln -f {input} {output} 2>/dev/null || cp {input} {output}"
+
+
+ruleorder: link_input_dataset_index > tabix_index
+
+
+rule filter_vcf_to_region:
+    """
+    Subset an experimental or reference vcf to a confident region, once per region.
+
+    Every hap.py, truvari and svdb job for the region reads this subset, rather than
+    each re-reading the whole-genome vcf only to discard calls outside the region.
+    The whole-genome vcf's index, declared in the manifest or built once in the
+    input store, is used to read only the records in the region.
+
+    Records are kept if any part of the variant overlaps the region, including calls
+    that start just outside it, so that hap.py, vcfeval and truvari still see them
+    when matching nearby calls and apply the exact region boundary themselves.
+    """
+    input:
+        vcf="results/{dataset_type}/{dataset_name}.vcf.gz",
+        index=lambda wildcards: tc.get_input_store(
+            manifest_experiment, manifest_reference
+        ).dataset_index(wildcards.dataset_type, wildcards.dataset_name),
+        bed="results/confident-regions/{region}.bed",
+    output:
+        vcf="results/{dataset_type,experimentals|references}/region-filtered/{region,[^/]+}/{dataset_name,[^/]+}.vcf.gz",
+        tbi="results/{dataset_type,experimentals|references}/region-filtered/{region,[^/]+}/{dataset_name,[^/]+}.vcf.gz.tbi",
+    conda:
+        "../envs/bcftools.yaml"
+    threads: config_resources["bcftools"]["threads"]
+    resources:
+        slurm_partition=rc.get_partition_selector(
+            config_resources["bcftools"]["partition"], config_resources["partitions"]
+        ),
+        mem_mb=config_resources["bcftools"]["memory"],
+    shell:
+        "bcftools view -R {input.bed} --regions-overlap variant --threads {threads} -O z -o {output.vcf} {input.vcf} && "
+        "tabix -p vcf {output.vcf}"
+
+
+ruleorder: filter_vcf_to_region > tabix_index
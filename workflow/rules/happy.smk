@@ -1,26 +1,71 @@
 localrules:
-    add_region_name,
     combine_results,
     happy_create_stratification_subset,
 
 
+def get_happy_input_files(wildcards):
+    """
+    Get the inputs whose size determines hap.py resource usage
+    """
+    return [
+        "results/experimentals/region-filtered/{}/{}.vcf.gz".format(
+            wildcards.region, wildcards.experimental
+        ),
+        "results/references/region-filtered/{}/{}.vcf.gz".format(
+            wildcards.region, wildcards.reference
+        ),
+        "results/confident-regions/{}.bed".format(wildcards.region),
+    ]
+
+
+def get_happy_stratification_files(wildcards):
+    """
+    Get the stratification bedfiles of a hap.py subset, whose size also determines
+    hap.py resource usage, so that subsets packed with large bedfiles are
+    predicted to need more memory than the others. Before the subset
+    checkpoint has run, the missing subset leaves the prediction to
+    the configured static resources.
+    """
+    subset = "results/stratification-sets/{}/subsets_for_happy/{}/stratification_subset.tsv".format(
+        reference_build, wildcards.stratification_set
+    )
+    if not os.path.isfile(subset):
+        return [subset]
+    return list(tc.read_with_cache(subset, tc.StratificationSubset).beds.values())
+
+
+happy_run_resources = rc.get_resource_predictor(
+    config_resources,
+    config_resources["happy"],
+    "results/performance_benchmarks/happy_run/{experimental}/{reference}/{region}/{stratification_set}/results.tsv",
+    lambda wildcards: get_happy_input_files(wildcards) + get_happy_stratification_files(wildcards),
+)
+happy_run_memory = rc.get_memory_escalation(
+    config_resources,
+    happy_run_resources.mem_mb,
+    "results/oom-markers/happy_run/{experimental}/{reference}/{region}/{stratification_set}.txt",
+)
+
+
 checkpoint happy_create_stratification_subset:
     """
     Create a file containing a subset of the input stratification files,
     to address the fact that hap.py is a giant resource hog.
+
+    Subsets are packed at runtime, after the stratification bedfiles are present,
+    so that cost-balanced packing can read the bedfiles.
     """
     input:
         "results/stratification-sets/{genome_build}.stratification_regions.tsv",
-        lambda wildcards: tc.get_required_stratifications(wildcards, config, checkpoints),
+        "results/stratification-sets/{genome_build}/stratification_files.downloaded",
+        ctf.get_tracking_file(config, "results", "happy"),
     output:
         "results/stratification-sets/{genome_build}/subsets_for_happy/{stratification_set}/stratification_subset.tsv",
-    params:
-        contents=lambda wildcards: tc.get_happy_stratification_by_index(
-            wildcards, config, checkpoints
-        ),
     threads: config_resources["default"]["threads"]
-    shell:
-        "echo -e \"{params.contents}\" | sed 's/\\r//g' > {output}"
+    run:
+        tc.write_happy_stratification_subset(
+            input[0], output[0], config, wildcards.stratification_set
+        )
 
 
 rule happy_run:
@@ -33,19 +78,20 @@ rule happy_run:
     Eventually, most of these output files will be temp() or merged into single outputs.
     """
     input:
-        experimental="results/experimentals/{experimental}.vcf.gz",
-        reference="results/references/{reference}.vcf.gz",
+        experimental="results/experimentals/region-filtered/{region}/{experimental}.vcf.gz",
+        reference="results/references/region-filtered/{region}/{reference}.vcf.gz",
         fa="results/{}/ref.fasta".format(reference_build),
         fai="results/{}/ref.fasta.fai".format(reference_build),
         sdf="results/{}/ref.fasta.sdf".format(reference_build),
         stratification="results/stratification-sets/{}/subsets_for_happy/{{stratification_set}}/stratification_subset.tsv".format(
             reference_build
         ),
-        stratification_files=lambda wildcards: tc.get_required_stratifications(
-            wildcards, config, checkpoints
+        stratification_files="results/stratification-sets/{}/stratification_files.downloaded".format(
+            reference_build
         ),
         bed="results/confident-regions/{region}.bed",
         rtg_wrapper="workflow/scripts/rtg.bash",
+        oom_guard="workflow/scripts/oom_guard.bash",
     output:
         expand(
             "results/happy/{{experimental}}/{{reference}}/{{region,[^/]+}}/{{stratification_set,[^/]+}}/results.{suffix}",
@@ -66,16 +112,19 @@ rule happy_run:
     params:
         outprefix="results/happy/{experimental}/{reference}/{region}/{stratification_set}/results",
         tmpdir="temp/happy/{experimental}/{reference}/{region}/{stratification_set}",
+        oom_marker=lambda wildcards: happy_run_memory.marker(wildcards),
+        rtg_mem=lambda wildcards, resources: rc.jvm_heap(config_resources, resources.mem_mb),
     benchmark:
         "results/performance_benchmarks/happy_run/{experimental}/{reference}/{region}/{stratification_set}/results.tsv"
     conda:
         "../envs/happy.yaml"
     threads: config_resources["happy"]["threads"]
     resources:
-        slurm_partition=rc.select_partition(
+        slurm_partition=rc.get_partition_selector(
             config_resources["happy"]["partition"], config_resources["partitions"]
         ),
-        mem_mb=config_resources["happy"]["memory"],
+        mem_mb=happy_run_memory.mem_mb,
+        runtime=happy_run_resources.runtime,
         tmpdir=lambda wildcards: "temp/happy/{}/{}/{}/{}".format(
             wildcards.experimental,
             wildcards.reference,
@@ -84,36 +133,21 @@ rule happy_run:
         ),
     shell:
         "mkdir -p {params.tmpdir} && "
-        "RTG_MEM=12G HGREF={input.fa} hap.py {input.reference} {input.experimental} -f {input.bed} -o {params.outprefix} "
+        "RTG_MEM={params.rtg_mem} HGREF={input.fa} {input.oom_guard} {params.oom_marker} "
+        "hap.py {input.reference} {input.experimental} -f {input.bed} -o {params.outprefix} "
         "--stratification {input.stratification} "
         "-V --engine=vcfeval --engine-vcfeval-path={input.rtg_wrapper} --engine-vcfeval-template={input.sdf} "
         "--threads {threads} --scratch-prefix {params.tmpdir}"
 
 
-rule add_region_name:
-    """
-    To prepare for merging files from separate regions, prefix the lines
-    with the name of the region.
-    """
-    input:
-        "results/{comparison_type}/{experimental}/{reference}/{region}/{stratification_set}/results.extended.csv",
-    output:
-        temp(
-            "results/{comparison_type,[^/]+}/{experimental}/{reference}/{region,[^/]+}/{stratification_set,[^/]+}/results.extended.annotated.csv"
-        ),
-    shell:
-        "cat {input} | "
-        "awk -v ex={wildcards.experimental} -v ref={wildcards.reference} -v reg={wildcards.region} "
-        '\'NR == 1 {{print "Experimental,Reference,Region,"$0}} ; NR > 1 {{print ex","ref","reg","$0}}\' > {output}'
-
-
 rule combine_results:
     """
-    Combine annotated summary results from Illumina's hap.py utility run against different sets of stratification regions.
+    Combine summary results from Illumina's hap.py utility run against different sets of stratification regions,
+    prefixing each row with the experimental, reference, and region names in a single streaming pass.
     """
     input:
         lambda wildcards: expand(
-            "results/{{comparison_type}}/{{experimental}}/{{reference}}/{{region}}/{stratification_set}/results.extended.annotated.csv",
+            "results/{{comparison_type}}/{{experimental}}/{{reference}}/{{region}}/{stratification_set}/results.extended.csv",
             stratification_set=tc.get_happy_stratification_set_indices(
                 wildcards, config, checkpoints
             ),
@@ -122,5 +156,274 @@ rule combine_results:
         "results/{comparison_type,[^/]+}/{experimental,[^/]+}/{reference,[^/]+}/{region,[^/]+}/results.extended.csv",
     benchmark:
         "results/performance_benchmarks/{comparison_type}_combine_results/{experimental}/{reference}/{region}/results.tsv"
-    shell:
-        "cat {input} | awk 'NR == 1 || ! /^Experimental,Reference,Region,/' > {output}"
+    run:
+        ra.combine_extended_results(
+            input,
+            output[0],
+            wildcards.experimental,
+            wildcards.reference,
+            wildcards.region,
+        )
+
+
+if config["happy-sharding"]["mode"] != "none":
+    happy_shard_resources = config_resources.get("happy-shard", config_resources["happy"])
+    happy_run_shard_resources = rc.get_resource_predictor(
+        config_resources,
+        happy_shard_resources,
+        "results/performance_benchmarks/happy_run_shard/{experimental}/{reference}/{region}/{stratification_set}/{shard}/results.tsv",
+        lambda wildcards: get_happy_input_files(wildcards)[:2]
+        + [
+            "results/confident-regions-sharded/{}/shard-{}.bed".format(
+                wildcards.region, wildcards.shard
+            )
+        ]
+        + get_happy_stratification_files(wildcards),
+    )
+    happy_run_shard_memory = rc.get_memory_escalation(
+        config_resources,
+        happy_run_shard_resources.mem_mb,
+        "results/oom-markers/happy_run_shard/{experimental}/{reference}/{region}/{stratification_set}/{shard}.txt",
+    )
+
+    localrules:
+        happy_shard_confident_regions,
+        happy_gather_shards,
+
+    ruleorder: happy_gather_shards > happy_run
+
+    rule happy_shard_confident_regions:
+        """
+        Split a confident region bedfile into shards, either by whole contig
+        or by genomic chunks of approximately equal size, for independent hap.py runs
+        """
+        input:
+            "results/confident-regions/{region}.bed",
+        output:
+            expand(
+                "results/confident-regions-sharded/{{region,[^/]+}}/shard-{shard}.bed",
+                shard=range(config["happy-sharding"]["shards"]),
+            ),
+        params:
+            mode=config["happy-sharding"]["mode"],
+        run:
+            hs.write_region_shards(input[0], output, params.mode)
+
+    rule happy_run_shard:
+        """
+        Run hap.py restricted to a single shard of the confident regions.
+
+        Shards with no confident regions produce an empty extended csv
+        without invoking hap.py.
+        """
+        input:
+            experimental="results/experimentals/region-filtered/{region}/{experimental}.vcf.gz",
+            reference="results/references/region-filtered/{region}/{reference}.vcf.gz",
+            fa="results/{}/ref.fasta".format(reference_build),
+            fai="results/{}/ref.fasta.fai".format(reference_build),
+            sdf="results/{}/ref.fasta.sdf".format(reference_build),
+            stratification="results/stratification-sets/{}/subsets_for_happy/{{stratification_set}}/stratification_subset.tsv".format(
+                reference_build
+            ),
+            stratification_files="results/stratification-sets/{}/stratification_files.downloaded".format(
+                reference_build
+            ),
+            bed="results/confident-regions-sharded/{region}/shard-{shard}.bed",
+            rtg_wrapper="workflow/scripts/rtg.bash",
+            oom_guard="workflow/scripts/oom_guard.bash",
+        output:
+            "results/happy-shards/{experimental}/{reference}/{region,[^/]+}/{stratification_set,[^/]+}/{shard,[0-9]+}/results.extended.csv",
+        params:
+            outprefix="results/happy-shards/{experimental}/{reference}/{region}/{stratification_set}/{shard}/results",
+            tmpdir="temp/happy-shards/{experimental}/{reference}/{region}/{stratification_set}/{shard}",
+            oom_marker=lambda wildcards: happy_run_shard_memory.marker(wildcards),
+            rtg_mem=lambda wildcards, resources: rc.jvm_heap(config_resources, resources.mem_mb),
+        benchmark:
+            "results/performance_benchmarks/happy_run_shard/{experimental}/{reference}/{region}/{stratification_set}/{shard}/results.tsv"
+        conda:
+            "../envs/happy.yaml"
+        threads: happy_shard_resources["threads"]
+        resources:
+            slurm_partition=rc.get_partition_selector(
+                happy_shard_resources["partition"], config_resources["partitions"]
+            ),
+            mem_mb=happy_run_shard_memory.mem_mb,
+            runtime=happy_run_shard_resources.runtime,
+            tmpdir=lambda wildcards: "temp/happy-shards/{}/{}/{}/{}/{}".format(
+                wildcards.experimental,
+                wildcards.reference,
+                wildcards.region,
+                wildcards.stratification_set,
+                wildcards.shard,
+            ),
+        shell:
+            "if [[ ! -s {input.bed} ]] ; then touch {output} ; exit 0 ; fi && "
+            "mkdir -p {params.tmpdir} && "
+            "RTG_MEM={params.rtg_mem} HGREF={input.fa} {input.oom_guard} {params.oom_marker} "
+            "hap.py {input.reference} {input.experimental} "
+            "-f {input.bed} -T {input.bed} -o {params.outprefix} "
+            "--stratification {input.stratification} "
+            "-V --engine=vcfeval --engine-vcfeval-path={input.rtg_wrapper} --engine-vcfeval-template={input.sdf} "
+            "--threads {threads} --scratch-prefix {params.tmpdir}"
+
+    rule happy_gather_shards:
+        """
+        Rebuild a hap.py extended csv from per-shard results, summing raw
+        TRUTH/QUERY counts and recomputing metrics from the sums
+        """
+        input:
+            expand(
+                "results/happy-shards/{{experimental}}/{{reference}}/{{region}}/{{stratification_set}}/{shard}/results.extended.csv",
+                shard=range(config["happy-sharding"]["shards"]),
+            ),
+        output:
+            "results/happy/{experimental}/{reference}/{region,[^/]+}/{stratification_set,[^/]+}/results.extended.csv",
+        benchmark:
+            "results/performance_benchmarks/happy_gather_shards/{experimental}/{reference}/{region}/{stratification_set}/results.tsv"
+        run:
+            hs.gather_extended_csvs(input, output[0])
+
+
+if config["happy-stratification-mode"] == "post-hoc":
+    if config["happy-sharding"]["mode"] != "none":
+        raise ValueError(
+            'happy-stratification-mode "post-hoc" cannot be combined with happy-sharding'
+        )
+
+    happy_run_unstratified_resources = rc.get_resource_predictor(
+        config_resources,
+        config_resources["happy"],
+        "results/performance_benchmarks/happy_run_unstratified/{experimental}/{reference}/{region}/results.tsv",
+        get_happy_input_files,
+    )
+    happy_run_unstratified_memory = rc.get_memory_escalation(
+        config_resources,
+        happy_run_unstratified_resources.mem_mb,
+        "results/oom-markers/happy_run_unstratified/{experimental}/{reference}/{region}.txt",
+    )
+
+    localrules:
+        happy_stratify_post_hoc,
+
+    ruleorder: happy_stratify_post_hoc > happy_run
+    ruleorder: happy_run_unstratified > combine_results
+
+    rule happy_run_unstratified:
+        """
+        Run hap.py once over the whole confident region, without stratifications,
+        keeping its annotated vcf for stratification afterwards
+        """
+        input:
+            experimental="results/experimentals/region-filtered/{region}/{experimental}.vcf.gz",
+            reference="results/references/region-filtered/{region}/{reference}.vcf.gz",
+            fa="results/{}/ref.fasta".format(reference_build),
+            fai="results/{}/ref.fasta.fai".format(reference_build),
+            sdf="results/{}/ref.fasta.sdf".format(reference_build),
+            bed="results/confident-regions/{region}.bed",
+            rtg_wrapper="workflow/scripts/rtg.bash",
+            oom_guard="workflow/scripts/oom_guard.bash",
+        output:
+            expand(
+                "results/happy-unstratified/{{experimental}}/{{reference}}/{{region,[^/]+}}/results.{suffix}",
+                suffix=[
+                    "extended.csv",
+                    "metrics.json.gz",
+                    "roc.all.csv.gz",
+                    "roc.Locations.INDEL.csv.gz",
+                    "roc.Locations.INDEL.PASS.csv.gz",
+                    "roc.Locations.SNP.csv.gz",
+                    "roc.Locations.SNP.PASS.csv.gz",
+                    "runinfo.json",
+                    "summary.csv",
+                    "vcf.gz",
+                    "vcf.gz.tbi",
+                ],
+            ),
+        params:
+            outprefix="results/happy-unstratified/{experimental}/{reference}/{region}/results",
+            tmpdir="temp/happy-unstratified/{experimental}/{reference}/{region}",
+            oom_marker=lambda wildcards: happy_run_unstratified_memory.marker(wildcards),
+            rtg_mem=lambda wildcards, resources: rc.jvm_heap(config_resources, resources.mem_mb),
+        benchmark:
+            "results/performance_benchmarks/happy_run_unstratified/{experimental}/{reference}/{region}/results.tsv"
+        conda:
+            "../envs/happy.yaml"
+        threads: config_resources["happy"]["threads"]
+        resources:
+            slurm_partition=rc.get_partition_selector(
+                config_resources["happy"]["partition"], config_resources["partitions"]
+            ),
+            mem_mb=happy_run_unstratified_memory.mem_mb,
+            runtime=happy_run_unstratified_resources.runtime,
+            tmpdir=lambda wildcards: "temp/happy-unstratified/{}/{}/{}".format(
+                wildcards.experimental,
+                wildcards.reference,
+                wildcards.region,
+            ),
+        shell:
+            "mkdir -p {params.tmpdir} && "
+            "RTG_MEM={params.rtg_mem} HGREF={input.fa} {input.oom_guard} {params.oom_marker} "
+            "hap.py {input.reference} {input.experimental} -f {input.bed} -o {params.outprefix} "
+            "-V --engine=vcfeval --engine-vcfeval-path={input.rtg_wrapper} --engine-vcfeval-template={input.sdf} "
+            "--threads {threads} --scratch-prefix {params.tmpdir}"
+
+    rule happy_stratify_post_hoc_all:
+        """
+        Compute stratified hap.py rows for every stratification subset of a comparison
+        in a single pass over the annotated vcf of its unstratified hap.py run,
+        assigning each record to the stratifications it overlaps
+        """
+        input:
+            vcf="results/happy-unstratified/{experimental}/{reference}/{region}/results.vcf.gz",
+            stratification=lambda wildcards: expand(
+                "results/stratification-sets/{genome_build}/subsets_for_happy/{stratification_set}/stratification_subset.tsv",
+                genome_build=reference_build,
+                stratification_set=tc.get_happy_stratification_set_indices(
+                    wildcards, config, checkpoints
+                ),
+            ),
+            stratification_files="results/stratification-sets/{}/stratification_files.downloaded".format(
+                reference_build
+            ),
+        output:
+            "results/happy-unstratified/{experimental}/{reference}/{region,[^/]+}/results.stratified.csv",
+        benchmark:
+            "results/performance_benchmarks/happy_stratify_post_hoc_all/{experimental}/{reference}/{region}/results.tsv"
+        threads: config_resources["default"]["threads"]
+        resources:
+            slurm_partition=rc.get_partition_selector(
+                config_resources["default"]["partition"], config_resources["partitions"]
+            ),
+            mem_mb=config_resources["default"]["memory"],
+        run:
+            subsets = [
+                tc.read_with_cache(x, tc.StratificationSubset) for x in input.stratification
+            ]
+            hstrat.write_post_hoc_stratified_csv(
+                input.vcf,
+                [x for subset in subsets for x in subset.names],
+                [subset.beds[x] for subset in subsets for x in subset.names],
+                output[0],
+            )
+
+    rule happy_stratify_post_hoc:
+        """
+        Build a hap.py extended csv for a stratification subset from the unstratified
+        hap.py run of its comparison, selecting the subset's rows from the
+        stratified rows computed once for all subsets
+        """
+        input:
+            stratified="results/happy-unstratified/{experimental}/{reference}/{region}/results.stratified.csv",
+            csv="results/happy-unstratified/{experimental}/{reference}/{region}/results.extended.csv",
+            stratification="results/stratification-sets/{}/subsets_for_happy/{{stratification_set}}/stratification_subset.tsv".format(
+                reference_build
+            ),
+        output:
+            "results/happy/{experimental}/{reference}/{region,[^/]+}/{stratification_set,[^/]+}/results.extended.csv",
+        run:
+            hstrat.write_post_hoc_extended_csv(
+                input.csv,
+                input.stratified,
+                tc.read_with_cache(input.stratification, tc.StratificationSubset).names,
+                output[0],
+            )
@@ -16,30 +16,43 @@ checkpoint get_stratification_linker:
         ]["all-stratifications"],
     benchmark:
         "results/performance_benchmarks/get_stratification_linker/{genome_build}/results.tsv"
+    conda:
+        "../envs/awscli.yaml"
     priority: 1
     threads: config_resources["default"]["threads"]
     resources:
-        slurm_partition=rc.select_partition(
+        slurm_partition=rc.get_partition_selector(
             config_resources["default"]["partition"], config_resources["partitions"]
         ),
         mem_mb=config_resources["default"]["memory"],
     shell:
         "mkdir -p {params.outdir} && "
-        "wget -O {output.tsv} {params.ftpsite}/{params.ftpdir}/{params.linker_fn}"
+        "python -m lib.download_manager https://{params.ftpsite}/{params.ftpdir}/{params.linker_fn} {output.tsv}"
 
 
-rule get_stratification_file:
+rule download_stratification_files:
+    """
+    Fetch the bedfiles of all configured stratification sets in a single job,
+    over pooled connections with a bounded number of concurrent transfers.
+    Bedfiles already present from previous runs are not fetched again.
+    """
     input:
-        lambda wildcards: HTTP.remote(
-            "{}/{}/{{subdir}}/{{prefix}}.bed{{suffix}}".format(
-                config["genomes"][wildcards.genome_build]["stratification-regions"]["ftp"],
-                config["genomes"][wildcards.genome_build]["stratification-regions"]["dir"],
-            )
-        ),
+        linker="results/stratification-sets/{genome_build}.stratification_regions.tsv",
     output:
-        "results/stratification-sets/{genome_build}/{subdir}/{prefix}.bed{suffix}",
-    shell:
-        "cp {input} {output}"
+        "results/stratification-sets/{genome_build}/stratification_files.downloaded",
+    benchmark:
+        "results/performance_benchmarks/download_stratification_files/{genome_build}/results.tsv"
+    threads: download_resources["threads"]
+    resources:
+        slurm_partition=rc.get_partition_selector(
+            download_resources["partition"], config_resources["partitions"]
+        ),
+        mem_mb=download_resources["memory"],
+    run:
+        dm.DownloadManager(max_workers=threads).download_all(
+            tc.get_stratification_downloads(input.linker, config, wildcards.genome_build)
+        )
+        pathlib.Path(output[0]).touch()
 
 
 rule acquire_confident_regions:
@@ -47,27 +60,69 @@ rule acquire_confident_regions:
     Get a confident region bedfile from somewhere
     """
     output:
-        final="results/confident-regions/{region}.bed",
-        tmp=temp("results/confident-regions/.{region}.bed.tmp"),
+        final="results/confident-regions/{region,[^/]+}.bed",
+        tmp=temp("results/confident-regions/.{region,[^/]+}.bed.tmp"),
     params:
         source=lambda wildcards: config["genomes"][reference_build]["confident-regions"][
             wildcards.region
         ]["bed"],
+    conda:
+        "../envs/awscli.yaml"
     threads: config_resources["default"]["threads"]
     resources:
-        slurm_partition=rc.select_partition(
+        slurm_partition=rc.get_partition_selector(
             config_resources["default"]["partition"], config_resources["partitions"]
         ),
         mem_mb=config_resources["default"]["memory"],
     shell:
         "if [[ {params.source} = s3://* ]] ; then "
-        "aws s3 cp {input} {output.tmp} ; "
-        "elif [[ {params.source} = ftp://* ]] || [[ {params.source} = https://* ]] || [[ {params.source} = http://* ]] ; then "
-        "wget -O {output.tmp} {params.source} ; "
-        "else cp {params.source} {output.tmp} ; fi && "
+        "aws s3 cp {params.source} {output.tmp} ; "
+        "else python -m lib.download_manager {params.source} {output.tmp} ; fi && "
         'if [[ "{params.source}" = *".gz" ]] ; then gunzip -c {output.tmp} > {output.final} ; else cp {output.tmp} {output.final} ; fi'
 
 
+rule intersect_stratification_with_region:
+    """
+    Intersect a stratification bedfile with a confident region background once,
+    for use by every dataset filtered to that region and stratification.
+
+    The sorted and merged intersection is stored under a name derived from the
+    checksums of both inputs, so identical inputs (e.g. the background entry that
+    appears in every stratification subset) are only ever intersected once.
+    """
+    input:
+        stratification_bed=lambda wildcards: tc.get_bedfile_dependency(
+            wildcards, checkpoints, reference_build
+        ),
+        region_bed="results/confident-regions/{region}.bed",
+    output:
+        "results/stratification-intersections/{region,[^/]+}/{subset_group,[^/]+}/{subset_name,[^/]+}.bed",
+    params:
+        stratification_bed=lambda wildcards: tc.get_bedfile_from_name(
+            wildcards, checkpoints, reference_build
+        ),
+        cache_dir="results/stratification-intersections/content-addressed",
+    benchmark:
+        "results/performance_benchmarks/intersect_stratification_with_region/{region}/{subset_group}/{subset_name}.tsv"
+    conda:
+        "../envs/svdb.yaml"
+    threads: config_resources["default"]["threads"]
+    resources:
+        slurm_partition=rc.get_partition_selector(
+            config_resources["default"]["partition"], config_resources["partitions"]
+        ),
+        mem_mb=config_resources["default"]["memory"],
+    shell:
+        "mkdir -p {params.cache_dir} && "
+        "key=$(sha256sum {params.stratification_bed} {input.region_bed} | cut -d ' ' -f 1 | sha256sum | cut -d ' ' -f 1) && "
+        "if [[ ! -s {params.cache_dir}/$key.bed ]] ; then "
+        "tmpbed=$(mktemp {params.cache_dir}/.$key.XXXXXX) && "
+        "{{ bedtools intersect -a {params.stratification_bed} -b {input.region_bed} | "
+        "sort -k1,1 -k2,2n | bedtools merge -i stdin > $tmpbed && "
+        "mv $tmpbed {params.cache_dir}/$key.bed || {{ rm -f $tmpbed ; false ; }} ; }} ; fi && "
+        "{{ ln -f {params.cache_dir}/$key.bed {output} 2>/dev/null || cp {params.cache_dir}/$key.bed {output} ; }}"
+
+
 use rule acquire_confident_regions as acquire_fasta with:
     output:
         final="results/{genome}/ref.fasta",
@@ -90,7 +145,7 @@ rule create_fai:
         "../envs/samtools.yaml"
     threads: config_resources["default"]["threads"]
     resources:
-        slurm_partition=rc.select_partition(
+        slurm_partition=rc.get_partition_selector(
             config_resources["default"]["partition"], config_resources["partitions"]
         ),
         mem_mb=config_resources["default"]["memory"],
@@ -98,22 +153,35 @@ rule create_fai:
         "samtools faidx {input}"
 
 
+create_sdf_memory = rc.get_memory_escalation(
+    config_resources,
+    config_resources["rtg-vcfeval"]["memory"],
+    "results/oom-markers/create_sdf/{genome}.txt",
+)
+
+
 rule create_sdf:
     """
     Convert a fasta to an sdf format *folder* for rtg tools' particularities
     """
     input:
-        "results/{genome}/ref.fasta",
+        fasta="results/{genome}/ref.fasta",
+        oom_guard="workflow/scripts/oom_guard.bash",
     output:
         directory("results/{genome}/ref.fasta.sdf"),
+    params:
+        oom_marker=lambda wildcards: create_sdf_memory.marker(wildcards),
+        rtg_mem=lambda wildcards, resources: rc.jvm_heap(config_resources, resources.mem_mb),
     benchmark:
         "results/performance_benchmarks/create_sdf/{genome}.tsv"
     conda:
         "../envs/vcfeval.yaml"
     threads: config_resources["rtg-vcfeval"]["threads"]
     resources:
-        slurm_partition=rc.select_partition(
+        slurm_partition=rc.get_partition_selector(
             config_resources["rtg-vcfeval"]["partition"], config_resources["partitions"]
         ),
+        mem_mb=create_sdf_memory.mem_mb,
     shell:
-        "rtg RTG_MEM=12G format -f fasta -o {output} {input}"
+        "{input.oom_guard} {params.oom_marker} "
+        "rtg RTG_MEM={params.rtg_mem} format -f fasta -o {output} {input.fasta}"
@@ -1,12 +1,44 @@
-rule control_validation_report:
+localrules:
+    performance_dashboard,
+
+
+rule consolidate_report_results:
     """
-    Create an Rmd report about the comparison results
-    from either hap.py or vcfeval
+    Compact the comparison results feeding a report into a single columnar file,
+    keeping only PASS rows, deduplicated, and the metrics used by the report.
+
+    Each input is parsed once per distinct content; parsed inputs are cached
+    under cache_dir by content hash and shared between reports.
     """
     input:
         csv=lambda wildcards: tc.get_benchmarking_output_files(
             wildcards, config, manifest_comparisons
         ),
+    output:
+        parquet="results/reports/consolidated/report_{comparison}_vs_region-{region}.parquet",
+    params:
+        cache_dir="results/reports/consolidated/input-cache",
+    benchmark:
+        "results/performance_benchmarks/consolidate_report_results/report_{comparison}_vs_region-{region}.tsv"
+    conda:
+        "../envs/python.yaml"
+    threads: config_resources["default"]["threads"]
+    resources:
+        slurm_partition=rc.get_partition_selector(
+            config_resources["default"]["partition"], config_resources["partitions"]
+        ),
+        mem_mb=config_resources["default"]["memory"],
+    script:
+        "../scripts/consolidate_results.py"
+
+
+rule control_validation_report:
+    """
+    Create an Rmd report about the comparison results
+    from either hap.py or vcfeval
+    """
+    input:
+        parquet="results/reports/consolidated/report_{comparison}_vs_region-{region}.parquet",
         r_resources="workflow/scripts/control_validation.R",
     output:
         "results/reports/report_{comparison}_vs_region-{region}.html",
@@ -28,9 +60,31 @@ rule control_validation_report:
         "../envs/r.yaml"
     threads: config_resources["r"]["threads"]
     resources:
-        slurm_partition=rc.select_partition(
+        slurm_partition=rc.get_partition_selector(
             config_resources["r"]["partition"], config_resources["partitions"]
         ),
         mem_mb=config_resources["r"]["memory"],
     script:
         "../scripts/control_validation.Rmd"
+
+
+rule performance_dashboard:
+    """
+    Collect benchmark tsvs from every rule into a single table, and summarize
+    per-rule time, memory efficiency against requested mem_mb, and the critical
+    path through completed jobs as recorded in snakemake's metadata.
+
+    This has no inputs, so that requesting it never reruns benchmarked jobs;
+    rebuild it after further runs with `--forcerun performance_dashboard`.
+    """
+    output:
+        html="results/reports/performance_dashboard.html",
+        tsv="results/reports/performance_benchmarks.tsv",
+    threads: config_resources["default"]["threads"]
+    run:
+        pdash.write_performance_dashboard(
+            {x.name: str(x.benchmark) for x in workflow.rules if x.benchmark is not None},
+            {x.name: x.resources.get("mem_mb") for x in workflow.rules},
+            output.html,
+            output.tsv,
+        )
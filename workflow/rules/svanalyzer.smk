@@ -28,6 +28,7 @@ rule svanalyzer_run:
         ),
         fasta="results/{}/ref.fasta".format(reference_build),
         fai="results/{}/ref.fasta.fai".format(reference_build),
+        tracker=ctf.get_tracking_file(config, "results", "svanalyzer"),
     output:
         temp(
             "results/svanalyzer/{experimental}/{reference}/{region}/{setgroup}/{setname}.distances"
@@ -42,16 +43,16 @@ rule svanalyzer_run:
         temp("results/svanalyzer/{experimental}/{reference}/{region}/{setgroup}/{setname}.report"),
     params:
         outdir="results/svanalyzer/{experimental}/{reference}/{region}/{setgroup}/{setname}",
-        maxdist="100000",
-        normshift="0.2",
-        normsizediff="0.2",
-        normdist="0.2",
-        minsize="0",
+        maxdist=config["sv-settings"]["svanalyzer"]["maxdist"],
+        normshift=config["sv-settings"]["svanalyzer"]["normshift"],
+        normsizediff=config["sv-settings"]["svanalyzer"]["normsizediff"],
+        normdist=config["sv-settings"]["svanalyzer"]["normdist"],
+        minsize=config["sv-settings"]["svanalyzer"]["minsize"],
     conda:
         "../envs/svanalyzer.yaml"
     threads: config_resources["svanalyzer"]["threads"]
     resources:
-        slurm_partition=rc.select_partition(
+        slurm_partition=rc.get_partition_selector(
             config_resources["svanalyzer"]["partition"], config_resources["partitions"]
         ),
     shell:
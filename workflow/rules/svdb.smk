@@ -3,16 +3,9 @@ rule sv_svdb_within_dataset:
     Run svdb merging markers in a single dataset
     """
     input:
-        vcf="results/{dataset_type}/{dataset_name}.vcf.gz",
-        stratification_bed=lambda wildcards: tc.get_bedfile_from_name(
-            wildcards,
-            checkpoints,
-            "results/stratification-sets/{}/subsets_for_happy/{{subset_group}}".format(
-                reference_build
-            ),
-            reference_build,
-        ),
-        region_bed="results/confident-regions/{region}.bed",
+        vcf="results/{dataset_type}/region-filtered/{region}/{dataset_name}.vcf.gz",
+        bed="results/stratification-intersections/{region}/{subset_group}/{subset_name}.bed",
+        tracker=ctf.get_tracking_file(config, "results", "svdb"),
     output:
         vcf=temp(
             "results/{dataset_type}/{region}/{subset_group}/{subset_name}/{dataset_name}.within-svdb.vcf.gz"
@@ -27,13 +20,12 @@ rule sv_svdb_within_dataset:
         "../envs/svdb.yaml"
     threads: config_resources["svdb"]["threads"]
     resources:
-        slurm_partition=rc.select_partition(
+        slurm_partition=rc.get_partition_selector(
             config_resources["svdb"]["partition"], config_resources["partitions"]
         ),
         mem_mb=config_resources["svdb"]["memory"],
     shell:
-        "bedtools intersect -a {input.stratification_bed} -b {input.region_bed} | "
-        "bedtools intersect -a {input.vcf} -b stdin -wa -f 1 -header > {output.tmpvcf} && "
+        "bedtools intersect -a {input.vcf} -b {input.bed} -wa -f 1 -header > {output.tmpvcf} && "
         "svdb --merge --vcf {output.tmpvcf} --bnd_distance {params.bnd_distance} --overlap {params.overlap} | "
         "sed 's/.tmp.vcf//g' | bgzip -c > {output.vcf}"
 
@@ -45,6 +37,7 @@ rule sv_svdb_across_datasets:
     input:
         experimental="results/experimentals/{region}/{setgroup}/{setname}/{experimental}.within-svdb.vcf.gz",
         reference="results/references/{region}/{setgroup}/{setname}/{reference}.within-svdb.vcf.gz",
+        tracker=ctf.get_tracking_file(config, "results", "svdb"),
     output:
         "results/svdb/{experimental}/{reference}/{region}/{setgroup}/{setname}.between-svdb.vcf.gz",
     params:
@@ -54,7 +47,7 @@ rule sv_svdb_across_datasets:
         "../envs/svdb.yaml"
     threads: config_resources["svdb"]["threads"]
     resources:
-        slurm_partition=rc.select_partition(
+        slurm_partition=rc.get_partition_selector(
             config_resources["svdb"]["partition"], config_resources["partitions"]
         ),
         mem_mb=config_resources["svdb"]["memory"],
@@ -64,27 +57,32 @@ rule sv_svdb_across_datasets:
 
 rule sv_summarize_variant_sources:
     """
-    Given a vcf that's been passed through svdb, use bcftools to extract
-    summary data. It turns out that the way svdb emits tracking data creates
-    problematic information that bcftools doesn't love. As such, this no longer
-    selects `svdb_origin`, instead just opting to pattern match across all of INFO downstream.
+    Given a vcf that's been passed through svdb, count records contributed by
+    the experimental dataset, the reference dataset, or both, per SVTYPE.
+
+    The vcf is streamed and only SVTYPE and the `svdb_origin` tags are inspected;
+    svdb can emit `svdb_origin` more than once per record, which bcftools doesn't love,
+    so these are parsed directly rather than through `bcftools query`.
     """
     input:
         "results/svdb/{experimental}/{reference}/{region}/{setgroup}/{setname}.between-svdb.vcf.gz",
     output:
         temp(
-            "results/svdb/{experimental}/{reference}/{region}/{setgroup}/{setname}.between-svdb.vcf.gz.pwv_comparison"
+            "results/svdb/{experimental}/{reference}/{region}/{setgroup}/{setname}.between-svdb.counts.tsv"
         ),
+    params:
+        experimental="{experimental}",
+        reference="{reference}",
     conda:
-        "../envs/bcftools.yaml"
-    threads: config_resources["bcftools"]["threads"]
+        "../envs/python.yaml"
+    threads: 1
     resources:
-        slurm_partition=rc.select_partition(
-            config_resources["bcftools"]["partition"], config_resources["partitions"]
+        slurm_partition=rc.get_partition_selector(
+            config_resources["default"]["partition"], config_resources["partitions"]
         ),
-        mem_mb=config_resources["bcftools"]["memory"],
-    shell:
-        "bcftools query -f '%CHROM\\t%POS\\t%ID\\t%REF\\t%ALT\\t%QUAL\\t%FILTER\\t%INFO/SVTYPE\\t%INFO\\n' {input} > {output}"
+        mem_mb=config_resources["default"]["memory"],
+    script:
+        "../scripts/summarize_svdb_comparison.py"
 
 
 rule sv_combine_subsets:
@@ -93,12 +91,7 @@ rule sv_combine_subsets:
     """
     input:
         comparisons=lambda wildcards: tc.find_datasets_in_subset(
-            wildcards,
-            checkpoints,
-            "results/stratification-sets/{}/subsets_for_happy/{{stratification_set}}".format(
-                reference_build
-            ),
-            reference_build,
+            wildcards, checkpoints, reference_build
         ),
     output:
         csv="results/{toolname,svdb|truvari|svanalyzer}/{experimental}/{reference}/{region}/{stratification_set}/results.extended.csv",
@@ -110,7 +103,7 @@ rule sv_combine_subsets:
         "../envs/r.yaml"
     threads: config_resources["r"]["threads"]
     resources:
-        slurm_partition=rc.select_partition(
+        slurm_partition=rc.get_partition_selector(
             config_resources["r"]["partition"], config_resources["partitions"]
         ),
         mem_mb=config_resources["r"]["memory"],
@@ -1,7 +1,11 @@
 rule tabix_index:
     """
     Index a vcf file. This has minor pattern restrictions to
-    avoid conflicts with hap.py
+    avoid conflicts with hap.py.
+
+    This only indexes the temporary per-stratification SV subsets, so the
+    indexes are temporary as well; the input store and region-filtered
+    vcfs have persistent indexes from their own rules.
     """
     input:
         "results/{dataset}/{prefix}.vcf.gz",
@@ -11,7 +15,7 @@ rule tabix_index:
         "../envs/bcftools.yaml"
     threads: config_resources["bcftools"]["threads"]
     resources:
-        slurm_partition=rc.select_partition(
+        slurm_partition=rc.get_partition_selector(
             config_resources["bcftools"]["partition"], config_resources["partitions"]
         ),
         mem_mb=config_resources["bcftools"]["memory"],
@@ -24,15 +28,8 @@ rule sv_within_dataset:
     Filter svs with stratification regions, but don't run svdb to merge anything
     """
     input:
-        vcf="results/{dataset_type}/{dataset_name}.vcf.gz",
-        stratification_bed=lambda wildcards: get_bedfile_from_name(
-            wildcards,
-            checkpoints,
-            "results/stratification-sets/{}/subsets_for_happy/{{subset_group}}".format(
-                reference_build
-            ),
-        ),
-        region_bed="results/confident-regions/{region}.bed",
+        vcf="results/{dataset_type}/region-filtered/{region}/{dataset_name}.vcf.gz",
+        bed="results/stratification-intersections/{region}/{subset_group}/{subset_name}.bed",
     output:
         temp(
             "results/{dataset_type}/{region}/{subset_group}/{subset_name}/{dataset_name}.filtered-to-region.vcf.gz"
@@ -41,13 +38,24 @@ rule sv_within_dataset:
         "../envs/svdb.yaml"
     threads: config_resources["svdb"]["threads"]
     resources:
-        slurm_partition=rc.select_partition(
+        slurm_partition=rc.get_partition_selector(
             config_resources["svdb"]["partition"], config_resources["partitions"]
         ),
         mem_mb=config_resources["svdb"]["memory"],
     shell:
-        "bedtools intersect -a {input.stratification_bed} -b {input.region_bed} | "
-        "bedtools intersect -a {input.vcf} -b stdin -wa -f 1 -header | bgzip -c > {output}"
+        "bedtools intersect -a {input.vcf} -b {input.bed} -wa -f 1 -header | bgzip -c > {output}"
+
+
+truvari_bench_memory = rc.get_memory_escalation(
+    config_resources,
+    config_resources["truvari"]["memory"],
+    "results/oom-markers/truvari_bench/{experimental}/{reference}/{region}/{subset_group}/{subset_name}.txt",
+)
+truvari_refine_memory = rc.get_memory_escalation(
+    config_resources,
+    config_resources["truvari"]["memory"],
+    "results/oom-markers/truvari_refine/{experimental}/{reference}/{region}/{subset_group}/{subset_name}.txt",
+)
 
 
 rule truvari_bench:
@@ -75,13 +83,11 @@ rule truvari_bench:
         ),
         fasta="results/{}/ref.fasta".format(reference_build),
         fai="results/{}/ref.fasta.fai".format(reference_build),
-        includebed=lambda wildcards: get_bedfile_from_name(
-            wildcards,
-            checkpoints,
-            "results/stratification-sets/{}/subsets_for_happy/{{subset_group}}".format(
-                reference_build
-            ),
+        includebed=lambda wildcards: tc.get_bedfile_dependency(
+            wildcards, checkpoints, reference_build
         ),
+        tracker=ctf.get_tracking_file(config, "results", "truvari"),
+        oom_guard="workflow/scripts/oom_guard.bash",
     output:
         temp(
             "results/truvari/{experimental}/{reference}/{region}/{subset_group}/{subset_name}/fn.vcf.gz"
@@ -118,22 +124,27 @@ rule truvari_bench:
         ),
     params:
         outdir="results/truvari/{experimental}/{reference}/{region}/{subset_group}/{subset_name}",
-        ref_distance_location="500",
-        min_percent_reciprocal_overlap="0.5",
-        min_sequence_overlap="0",
+        includebed=lambda wildcards: tc.get_bedfile_from_name(
+            wildcards, checkpoints, reference_build
+        ),
+        ref_distance_location=config["sv-settings"]["truvari"]["refdist"],
+        min_percent_reciprocal_overlap=config["sv-settings"]["truvari"]["pctovl"],
+        min_sequence_overlap=config["sv-settings"]["truvari"]["pctseq"],
+        oom_marker=lambda wildcards: truvari_bench_memory.marker(wildcards),
     conda:
         "../envs/truvari.yaml"
     threads: config_resources["truvari"]["threads"]
     resources:
-        slurm_partition=rc.select_partition(
+        slurm_partition=rc.get_partition_selector(
             config_resources["truvari"]["partition"], config_resources["partitions"]
         ),
-        mem_mb=config_resources["truvari"]["memory"],
+        mem_mb=truvari_bench_memory.mem_mb,
     shell:
         "rm -Rf {params.outdir} && "
+        "{input.oom_guard} {params.oom_marker} "
         "truvari bench -b {input.reference} -c {input.experimental} -f {input.fasta} -o {params.outdir} "
         "--passonly -r {params.ref_distance_location} -O {params.min_percent_reciprocal_overlap} "
-        "--pctseq {params.min_sequence_overlap} --dup-to-ins --includebed {input.includebed}"
+        "--pctseq {params.min_sequence_overlap} --dup-to-ins --includebed {params.includebed}"
 
 
 rule truvari_refine:
@@ -155,6 +166,7 @@ rule truvari_refine:
         tp_base_tbi="results/truvari/{experimental}/{reference}/{region}/{subset_group}/{subset_name}/tp-base.vcf.gz.tbi",
         tp_comp="results/truvari/{experimental}/{reference}/{region}/{subset_group}/{subset_name}/tp-comp.vcf.gz",
         tp_comp_tbi="results/truvari/{experimental}/{reference}/{region}/{subset_group}/{subset_name}/tp-comp.vcf.gz.tbi",
+        oom_guard="workflow/scripts/oom_guard.bash",
     output:
         temp(
             "results/truvari/{experimental}/{reference}/{region}/{subset_group}/{subset_name}/refine.variant_summary.json"
@@ -167,14 +179,57 @@ rule truvari_refine:
         ),
     params:
         outdir="results/truvari/{experimental}/{reference}/{region}/{subset_group}/{subset_name}",
+        oom_marker=lambda wildcards: truvari_refine_memory.marker(wildcards),
     conda:
         "../envs/truvari.yaml"
     threads: config_resources["truvari"]["threads"]
     resources:
-        slurm_partition=rc.select_partition(
+        slurm_partition=rc.get_partition_selector(
             config_resources["truvari"]["partition"], config_resources["partitions"]
         ),
-        mem_mb=config_resources["truvari"]["memory"],
+        mem_mb=truvari_refine_memory.mem_mb,
     shell:
         "rm -Rf {params.outdir}/phab && "
+        "{input.oom_guard} {params.oom_marker} "
         "truvari refine {params.outdir}"
+
+
+if config["sv-settings"]["truvari"]["stratification"] == "single-pass":
+
+    ruleorder: truvari_stratify_single_pass > sv_combine_subsets
+
+    rule truvari_stratify_single_pass:
+        """
+        Summarize a single truvari run over the whole confident region for every
+        stratification in a subset, assigning each tp-base, tp-comp, fp and fn record
+        to the stratifications that contain it, rather than rerunning truvari
+        with a separate includebed per stratification
+        """
+        input:
+            expand(
+                "results/truvari/{{experimental}}/{{reference}}/{{region}}/single-pass/all_background/{output}.vcf.gz",
+                output=["tp-base", "tp-comp", "fp", "fn"],
+            ),
+            beds=lambda wildcards: tc.get_stratification_intersections(
+                wildcards, checkpoints, reference_build
+            ),
+        output:
+            csv="results/truvari/{experimental}/{reference}/{region}/{stratification_set,[0-9]+}/results.extended.csv",
+            json="results/truvari/{experimental}/{reference}/{region}/{stratification_set,[0-9]+}/single-pass.summary.json",
+        params:
+            truvari_dir="results/truvari/{experimental}/{reference}/{region}/single-pass/all_background",
+            names=lambda wildcards: tc.get_stratification_subset(
+                checkpoints, reference_build, wildcards.stratification_set
+            ).names,
+        benchmark:
+            "results/performance_benchmarks/truvari_stratify_single_pass/{experimental}/{reference}/{region}/{stratification_set}/results.tsv"
+        threads: config_resources["default"]["threads"]
+        resources:
+            slurm_partition=rc.get_partition_selector(
+                config_resources["default"]["partition"], config_resources["partitions"]
+            ),
+            mem_mb=config_resources["default"]["memory"],
+        run:
+            ts.write_single_pass_results(
+                params.truvari_dir, params.names, input.beds, output.csv, output.json
+            )
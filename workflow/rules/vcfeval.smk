@@ -1,3 +1,10 @@
+vcfeval_run_memory = rc.get_memory_escalation(
+    config_resources,
+    config_resources["rtg-vcfeval"]["memory"],
+    "results/oom-markers/vcfeval_run/{experimental}/{reference}.txt",
+)
+
+
 rule vcfeval_run:
     """
     Eventually, this will handle dispatch of vcfeval; but for the time being,
@@ -7,17 +14,23 @@ rule vcfeval_run:
         experimental="results/experimentals/{experimental}.vcf.gz",
         reference="results/references/{reference}.vcf.gz",
         sdf="results/{}/ref.fasta.sdf".format(reference_build),
+        oom_guard="workflow/scripts/oom_guard.bash",
     output:
         vcf="results/vcfeval/{experimental}/{reference}/results.vcf.gz",
+    params:
+        oom_marker=lambda wildcards: vcfeval_run_memory.marker(wildcards),
+        rtg_mem=lambda wildcards, resources: rc.jvm_heap(config_resources, resources.mem_mb),
     conda:
         "../envs/vcfeval.yaml"
     threads: config_resources["rtg-vcfeval"]["threads"]
     resources:
-        slurm_partition=rc.select_partition(
+        slurm_partition=rc.get_partition_selector(
             config_resources["rtg-vcfeval"]["partition"], config_resources["partitions"]
         ),
+        mem_mb=vcfeval_run_memory.mem_mb,
     shell:
-        "rtg vcfeval --baseline={input.reference} --calls={input.experimental} --template={input.sdf} "
+        "{input.oom_guard} {params.oom_marker} "
+        "rtg RTG_MEM={params.rtg_mem} vcfeval --baseline={input.reference} --calls={input.experimental} --template={input.sdf} "
         "--output-mode=annotate --output={output} --Xtwo-pass=False --ref-overlap"
 
 
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import sys
+
+import pandas as pd
+
+## columns identifying a single metric row in hap.py-format output
+IDENTIFIER_COLUMNS = ["Experimental", "Reference", "Region", "Type", "Subset"]
+## metric columns consumed by downstream reports
+METRIC_COLUMNS = ["METRIC.Recall", "METRIC.Precision", "METRIC.F1_Score"]
+## read size for hashing input files
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def load_passing_metrics(csv_file: str) -> pd.DataFrame:
+    """
+    Load only the columns and rows of a hap.py-format extended csv
+    that are used by downstream reports: PASS rows, identifiers, and
+    precision/recall/F1 metrics.
+
+    SV comparisons can emit empty files when no variants are present
+    in a region; these produce an empty data frame.
+    """
+    try:
+        df = pd.read_csv(
+            csv_file,
+            usecols=IDENTIFIER_COLUMNS + ["Filter"] + METRIC_COLUMNS,
+            dtype={x: str for x in IDENTIFIER_COLUMNS + ["Filter"]},
+            keep_default_na=False,
+            na_values={x: ["", "NA", "nan"] for x in METRIC_COLUMNS},
+        )
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame(columns=IDENTIFIER_COLUMNS + METRIC_COLUMNS)
+    df = df.loc[df["Filter"] == "PASS", IDENTIFIER_COLUMNS + METRIC_COLUMNS]
+    return df
+
+
+def content_hash(csv_file: str) -> str:
+    """
+    Hash the contents of an input file, along with the columns loaded from it,
+    so that cached frames are invalidated if either changes
+    """
+    res = hashlib.sha256(",".join(IDENTIFIER_COLUMNS + METRIC_COLUMNS).encode())
+    with open(csv_file, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            res.update(block)
+    return res.hexdigest()
+
+
+def load_cached_passing_metrics(csv_file: str, cache_dir: str) -> tuple:
+    """
+    Load the passing metrics of a single input, from a parquet cache keyed by
+    the input's content hash if present, and otherwise by parsing the input
+    and adding it to the cache. Returns the metrics and whether the cache was hit.
+
+    Cache entries are written to a temporary file and renamed into place, so
+    that concurrent jobs sharing a cache never read a partial entry.
+    """
+    cache_file = os.path.join(cache_dir, "{}.parquet".format(content_hash(csv_file)))
+    if os.path.isfile(cache_file):
+        return pd.read_parquet(cache_file, engine="pyarrow"), True
+    df = load_passing_metrics(csv_file)
+    df[IDENTIFIER_COLUMNS] = df[IDENTIFIER_COLUMNS].astype(str)
+    df[METRIC_COLUMNS] = df[METRIC_COLUMNS].astype(float)
+    os.makedirs(cache_dir, exist_ok=True)
+    partial = "{}.{}.partial".format(cache_file, os.getpid())
+    df.to_parquet(partial, engine="pyarrow", index=False)
+    os.replace(partial, cache_file)
+    return df, False
+
+
+def consolidate_results(csv_files: list, output_file: str, cache_dir: str = None) -> dict:
+    """
+    Compact a set of hap.py-format extended csvs into a single parquet file.
+
+    hap.py reports some top-level metrics in every file it emits, so when
+    running stratification regions in separate sets, the same rows are
+    repeated over and over; only the first instance of each is kept.
+
+    If cache_dir is provided, each input is only parsed if its contents have
+    not been seen before. Returns counts of cache hits and misses.
+    """
+    frames = []
+    counts = {"hits": 0, "misses": 0}
+    for csv_file in csv_files:
+        if cache_dir is None:
+            frames.append(load_passing_metrics(csv_file))
+            continue
+        df, hit = load_cached_passing_metrics(csv_file, cache_dir)
+        counts["hits" if hit else "misses"] += 1
+        frames.append(df)
+    frames = [df for df in frames if len(df) > 0]
+    if len(frames) > 0:
+        res = pd.concat(frames, ignore_index=True)
+    else:
+        res = pd.DataFrame(columns=IDENTIFIER_COLUMNS + METRIC_COLUMNS)
+    res = res.drop_duplicates(subset=IDENTIFIER_COLUMNS, keep="first")
+    res[IDENTIFIER_COLUMNS] = res[IDENTIFIER_COLUMNS].astype(str)
+    res[METRIC_COLUMNS] = res[METRIC_COLUMNS].astype(float)
+    res.to_parquet(output_file, engine="pyarrow", index=False)
+    return counts
+
+
+if "snakemake" in globals():
+    counts = consolidate_results(
+        snakemake.input["csv"],  # noqa: F821
+        snakemake.output["parquet"],  # noqa: F821
+        snakemake.params["cache_dir"],  # noqa: F821
+    )
+    print(
+        "consolidate_results: {} of {} inputs loaded from cache".format(
+            counts["hits"], counts["hits"] + counts["misses"]
+        ),
+        file=sys.stderr,
+    )
@@ -0,0 +1,95 @@
+#!/usr/bin/env bash
+## Combine the tabix-indexed vcfs of a single experimental dataset into one sorted vcf.
+##
+## usage: merge_vcfs.bash OUTPUT THREADS TMPDIR INPUT1.vcf.gz [INPUT2.vcf.gz ...]
+##
+## - a single input is already sorted (it has a tabix index), and is linked into place
+## - inputs whose indexed contigs are disjoint, and in header contig order when the
+##   inputs are taken in turn (e.g. one vcf per chromosome), are concatenated without sorting
+## - otherwise, each contig is merged and sorted separately, in parallel, and the
+##   per-contig results are concatenated in header contig order
+
+set -euo pipefail
+
+output="$1"
+threads="$2"
+tmpdir="$3"
+shift 3
+inputs=("$@")
+
+if [[ "${#inputs[@]}" -eq 1 ]]; then
+	ln -f "${inputs[0]}" "${output}" 2>/dev/null || cp "${inputs[0]}" "${output}"
+	exit 0
+fi
+
+mkdir -p "${tmpdir}"
+workdir=$(mktemp -d "${tmpdir}/merge_vcfs.XXXXXX")
+trap 'rm -rf "${workdir}"' EXIT
+
+## contig order from the vcf header
+bcftools view -h "${inputs[0]}" |
+	sed -n 's/^##contig=<ID=\([^,>]*\).*/\1/p' >"${workdir}/header_contigs.txt"
+
+## one line per input: the input path, then its indexed contigs
+for input in "${inputs[@]}"; do
+	echo -e "${input}\t$(tabix -l "${input}" | tr '\n' ' ')"
+done >"${workdir}/input_contigs.tsv"
+
+## order inputs by the header position of their first contig, and report them only if
+## every contig is in the header, each contig appears in only one input, and the
+## inputs' contigs are in header order when read in that order. a header without
+## ##contig lines gives no order to check against, so such inputs are never concatenated
+[[ -s "${workdir}/header_contigs.txt" ]] && awk -F '\t' '
+	NR == FNR { rank[$1] = FNR ; next }
+	{
+		n = split($2, contigs, " ")
+		first = -1
+		previous = -1
+		for (i = 1; i <= n; i++) {
+			if (!(contigs[i] in rank) || (contigs[i] in seen)) { exit 1 }
+			seen[contigs[i]] = 1
+			if (rank[contigs[i]] <= previous) { exit 1 }
+			previous = rank[contigs[i]]
+			if (first < 0) { first = previous }
+		}
+		print (first < 0 ? 0 : first) "\t" previous "\t" $1
+	}
+' "${workdir}/header_contigs.txt" "${workdir}/input_contigs.tsv" |
+	sort -k1,1n -k2,2n >"${workdir}/ordered_inputs.tsv" && disjoint=1 || disjoint=0
+
+if [[ "${disjoint}" -eq 1 ]]; then
+	## confirm inputs with records do not interleave once placed in order
+	## and that every input was placed
+	if [[ "$(wc -l <"${workdir}/ordered_inputs.tsv")" -eq "${#inputs[@]}" ]] &&
+		awk -F '\t' '$1 == 0 && $2 == -1 { next } $1 <= previous { exit 1 } { previous = $2 }' \
+			"${workdir}/ordered_inputs.tsv"; then
+		cut -f 3 "${workdir}/ordered_inputs.tsv" >"${workdir}/ordered_inputs.txt"
+		bcftools concat -O z -o "${output}" --threads "${threads}" -f "${workdir}/ordered_inputs.txt"
+		exit 0
+	fi
+fi
+
+## per-contig merge and sort, in parallel
+for input in "${inputs[@]}"; do
+	tabix -l "${input}"
+done | sort -u >"${workdir}/all_contigs.txt"
+grep -Fxf "${workdir}/all_contigs.txt" "${workdir}/header_contigs.txt" >"${workdir}/contigs.txt" || true
+grep -Fvxf "${workdir}/header_contigs.txt" "${workdir}/all_contigs.txt" >>"${workdir}/contigs.txt" || true
+
+export workdir
+printf '%s\n' "${inputs[@]}" >"${workdir}/inputs.txt"
+awk '{ print NR "\t" $1 }' "${workdir}/contigs.txt" |
+	xargs -r -P "${threads}" -L 1 bash -c '
+		set -euo pipefail
+		mkdir -p "${workdir}/sort.$0"
+		bcftools concat --allow-overlaps -D -r "$1" -O u -f "${workdir}/inputs.txt" |
+			bcftools sort -T "${workdir}/sort.$0" -O b -o "${workdir}/contig.$0.bcf"
+	'
+awk '{ print ENVIRON["workdir"] "/contig." NR ".bcf" }' "${workdir}/contigs.txt" >"${workdir}/contig_files.txt"
+
+if [[ -s "${workdir}/contig_files.txt" ]]; then
+	bcftools concat -O z -o "${output}" --threads "${threads}" -f "${workdir}/contig_files.txt"
+else
+	## no records in any input: emit the header alone
+	bcftools view -h -O z -o "${output}" "${inputs[0]}"
+fi
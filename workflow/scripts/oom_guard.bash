@@ -0,0 +1,36 @@
+#!/usr/bin/env bash
+## Run a command, recording in a marker file whether it ran out of memory.
+##
+## usage: oom_guard.bash MARKER COMMAND [ARGS ...]
+##
+## - a command killed by SIGKILL (as by the kernel or a scheduler enforcing a memory limit),
+##   or reporting a JVM, C++ or python allocation failure on stderr, appends a line to MARKER.
+##   the resource functions in lib/resource_calculator.py only escalate memory on retries
+##   of jobs with such a record
+## - a successful command removes MARKER, so later runs of the job start from base memory
+## - the command's exit status is passed through
+
+set -uo pipefail
+
+marker="$1"
+shift
+
+mkdir -p "$(dirname "${marker}")"
+stderr_log=$(mktemp "${marker}.stderr.XXXXXX")
+trap 'rm -f "${stderr_log}"' EXIT
+
+"$@" 2> >(tee "${stderr_log}" >&2)
+status=$?
+## wait for tee to drain stderr before inspecting it
+wait
+
+if [[ "${status}" -eq 0 ]]; then
+	rm -f "${marker}"
+	exit 0
+fi
+
+if [[ "${status}" -eq 137 ]] ||
+	grep -q -E "OutOfMemoryError|std::bad_alloc|MemoryError|Cannot allocate memory|oom-kill" "${stderr_log}"; then
+	echo -e "$(date +%s)\t${status}" >>"${marker}"
+fi
+exit "${status}"
@@ -0,0 +1,58 @@
+#!/usr/bin/env bash
+## Place a tabix (.tbi) or CSI (.csi) index next to a bgzipped vcf, reusing a provided index if it matches.
+##
+## usage: store_vcf_index.bash VCF INDEX [SOURCE]
+##
+## - INDEX is the index to create, VCF.tbi or VCF.csi; its extension selects the index format
+## - SOURCE, if given and non-empty, is the url or path of an existing index for VCF. s3 sources are
+##   fetched with the aws cli, other remote sources with lib/download_manager.py, and local files copied
+## - a fetched index is kept only if tabix can read it and it locates the first record of VCF;
+##   otherwise, as when no SOURCE is given, the index is built with tabix
+
+set -euo pipefail
+
+vcf="$1"
+index="$2"
+source="${3:-}"
+
+case "${index}" in
+"${vcf}.tbi") format_flag="" ;;
+"${vcf}.csi") format_flag="-C" ;;
+*)
+	echo "index ${index} must be ${vcf}.tbi or ${vcf}.csi" >&2
+	exit 1
+	;;
+esac
+
+## check that the index at ${index} is readable and finds the first record of the vcf
+index_matches() {
+	local first chrom pos
+	tabix -l "${vcf}" >/dev/null || return 1
+	## an index of a vcf without records has nothing further to check
+	first=$(bgzip -dc "${vcf}" | awk '!/^#/ { print $1 "\t" $2 ; exit }') || true
+	if [[ -z "${first}" ]]; then
+		return 0
+	fi
+	chrom=$(cut -f 1 <<<"${first}")
+	pos=$(cut -f 2 <<<"${first}")
+	tabix "${vcf}" "${chrom}:${pos}-${pos}" | awk -v pos="${pos}" '$2 == pos { found = 1 } END { exit !found }'
+}
+
+if [[ -n "${source}" ]]; then
+	if [[ "${source}" = s3://* ]]; then
+		aws s3 cp "${source}" "${index}"
+	elif [[ "${source}" = *://* ]]; then
+		python -m lib.download_manager "${source}" "${index}"
+	else
+		cp "${source}" "${index}"
+	fi
+	## the fetched index should not appear older than the vcf it was copied alongside
+	touch "${index}"
+	if index_matches; then
+		exit 0
+	fi
+	echo "provided index ${source} does not match ${vcf}; rebuilding it" >&2
+	rm -f "${index}"
+fi
+
+tabix -f ${format_flag} -p vcf "${vcf}"
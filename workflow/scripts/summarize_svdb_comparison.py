@@ -0,0 +1,80 @@
+import gzip
+
+import pandas as pd
+
+## columns of the compact per-stratification summary
+COUNT_COLUMNS = ["SVTYPE", "TP", "FP", "FN"]
+## records are classified in batches of this many lines
+BATCH_SIZE = 100_000
+
+
+def classify_records(info: pd.Series, experimental_code: str, reference_code: str) -> pd.DataFrame:
+    """
+    Classify svdb-merged records, given their INFO fields, by whether the
+    experimental and reference datasets contributed to them.
+
+    svdb can emit `svdb_origin` more than once per record, which is why
+    this is not extracted with bcftools; all instances are joined here.
+    Records without any `svdb_origin` tag fall back to matching across
+    the entire INFO field.
+    """
+    svtype = info.str.extract(r"(?:^|;)SVTYPE=([^;]*)", expand=False).fillna(".")
+    origin = info.str.findall(r"(?:^|;)svdb_origin=([^;]*)").str.join("|")
+    origin = origin.where(origin.str.len() > 0, info)
+    in_experimental = origin.str.contains(experimental_code, regex=False)
+    in_reference = origin.str.contains(reference_code, regex=False)
+    return pd.DataFrame(
+        {
+            "SVTYPE": svtype,
+            "TP": in_experimental & in_reference,
+            "FP": in_experimental & ~in_reference,
+            "FN": ~in_experimental & in_reference,
+        }
+    )
+
+
+def _count_batch(lines: list, experimental_code: str, reference_code: str) -> pd.DataFrame:
+    """
+    Count TP/FP/FN by SVTYPE for a batch of vcf record lines
+    """
+    info = pd.Series(lines, dtype=str).str.split("\t", n=8).str[7].fillna("")
+    return classify_records(info, experimental_code, reference_code).groupby("SVTYPE").sum()
+
+
+def summarize_svdb_comparison(
+    vcf_file: str, experimental_code: str, reference_code: str, output_file: str
+) -> None:
+    """
+    Stream a between-dataset svdb vcf and write TP/FP/FN counts per SVTYPE.
+
+    Only INFO is inspected, in fixed-size batches, so neither the full
+    records nor the whole file are held in memory. A vcf with no records
+    produces a header-only summary.
+    """
+    opener = gzip.open if str(vcf_file).endswith(".gz") else open
+    counts = []
+    batch = []
+    with opener(vcf_file, "rt") as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            batch.append(line.rstrip("\n"))
+            if len(batch) >= BATCH_SIZE:
+                counts.append(_count_batch(batch, experimental_code, reference_code))
+                batch = []
+    if len(batch) > 0:
+        counts.append(_count_batch(batch, experimental_code, reference_code))
+    if len(counts) > 0:
+        res = pd.concat(counts).groupby(level=0).sum().astype(int).reset_index()
+    else:
+        res = pd.DataFrame(columns=COUNT_COLUMNS)
+    res[COUNT_COLUMNS].to_csv(output_file, sep="\t", index=False)
+
+
+if "snakemake" in globals():
+    summarize_svdb_comparison(
+        snakemake.input[0],  # noqa: F821
+        snakemake.params["experimental"],  # noqa: F821
+        snakemake.params["reference"],  # noqa: F821
+        snakemake.output[0],  # noqa: F821
+    )
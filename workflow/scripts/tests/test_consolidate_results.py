@@ -0,0 +1,88 @@
+import consolidate_results as cr
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def happy_csvs(tmp_path):
+    """
+    Combined hap.py-format extended csvs from two comparisons, each
+    repeating the top-level "*" metrics, plus an empty SV output
+    """
+    header = (
+        "Experimental,Reference,Region,Type,Subtype,Subset,Filter,Genotype,"
+        "METRIC.Recall,METRIC.Precision,METRIC.Frac_NA,METRIC.F1_Score,TRUTH.TOTAL\n"
+    )
+    rows = [
+        "exp1,ref1,all,SNP,*,*,ALL,*,0.8,0.9,0.1,0.85,100\n",
+        "exp1,ref1,all,SNP,*,*,PASS,*,0.7,0.95,0.1,0.81,100\n",
+        "exp1,ref1,all,SNP,*,segdup,PASS,*,0.5,0.6,0.1,0.55,10\n",
+        "exp1,ref1,all,SNP,*,*,PASS,*,0.7,0.95,0.1,0.81,100\n",
+        "exp1,ref1,all,INDEL,*,segdup,PASS,*,,,,,0\n",
+    ]
+    filenames = [tmp_path / "first.csv", tmp_path / "second.csv", tmp_path / "empty.csv"]
+    filenames[0].write_text(header + "".join(rows))
+    filenames[1].write_text(header + rows[1].replace("exp1", "exp2"))
+    filenames[2].write_text("")
+    return filenames
+
+
+def test_load_passing_metrics(happy_csvs):
+    """
+    Test that only PASS rows and report columns are loaded
+    """
+    df = cr.load_passing_metrics(happy_csvs[0])
+    assert list(df.columns) == cr.IDENTIFIER_COLUMNS + cr.METRIC_COLUMNS
+    assert len(df) == 4
+    assert df["METRIC.Recall"].isna().sum() == 1
+
+
+def test_load_passing_metrics_empty(happy_csvs):
+    """
+    Test that empty csvs yield empty data frames
+    """
+    df = cr.load_passing_metrics(happy_csvs[2])
+    assert len(df) == 0
+
+
+def test_consolidate_results(happy_csvs, tmp_path):
+    """
+    Test that csvs are filtered, deduplicated, and combined
+    into a single parquet file
+    """
+    output = tmp_path / "consolidated.parquet"
+    cr.consolidate_results(happy_csvs, output)
+    observed = pd.read_parquet(output)
+    assert list(observed.columns) == cr.IDENTIFIER_COLUMNS + cr.METRIC_COLUMNS
+    assert observed["Experimental"].to_list() == ["exp1", "exp1", "exp1", "exp2"]
+    assert observed["Subset"].to_list() == ["*", "segdup", "segdup", "*"]
+    assert observed["METRIC.F1_Score"].to_list()[:2] == [0.81, 0.55]
+
+
+def test_consolidate_results_all_empty(happy_csvs, tmp_path):
+    """
+    Test that consolidating only empty inputs emits an empty parquet file
+    """
+    output = tmp_path / "consolidated.parquet"
+    cr.consolidate_results([happy_csvs[2]], output)
+    observed = pd.read_parquet(output)
+    assert len(observed) == 0
+    assert list(observed.columns) == cr.IDENTIFIER_COLUMNS + cr.METRIC_COLUMNS
+
+
+def test_consolidate_results_cache(happy_csvs, tmp_path):
+    """
+    Test that inputs are parsed once per distinct content, and that
+    cached and parsed inputs consolidate identically
+    """
+    cache_dir = tmp_path / "cache"
+    expected = tmp_path / "expected.parquet"
+    cr.consolidate_results(happy_csvs, expected)
+    output = tmp_path / "consolidated.parquet"
+    assert cr.consolidate_results(happy_csvs, output, cache_dir) == {"hits": 0, "misses": 3}
+    happy_csvs[1].write_text(happy_csvs[1].read_text().replace("exp2", "exp3"))
+    assert cr.consolidate_results(happy_csvs, output, cache_dir) == {"hits": 2, "misses": 1}
+    happy_csvs[1].write_text(happy_csvs[1].read_text().replace("exp3", "exp2"))
+    assert cr.consolidate_results(happy_csvs, output, cache_dir) == {"hits": 3, "misses": 0}
+    pd.testing.assert_frame_equal(pd.read_parquet(output), pd.read_parquet(expected))
+    assert len(list(cache_dir.glob("*.partial"))) == 0
@@ -0,0 +1,97 @@
+import os
+import subprocess
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "merge_vcfs.bash")
+
+## stand-ins for bcftools and tabix that log their arguments, read vcf headers and
+## indexed contigs from files next to each input, and create requested outputs
+BCFTOOLS = """#!/usr/bin/env bash
+echo "bcftools $*" >>"${MERGE_VCFS_LOG}"
+if [[ "$1" = "view" ]]; then
+	cat "${@: -1}.header"
+	exit 0
+fi
+if [[ "$1" = "sort" ]]; then
+	cat >/dev/null
+fi
+while [[ $# -gt 0 ]]; do
+	if [[ "$1" = "-o" ]]; then
+		touch "$2"
+	fi
+	shift
+done
+"""
+TABIX = """#!/usr/bin/env bash
+cat "$2.contigs"
+"""
+
+
+@pytest.fixture
+def merge_vcfs(tmp_path):
+    """
+    Run merge_vcfs.bash on fake inputs, given (header contigs, indexed contigs) per input,
+    returning the logged bcftools calls
+    """
+    bindir = tmp_path / "bin"
+    bindir.mkdir()
+    for name, content in [("bcftools", BCFTOOLS), ("tabix", TABIX)]:
+        (bindir / name).write_text(content)
+        (bindir / name).chmod(0o755)
+
+    def run(inputs):
+        filenames = []
+        for i, (header_contigs, indexed_contigs) in enumerate(inputs):
+            filename = tmp_path / "input{}.vcf.gz".format(i)
+            filename.write_text("")
+            (tmp_path / "input{}.vcf.gz.header".format(i)).write_text(
+                "".join("##contig=<ID={}>\n".format(x) for x in header_contigs) + "#CHROM\n"
+            )
+            (tmp_path / "input{}.vcf.gz.contigs".format(i)).write_text(
+                "".join("{}\n".format(x) for x in indexed_contigs)
+            )
+            filenames.append(str(filename))
+        log = tmp_path / "bcftools.log"
+        log.write_text("")
+        env = dict(
+            os.environ,
+            PATH="{}:{}".format(bindir, os.environ["PATH"]),
+            MERGE_VCFS_LOG=str(log),
+        )
+        subprocess.run(
+            ["bash", SCRIPT, str(tmp_path / "merged.vcf.gz"), "1", str(tmp_path / "tmp")]
+            + filenames,
+            check=True,
+            env=env,
+        )
+        return log.read_text().splitlines()
+
+    return run
+
+
+def test_merge_vcfs_disjoint(merge_vcfs):
+    """
+    Test that per-chromosome inputs in header order are concatenated without sorting
+    """
+    observed = merge_vcfs([(["chr1", "chr2"], ["chr2"]), (["chr1", "chr2"], ["chr1"])])
+    assert not any("sort" in x for x in observed)
+    assert any("concat" in x and "--allow-overlaps" not in x for x in observed)
+
+
+def test_merge_vcfs_overlapping(merge_vcfs):
+    """
+    Test that inputs sharing a contig are merged and sorted per contig
+    """
+    observed = merge_vcfs([(["chr1", "chr2"], ["chr1"]), (["chr1", "chr2"], ["chr1", "chr2"])])
+    assert len([x for x in observed if "--allow-overlaps" in x]) == 2
+
+
+def test_merge_vcfs_no_header_contigs(merge_vcfs):
+    """
+    Test that inputs whose header has no ##contig lines are merged per contig,
+    rather than concatenated from an empty list of ordered inputs
+    """
+    observed = merge_vcfs([([], ["chr2"]), ([], ["chr1"])])
+    assert len([x for x in observed if "--allow-overlaps" in x]) == 2
+    assert not any("ordered_inputs.txt" in x for x in observed)
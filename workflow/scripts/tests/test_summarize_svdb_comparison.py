@@ -0,0 +1,55 @@
+import gzip
+
+import pandas as pd
+import pytest
+import summarize_svdb_comparison as ssc
+
+
+@pytest.fixture
+def svdb_vcf(tmp_path):
+    """
+    Minimal between-dataset svdb output, including a record with a
+    duplicated svdb_origin tag and one without any origin tag
+    """
+    records = [
+        ("DEL", "svdb_origin=exp.within-svdb|ref.within-svdb"),
+        ("DEL", "svdb_origin=exp.within-svdb"),
+        ("DEL", "svdb_origin=ref.within-svdb"),
+        ("INS", "svdb_origin=exp.within-svdb;svdb_origin=ref.within-svdb"),
+        ("INS", "svdb_origin=exp.within-svdb"),
+        ("INS", "SOMETHING=ref"),
+    ]
+    filename = tmp_path / "segdup.between-svdb.vcf.gz"
+    with gzip.open(filename, "wt") as f:
+        f.write("##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+        for i, (svtype, info) in enumerate(records):
+            f.write(
+                "chr1\t{}\t.\tN\t<{}>\t.\tPASS\tEND={};SVTYPE={};{}\n".format(
+                    i + 1, svtype, i + 100, svtype, info
+                )
+            )
+    return filename
+
+
+def test_summarize_svdb_comparison(svdb_vcf, tmp_path, monkeypatch):
+    """
+    Test that records are counted by origin and SVTYPE across batches
+    """
+    monkeypatch.setattr(ssc, "BATCH_SIZE", 4)
+    output = tmp_path / "counts.tsv"
+    ssc.summarize_svdb_comparison(svdb_vcf, "exp", "ref", output)
+    observed = pd.read_csv(output, sep="\t").set_index("SVTYPE")
+    assert list(observed.columns) == ["TP", "FP", "FN"]
+    assert observed.loc["DEL"].to_list() == [1, 1, 1]
+    assert observed.loc["INS"].to_list() == [1, 1, 1]
+
+
+def test_summarize_svdb_comparison_no_records(tmp_path):
+    """
+    Test that a vcf without records yields a header-only summary
+    """
+    vcf = tmp_path / "empty.vcf"
+    vcf.write_text("##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+    output = tmp_path / "counts.tsv"
+    ssc.summarize_svdb_comparison(vcf, "exp", "ref", output)
+    assert output.read_text() == "SVTYPE\tTP\tFP\tFN\n"